@@ -0,0 +1,157 @@
+# Append-only journals shared by all ranger instances of a user.
+#
+# A journal is a file of NUL-terminated text records in ranger's data
+# directory.  Writers hold an exclusive lock on a separate lock file, first
+# read what the other instances appended and then append their own records.
+# Readers stat() the journal and read only the new tail when it grew.  When
+# the journal is much longer than the state it describes, it is replaced by
+# a snapshot of that state.
+#
+# Subclasses keep the state in memory and implement reset(), apply(),
+# snapshot() and __len__().
+
+from __future__ import (absolute_import, division, print_function)
+
+import fcntl
+import os
+
+COMPACT_MIN_RECORDS = 1024
+
+
+def encode_records(records):
+    return ''.join(record + '\0' for record in records).encode('utf-8', 'surrogateescape')
+
+
+class Journal(object):
+    """State kept in the journal filename (or in memory only if filename
+    is None)."""
+    compact_min_records = COMPACT_MIN_RECORDS
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lockname = filename + '.lock' if filename else None
+        self.records = 0
+        self._offset = 0
+        self._identity = None
+        self.changed = False
+
+    def reset(self):
+        """Forget the state, the journal is read from the start."""
+        raise NotImplementedError
+
+    def apply(self, records):
+        """Apply a list of records (without their NULs) to the state."""
+        raise NotImplementedError
+
+    def snapshot(self):
+        """Records that recreate the current state."""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    # Reading
+
+    def _apply(self, data):
+        records = [record for record in os.fsdecode(data).split('\0') if record]
+        self.records += len(records)
+        self.apply(records)
+        self.changed = True
+
+    def _read(self):
+        """Read what was appended since the last read, or everything if the
+        journal was replaced."""
+        try:
+            fobj = open(self.filename, 'rb')
+        except OSError:
+            self._identity = None
+            return
+        with fobj:
+            stat = os.fstat(fobj.fileno())
+            identity = (stat.st_dev, stat.st_ino)
+            if identity != self._identity or stat.st_size < self._offset:
+                self.reset()
+                self.records = 0
+                self._offset = 0
+            fobj.seek(self._offset)
+            data = fobj.read()
+            # A record is only complete with its terminating NUL.
+            end = data.rfind(b'\0') + 1
+            self._apply(data[:end])
+            self._offset += end
+            self._identity = identity
+
+    def exists(self):
+        return bool(self.filename) and os.path.exists(self.filename)
+
+    def sync(self):
+        """Pick up changes of other instances.  Returns True if there were
+        any.  Costs one stat() if nothing changed."""
+        if not self.filename:
+            return False
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+        if (stat.st_dev, stat.st_ino) == self._identity and stat.st_size == self._offset:
+            return False
+        with self._lock(fcntl.LOCK_SH):
+            self._read()
+        return True
+
+    # Writing
+
+    def _lock(self, mode):
+        return FileLock(self.lockname, mode)
+
+    def _write(self, records):
+        if records:
+            self._update(lambda: records)
+
+    def _update(self, make_records):
+        """Append the records make_records() returns.  It is called with the
+        lock held, after what other instances appended was read, so records
+        that depend on the state are computed from the current one."""
+        if not self.filename:
+            records = make_records()
+            if records:
+                self._apply(encode_records(records))
+            return
+        with self._lock(fcntl.LOCK_EX):
+            self._read()
+            records = make_records()
+            if not records:
+                return
+            data = encode_records(records)
+            fdesc = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fdesc, data)
+            finally:
+                os.close(fdesc)
+            self._read()
+            if self.records > self.compact_min_records and self.records > 4 * len(self):
+                self._compact()
+
+    def _compact(self):
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'wb') as fobj:
+            fobj.write(encode_records(self.snapshot()))
+        os.replace(tmp, self.filename)
+        self._identity = None
+        self._read()
+
+
+class FileLock(object):
+    def __init__(self, filename, mode):
+        self.filename = filename
+        self.mode = mode
+        self.fdesc = None
+
+    def __enter__(self):
+        self.fdesc = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fdesc, self.mode)
+        return self
+
+    def __exit__(self, *_):
+        fcntl.flock(self.fdesc, fcntl.LOCK_UN)
+        os.close(self.fdesc)
@@ -0,0 +1,61 @@
+# File system types of mount points, from /proc/self/mounts.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import re
+from time import time
+
+# File systems whose files live elsewhere: drvfs and 9p of WSL, network file
+# systems.  They do not report changes made elsewhere and stat() is a round
+# trip.
+REMOTE_TYPES = frozenset((
+    '9p', 'drvfs', 'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', 'fuse.rclone'))
+# Seconds after which mount_point() reads the mount table again
+MOUNTS_MAX_AGE = 10
+
+_TYPES = {}
+_READ_TIME = [0]
+_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+
+def _unescape(field):
+    # Spaces and the like are written as octal escapes: \040
+    return _ESCAPE_RE.sub(lambda match: chr(int(match.group(1), 8)), field)
+
+
+def _read_mounts():
+    types = {}
+    try:
+        with open('/proc/self/mounts', 'r') as fobj:
+            for line in fobj:
+                fields = line.split()
+                if len(fields) >= 3:
+                    # Later mounts on the same point hide earlier ones.
+                    types[_unescape(fields[1])] = fields[2]
+    except OSError:
+        pass
+    return types
+
+
+def mount_type(mount_path):
+    """The file system type mounted at mount_path (see
+    ranger.ext.mount_path), or None if unknown."""
+    if mount_path not in _TYPES:
+        _TYPES.clear()
+        _TYPES.update(_read_mounts())
+        _TYPES.setdefault(mount_path, None)
+    return _TYPES[mount_path]
+
+
+def mount_point(path):
+    """The mount point of the file system path is on, looked up in the mount
+    table by name alone: unlike ranger.ext.mount_path this needs no stat(),
+    but path should be free of symbolic links."""
+    if time() - _READ_TIME[0] > MOUNTS_MAX_AGE:
+        _TYPES.clear()
+        _TYPES.update(_read_mounts())
+        _READ_TIME[0] = time()
+    while _TYPES.get(path) is None and path != '/':
+        path = os.path.dirname(path)
+    return path
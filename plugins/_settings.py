@@ -0,0 +1,27 @@
+# Options that plugins add to ranger's settings.
+#
+# ranger only knows the options in ALLOWED_SETTINGS and binds their signals
+# when the settings object is created, before plugins are loaded.  Plugins
+# are imported before rc.conf is sourced, so registering an option at import
+# time makes "set <name> <value>" in rc.conf work like for built-in options.
+
+from __future__ import (absolute_import, division, print_function)
+
+import ranger
+from ranger.container.settings import (
+    ALLOWED_SETTINGS, SIGNAL_PRIORITY_SANITIZE, SIGNAL_PRIORITY_SYNC)
+
+
+def register_setting(name, type_, default):
+    if name in ALLOWED_SETTINGS:
+        return
+    ALLOWED_SETTINGS[name] = type_
+    fm = getattr(ranger, 'fm', None)
+    if fm is None:
+        return
+    settings = fm.settings
+    settings.signal_bind('setopt.' + name, settings._sanitize,  # pylint: disable=protected-access
+                         priority=SIGNAL_PRIORITY_SANITIZE)
+    settings.signal_bind('setopt.' + name, settings._raw_set_with_signal,  # pylint: disable=protected-access
+                         priority=SIGNAL_PRIORITY_SYNC)
+    settings._raw_set(name, default)  # pylint: disable=protected-access
@@ -0,0 +1,61 @@
+# A small sqlite database in ranger's data directory for the persistent
+# caches of the plugins (directory sizes, content hashes, MIME types, ...).
+#
+# Each cache owns one table.  The connection is shared between the UI
+# thread and worker threads and guarded by a lock; writes are batched by the
+# callers so that one scan costs one transaction.
+
+from __future__ import (absolute_import, division, print_function)
+
+import sqlite3
+import threading
+
+STORE_FILENAME = 'plugin_cache.sqlite'
+
+
+class Store(object):
+
+    def __init__(self, filename):
+        self.filename = filename or ':memory:'
+        self._lock = threading.Lock()
+        try:
+            self._db = self._connect(self.filename)
+        except sqlite3.Error:
+            # Corrupt or unwritable database: fall back to a cache that only
+            # lives as long as this ranger instance.
+            self._db = self._connect(':memory:')
+
+    @staticmethod
+    def _connect(filename):
+        database = sqlite3.connect(filename, check_same_thread=False, timeout=5)
+        if filename != ':memory:':
+            database.execute('PRAGMA journal_mode=WAL')
+            database.execute('PRAGMA synchronous=NORMAL')
+        return database
+
+    def create(self, schema):
+        with self._lock:
+            self._db.executescript(schema)
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def write(self, sql, rows):
+        """Run sql for every row of params in a single transaction."""
+        if not rows:
+            return
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.executemany(sql, rows)
+            except sqlite3.Error:
+                pass
+
+
+def get_store(fm):
+    """The store shared by all plugins of this ranger instance."""
+    store = getattr(fm, 'plugin_store', None)
+    if store is None:
+        store = fm.plugin_store = Store(fm.datapath(STORE_FILENAME))
+    return store
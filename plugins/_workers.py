@@ -0,0 +1,142 @@
+# Shared base for loader tasks that do their work on thread pools.
+#
+# ranger's Loader drives a task by calling next() on its generator for a few
+# milliseconds per UI loop.  A WorkerLoadable keeps that generator for
+# bookkeeping (polling futures, updating percent and description) and does
+# the actual I/O on worker threads.  Pausing the task in the task view holds
+# the workers at their next checkpoint, removing it cancels them.
+#
+# The workers are daemon threads of a DaemonPool rather than those of a
+# ThreadPoolExecutor, which are joined at exit: a worker stuck on a hung
+# mount must not keep ranger from exiting.
+
+from __future__ import (absolute_import, division, print_function)
+
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from time import time
+
+from ranger.core.loader import Loadable
+from ranger.core.shared import FileManagerAware
+
+
+# Seconds a removed task waits for its workers to reach a checkpoint
+DESTROY_TIMEOUT = 1.0
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class DaemonPool(object):
+    """The part of ThreadPoolExecutor that the plugins use, on daemon
+    threads.  Threads are started as work arrives, up to workers."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._tasks = queue.Queue()
+        self._threads = []
+        self._idle = threading.Semaphore(0)
+        self._shut_down = False
+
+    def submit(self, func, *args, **kwargs):
+        if self._shut_down:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+        future = Future()
+        self._tasks.put((future, func, args, kwargs))
+        if not self._idle.acquire(blocking=False) and len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return future
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, func, args, kwargs = task
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as ex:  # pylint: disable=broad-except
+                    future.set_exception(ex)
+                else:
+                    future.set_result(result)
+            del task, future
+            self._idle.release()
+
+    def shutdown(self, wait=True, cancel_futures=False, timeout=None):  # pylint: disable=redefined-outer-name
+        """Like ThreadPoolExecutor.shutdown(); with timeout, waits at most
+        that many seconds for the workers."""
+        self._shut_down = True
+        if cancel_futures:
+            while True:
+                try:
+                    task = self._tasks.get_nowait()
+                except queue.Empty:
+                    break
+                if task is not None:
+                    task[0].cancel()
+        for _ in self._threads:
+            self._tasks.put(None)
+        if wait:
+            deadline = None if timeout is None else time() + timeout
+            for thread in self._threads:
+                thread.join(None if deadline is None else max(0, deadline - time()))
+
+
+class WorkerLoadable(Loadable, FileManagerAware):
+    progressbar_supported = True
+    poll_interval = 0.005
+
+    def __init__(self, gen, descr):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._pools = []
+        Loadable.__init__(self, gen, descr)
+
+    def new_pool(self, workers):
+        pool = DaemonPool(workers)
+        self._pools.append(pool)
+        return pool
+
+    def wait_some(self, futures):
+        """Block for at most poll_interval until one of the futures is done,
+        so that the loader does not spin while the workers are busy."""
+        wait(futures, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def checkpoint(self):
+        """Called by workers between units of work: blocks while the task is
+        paused and raises TaskCancelled once it was removed."""
+        if not self._running.is_set():
+            self._running.wait()
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+    def pause(self):
+        Loadable.pause(self)
+        self._running.clear()
+
+    def unpause(self):
+        Loadable.unpause(self)
+        self._running.set()
+
+    def shutdown(self):
+        for pool in self._pools:
+            pool.shutdown()
+        self._pools = []
+
+    def destroy(self):
+        self._cancelled.set()
+        self._running.set()
+        for pool in self._pools:
+            pool.shutdown(cancel_futures=True, timeout=DESTROY_TIMEOUT)
+        self._pools = []
@@ -0,0 +1,147 @@
+# :yank without a shell pipeline or a process per clipboard target for every
+# yank (see backends.py).
+#
+# Copies are handed to one writer thread, so yanking thousands of paths or
+# waiting for a slow clipboard program does not block the UI; if several
+# copies queue up, only the last one is made.  The "clipboard" option picks
+# the backend: auto, osc52, windows, pbcopy, wl-copy, xclip or xsel.
+# ":yank -w" copies paths in their Windows form on WSL.
+
+from __future__ import (absolute_import, division, print_function)
+
+import queue
+import threading
+
+import ranger.api
+from ranger.api.commands import Command
+from ranger.gui.ui import UI
+
+from .._settings import register_setting
+from .backends import make_backend, windows_path
+
+register_setting('clipboard', str, 'auto')
+
+
+class Clipboard(object):
+    def __init__(self, backend):
+        self.backend = backend
+        self.errors = queue.Queue()
+        self._copies = queue.Queue()
+        self._thread = None
+
+    def copy(self, lines):
+        if self.backend.uses_terminal:
+            self.backend.write(lines)
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='clipboard')
+            self._thread.daemon = True
+            self._thread.start()
+        self._copies.put(lines)
+
+    def _run(self):
+        while True:
+            lines = self._copies.get()
+            while True:
+                try:
+                    lines = self._copies.get_nowait()
+                except queue.Empty:
+                    break
+            if lines is None:
+                return
+            try:
+                self.backend.write(lines)
+            except (OSError, ValueError) as ex:
+                self.errors.put(ex)
+
+    def close(self):
+        if self._thread is not None:
+            self._copies.put(None)
+            self._thread = None
+        self.backend.close()
+
+
+def get_clipboard(fm):
+    """The Clipboard for the backend chosen by the clipboard option, or
+    None if it is not available."""
+    clipboard = fm.__dict__.get('clipboard')
+    if clipboard is None:
+        backend = make_backend(fm.settings.clipboard)
+        if backend is None:
+            return None
+        clipboard = fm.__dict__['clipboard'] = Clipboard(backend)
+    return clipboard
+
+
+_redraw_prev = UI.redraw
+
+
+def redraw(self):
+    clipboard = self.fm.__dict__.get('clipboard')
+    if clipboard is not None and not clipboard.errors.empty():
+        self.fm.notify("Copying to the clipboard failed: {0}".format(
+            clipboard.errors.get_nowait()), bad=True)
+    _redraw_prev(self)
+
+
+UI.redraw = redraw
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    def reset_clipboard(signal):
+        clipboard = signal.fm.__dict__.pop('clipboard', None)
+        if clipboard is not None:
+            clipboard.close()
+
+    fm.settings.signal_bind('setopt.clipboard', reset_clipboard)
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
+
+
+class yank(Command):  # pylint: disable=invalid-name
+    """:yank [-w] [name|dir|path|name_without_extension]
+
+    Copies the file's name (default), directory or path into the clipboard,
+    and into the primary X selection as well if xclip or xsel is used.
+    With -w, paths are copied in their Windows form (WSL).
+    """
+
+    modes = {
+        '': 'basename',
+        'name_without_extension': 'basename_without_extension',
+        'name': 'basename',
+        'dir': 'dirname',
+        'path': 'path',
+    }
+
+    def execute(self):
+        flags, mode = self.parse_flags()
+        if mode not in self.modes:
+            self.fm.notify("Unknown yank mode: " + mode, bad=True)
+            return
+        clipboard = get_clipboard(self.fm)
+        if clipboard is None:
+            self.fm.notify("No clipboard program for clipboard={0}".format(
+                self.fm.settings.clipboard), bad=True)
+            return
+
+        attr = self.modes[mode]
+        lines = [getattr(fobj, attr) for fobj in self.fm.thistab.get_selection()]
+        if attr == 'dirname':
+            lines = list(dict.fromkeys(lines))
+        if 'w' in flags and attr in ('dirname', 'path'):
+            lines = [windows_path(line) for line in lines]
+        if lines:
+            clipboard.copy(lines)
+
+    def tab(self, tabnum):
+        return (
+            self.start(1) + mode for mode
+            in sorted(self.modes.keys())
+            if mode
+        )
+
@@ -0,0 +1,226 @@
+# Ways of putting text into the system clipboard.
+#
+# The text is passed as an iterable of lines and written in chunks, so a
+# selection of many files never becomes one big string.  Programs like xclip
+# take the text once on stdin and exit, so they are started for each copy;
+# on WSL one PowerShell process is kept running and sets the Windows
+# clipboard for every text it receives, which avoids starting a Windows
+# program (slow from WSL) for each copy.  The OSC 52 escape sequence asks
+# the terminal to set the clipboard and needs no program at all, also over
+# ssh.
+
+from __future__ import (absolute_import, division, print_function)
+
+import base64
+import codecs
+import os
+import re
+import subprocess
+import sys
+
+from ranger.ext.get_executables import get_executables
+
+CHUNK_LINES = 256
+
+_WSL_DRIVE_RE = re.compile(r'^/mnt/([a-z])(?=/|$)')
+
+
+def is_wsl():
+    if os.environ.get('WSL_DISTRO_NAME'):
+        return True
+    try:
+        with open('/proc/version', 'r') as fobj:
+            return 'microsoft' in fobj.read().lower()
+    except OSError:
+        return False
+
+
+def windows_path(path):
+    """The Windows form of a WSL path: /mnt/c/x -> C:\\x, other paths go
+    through the \\\\wsl.localhost share of the distribution."""
+    match = _WSL_DRIVE_RE.match(path)
+    if match:
+        rest = path[match.end():] or '/'
+        return match.group(1).upper() + ':' + rest.replace('/', '\\')
+    distro = os.environ.get('WSL_DISTRO_NAME')
+    if distro:
+        return '\\\\wsl.localhost\\' + distro + path.replace('/', '\\')
+    return path.replace('/', '\\')
+
+
+def text_chunks(lines, encoding='utf-8', separator='\n', errors='surrogateescape'):
+    """The lines joined by separator, encoded, in chunks of CHUNK_LINES.
+    errors applies to the bytes of names that are not UTF-8, which only
+    ASCII-compatible encodings can pass through as they are."""
+    batch = []
+    first = True
+    for line in lines:
+        if not first:
+            batch.append(separator)
+        first = False
+        batch.append(line)
+        if len(batch) >= 2 * CHUNK_LINES:
+            yield ''.join(batch).encode(encoding, errors)
+            batch = []
+    if batch:
+        yield ''.join(batch).encode(encoding, errors)
+
+
+class Backend(object):
+    name = None
+    # Whether write() talks to the terminal and must run in the UI thread.
+    uses_terminal = False
+
+    def write(self, lines):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CommandBackend(Backend):
+    """Runs each of the commands for every copy, with the text on stdin."""
+
+    def __init__(self, name, commands, encoding='utf-8', bom=b'',
+                 errors='surrogateescape'):
+        self.name = name
+        self.commands = commands
+        self.encoding = encoding
+        self.bom = bom
+        self.errors = errors
+
+    def write(self, lines):
+        processes = [subprocess.Popen(command, stdin=subprocess.PIPE,
+                                      stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL)
+                     for command in self.commands]
+        try:
+            for process in processes:
+                process.stdin.write(self.bom)
+            for chunk in text_chunks(lines, self.encoding, errors=self.errors):
+                for process in processes:
+                    process.stdin.write(chunk)
+        finally:
+            for process in processes:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+                process.wait()
+
+
+# Reads texts from stdin, each terminated by a line with a single NUL, and
+# puts them into the clipboard with Windows line breaks.
+_POWERSHELL_SCRIPT = r'''
+[Console]::InputEncoding = New-Object Text.UTF8Encoding $false
+$lines = New-Object Collections.Generic.List[string]
+while ($null -ne ($line = [Console]::In.ReadLine())) {
+    if ($line -eq [string][char]0) {
+        if ($lines.Count) { Set-Clipboard -Value ($lines -join "`r`n") }
+        $lines.Clear()
+    } else {
+        $lines.Add($line)
+    }
+}
+'''
+
+
+class PowerShellBackend(Backend):
+    """Sets the Windows clipboard through a PowerShell process that keeps
+    running between copies."""
+    name = 'windows'
+
+    def __init__(self, executable='powershell.exe'):
+        self.executable = executable
+        self.process = None
+
+    def _helper(self):
+        if self.process is None or self.process.poll() is not None:
+            encoded = base64.b64encode(_POWERSHELL_SCRIPT.encode('utf-16-le')).decode('ascii')
+            self.process = subprocess.Popen(
+                [self.executable, '-NoLogo', '-NoProfile', '-NonInteractive',
+                 '-EncodedCommand', encoded],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL)
+        return self.process
+
+    def write(self, lines):
+        stdin = self._helper().stdin
+        try:
+            for chunk in text_chunks(lines):
+                stdin.write(chunk)
+            stdin.write(b'\n\0\n')
+            stdin.flush()
+        except OSError:
+            # The helper died, start a new one next time.
+            self.close()
+            raise
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            self.process = None
+
+
+class Osc52Backend(Backend):
+    """Asks the terminal to set the clipboard.  Inside tmux the sequence is
+    passed through to the outer terminal (needs allow-passthrough)."""
+    name = 'osc52'
+    uses_terminal = True
+
+    def write(self, lines):
+        tmux = bool(os.environ.get('TMUX'))
+        out = getattr(sys.__stdout__, 'buffer', None)
+        if out is None:
+            return
+        start, end = b'\033]52;c;', b'\a'
+        if tmux:
+            start, end = b'\033Ptmux;\033' + start, end + b'\033\\'
+        out.write(start)
+        rest = b''
+        for chunk in text_chunks(lines):
+            # Base64 of pieces that are a multiple of 3 bytes concatenates.
+            data = rest + chunk
+            cut = len(data) - len(data) % 3
+            out.write(base64.b64encode(data[:cut]))
+            rest = data[cut:]
+        out.write(base64.b64encode(rest) + end)
+        out.flush()
+
+
+def make_backend(name='auto'):
+    """The backend called name, or the first usable one for 'auto'.
+    Returns None if there is none."""
+    executables = get_executables()
+    if name == 'auto':
+        if is_wsl() and ('powershell.exe' in executables or 'clip.exe' in executables):
+            name = 'windows'
+        elif 'pbcopy' in executables:
+            name = 'pbcopy'
+        elif os.environ.get('WAYLAND_DISPLAY') and 'wl-copy' in executables:
+            name = 'wl-copy'
+        elif os.environ.get('DISPLAY') and 'xclip' in executables:
+            name = 'xclip'
+        elif os.environ.get('DISPLAY') and 'xsel' in executables:
+            name = 'xsel'
+        else:
+            name = 'osc52'
+    if name == 'osc52':
+        return Osc52Backend()
+    if name == 'windows':
+        if 'powershell.exe' in executables:
+            return PowerShellBackend()
+        return CommandBackend('windows', [['clip.exe']], encoding='utf-16-le',
+                              bom=codecs.BOM_UTF16_LE, errors='backslashreplace')
+    commands = {
+        'pbcopy': [['pbcopy']],
+        'wl-copy': [['wl-copy']],
+        'xclip': [['xclip'], ['xclip', '-selection', 'clipboard']],
+        'xsel': [['xsel'], ['xsel', '-b']],
+    }.get(name)
+    if commands is None or commands[0][0] not in executables:
+        return None
+    return CommandBackend(name, commands)
@@ -0,0 +1,100 @@
+# Makes fm.copy_buffer and fm.do_cut a view of the copy buffer shared by
+# all ranger instances (see store.py).  Yanking or cutting in one instance
+# is visible in every other one at its next UI loop, so :save_copy_buffer
+# and :load_copy_buffer are not needed for that anymore.
+
+from __future__ import (absolute_import, division, print_function)
+
+import ranger
+from ranger.api.commands import Command
+from ranger.core.fm import FM
+from ranger.gui.ui import UI
+
+from .store import CopyBuffer
+
+JOURNAL_FILENAME = 'copy_buffer.journal'
+
+
+def get_copy_buffer(fm):
+    buf = fm.__dict__.get('shared_copy_buffer')
+    if buf is None:
+        filename = None if ranger.args.clean else fm.datapath(JOURNAL_FILENAME)
+        buf = fm.__dict__['shared_copy_buffer'] = CopyBuffer(filename)
+        buf.sync()
+    return buf
+
+
+def _get_copy_buffer(self):
+    return get_copy_buffer(self)
+
+
+def _set_copy_buffer(self, items):
+    buf = get_copy_buffer(self)
+    if items is not buf:
+        buf.replace(items)
+
+
+def _get_do_cut(self):
+    return get_copy_buffer(self).cut
+
+
+def _set_do_cut(self, value):
+    get_copy_buffer(self).set_cut(value)
+
+
+FM.copy_buffer = property(_get_copy_buffer, _set_copy_buffer)
+FM.do_cut = property(_get_do_cut, _set_do_cut)
+
+_redraw_prev = UI.redraw
+
+
+def redraw(self):
+    buf = self.fm.__dict__.get('shared_copy_buffer')
+    if buf is not None and buf.sync():
+        for column in getattr(self.browser, 'columns', ()):
+            column.need_redraw = True
+    _redraw_prev(self)
+
+
+UI.redraw = redraw
+
+
+class load_copy_buffer(Command):  # pylint: disable=invalid-name
+    """:load_copy_buffer
+
+    Load the copy buffer from datadir/copy_buffer, a file with one path
+    per line.  The copy buffer is shared between ranger instances anyway,
+    this is for exchanging it with other programs.
+    """
+    copy_buffer_filename = 'copy_buffer'
+
+    def execute(self):
+        fname = self.fm.datapath(self.copy_buffer_filename)
+        try:
+            with open(fname, 'r') as fobj:
+                paths = [line for line in fobj.read().split('\n') if line]
+        except (OSError, TypeError):
+            return self.fm.notify(
+                "Cannot open %s" % (fname or self.copy_buffer_filename), bad=True)
+        # Paths that vanished are reported when pasting.
+        get_copy_buffer(self.fm).replace(paths, cut=False)
+        self.fm.ui.redraw_main_column()
+        return None
+
+
+class save_copy_buffer(Command):  # pylint: disable=invalid-name
+    """:save_copy_buffer
+
+    Save the copy buffer to datadir/copy_buffer, one path per line.
+    """
+    copy_buffer_filename = 'copy_buffer'
+
+    def execute(self):
+        fname = self.fm.datapath(self.copy_buffer_filename)
+        try:
+            with open(fname, 'w') as fobj:
+                fobj.write("\n".join(get_copy_buffer(self.fm).paths()))
+        except (OSError, TypeError):
+            return self.fm.notify("Cannot open %s" %
+                                  (fname or self.copy_buffer_filename), bad=True)
+        return None
@@ -0,0 +1,191 @@
+# The copy buffer, shared by all ranger instances of a user.
+#
+# The buffer lives in an append-only journal (see _journal.py) in ranger's
+# data directory.  The records are:
+#
+#   S0, S1      start a new buffer (for copying / for cutting)
+#   M0, M1      switch between copying and cutting
+#   D<dir>      directory of the following relative records
+#   +<name>     add <dir>/<name>
+#   -<name>     remove <dir>/<name>
+#
+# Every instance syncs the journal once per UI loop, so a yank in one tmux
+# pane shows up in the others right away.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+from ranger.container.file import File
+
+from .._journal import Journal
+
+
+class BufferedPath(object):
+    """An entry of the copy buffer.  The File object is only created when
+    something other than the path is needed, e.g. when pasting."""
+    __slots__ = ('path', '_file')
+
+    def __init__(self, path, fobj=None):
+        self.path = path
+        self._file = fobj
+
+    @property
+    def basename(self):
+        return os.path.basename(self.path)
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = File(self.path)
+            self._file.load()
+        return self._file
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __eq__(self, other):
+        return getattr(other, 'path', None) == self.path
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __str__(self):
+        return self.path
+
+
+def _path_of(item):
+    return item if isinstance(item, str) else item.path
+
+
+def _encode_paths(paths, sign):
+    """Records for the paths, grouped by directory."""
+    by_dir = {}
+    for path in paths:
+        dirname, name = os.path.split(path)
+        by_dir.setdefault(dirname, []).append(name)
+    records = []
+    for dirname, names in by_dir.items():
+        records.append('D' + dirname)
+        records.extend(sign + name for name in names)
+    return records
+
+
+class CopyBuffer(Journal):
+    """Set-like container of BufferedPath objects backed by the journal
+    (or by nothing if filename is None)."""
+
+    def __init__(self, filename):
+        Journal.__init__(self, filename)
+        self.entries = {}
+        self.cut = False
+
+    def reset(self):
+        self.entries = {}
+        self.cut = False
+
+    def apply(self, records):
+        prefix = ''
+        entries = self.entries
+        for record in records:
+            kind, value = record[0], record[1:]
+            if kind == '+':
+                path = prefix + value
+                if path not in entries:
+                    entries[path] = BufferedPath(path)
+            elif kind == '-':
+                entries.pop(prefix + value, None)
+            elif kind == 'D':
+                prefix = value.rstrip('/') + '/'
+            elif kind == 'S':
+                entries = self.entries = {}
+                self.cut = value == '1'
+            elif kind == 'M':
+                self.cut = value == '1'
+
+    def snapshot(self):
+        return ['S1' if self.cut else 'S0'] + _encode_paths(self.entries, '+')
+
+    # The set interface used by ranger
+
+    def __iter__(self):
+        return iter(list(self.entries.values()))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, item):
+        return _path_of(item) in self.entries
+
+    def paths(self):
+        return list(self.entries)
+
+    def set_cut(self, cut):
+        self._update(lambda: [] if bool(cut) == self.cut else ['M1' if cut else 'M0'])
+
+    def replace(self, items, cut=None):
+        items = list(items)
+        new = set(_path_of(item) for item in items)
+
+        def records():
+            new_cut = self.cut if cut is None else bool(cut)
+            old = set(self.entries)
+            added = [path for path in new if path not in old]
+            removed = [path for path in old if path not in new]
+            if new_cut == self.cut and len(added) + len(removed) < len(new):
+                return _encode_paths(added, '+') + _encode_paths(removed, '-')
+            return ['S1' if new_cut else 'S0'] + _encode_paths(new, '+')
+
+        self._update(records)
+        self._keep_files(items)
+
+    def _keep_files(self, items):
+        """Reuse File objects ranger already has instead of creating new
+        ones later."""
+        for item in items:
+            if isinstance(item, File):
+                entry = self.entries.get(item.path)
+                if entry is not None and entry._file is None:  # pylint: disable=protected-access
+                    entry._file = item  # pylint: disable=protected-access
+
+    def update(self, items):
+        items = list(items)
+        paths = set(_path_of(item) for item in items)
+        self._update(lambda: _encode_paths(
+            [path for path in paths if path not in self.entries], '+'))
+        self._keep_files(items)
+
+    def add(self, item):
+        self.update([item])
+
+    def difference_update(self, items):
+        paths = set(_path_of(item) for item in items)
+        self._update(lambda: _encode_paths(
+            [path for path in paths if path in self.entries], '-'))
+
+    def discard(self, item):
+        self.difference_update([item])
+
+    def remove(self, item):
+        if item not in self:
+            raise KeyError(item)
+        self.discard(item)
+
+    def symmetric_difference_update(self, items):
+        items = list(items)
+        paths = set(_path_of(item) for item in items)
+        self._update(lambda: (
+            _encode_paths([path for path in paths if path not in self.entries], '+')
+            + _encode_paths([path for path in paths if path in self.entries], '-')))
+        self._keep_files(items)
+
+    def clear(self):
+        self._update(lambda: ['S0'] if self.entries or self.cut else [])
@@ -0,0 +1,173 @@
+# Cumulative directory sizes from a persistent cache, computed in the
+# background.
+#
+# "dc" and the autoupdate_cumulative_size option no longer walk the tree in
+# the UI thread: cached sizes are shown right away and a SizeLoader verifies
+# them on a worker pool.  With autoupdate_cumulative_size on, every
+# directory that is loaded gets the sizes of its subdirectories this way,
+# which on a cold cache walks their whole trees.  Those automatic scans stay
+# on the file system of the listed directory and skip the mount points below
+# it, so browsing / does not measure /proc or /mnt/c; browsing inside a
+# mount still measures the subdirectories there.
+
+from __future__ import (absolute_import, division, print_function)
+
+import ranger.api
+import ranger.core.actions
+from ranger.api.commands import Command
+from ranger.container.directory import Directory
+from ranger.ext.human_readable import human_readable
+
+from .._store import get_store
+from .cache import SizeCache, SizeLoader, show_size
+
+# Automatic scans of a tree are skipped if it was verified this recently.
+REVALIDATE_AFTER = 30
+
+
+def get_size_cache(fm):
+    if getattr(fm, 'size_cache', None) is None:
+        fm.size_cache = SizeCache(get_store(fm))
+        fm.size_cache_pending = {}
+    return fm.size_cache
+
+
+def _redraw(fm):
+    for column in getattr(fm.ui.browser, 'columns', ()):
+        column.need_redraw = True
+    fm.ui.redraw_main_column()
+    fm.ui.status.request_redraw()
+
+
+def calculate_sizes(fm, fobjs, refresh=False, one_file_system=False, on_done=None):
+    """Show the cached sizes of the directories fobjs and queue a
+    background scan that verifies them."""
+    cache = get_size_cache(fm)
+    pending = fm.size_cache_pending
+    by_path = {}
+    for fobj in fobjs:
+        # Skip directories that a queued scan is already working on.
+        if refresh or pending.get(fobj.path) not in fm.loader.queue:
+            by_path[fobj.path] = fobj
+        if fobj.stat is not None:
+            entry = cache.get(fobj.stat)
+            if entry is not None:
+                show_size(fobj, entry.total)
+    if not by_path:
+        return None
+
+    def done(loader):
+        for path in by_path:
+            if pending.get(path) is loader:
+                del pending[path]
+        for path, size in loader.sizes.items():
+            show_size(by_path[path], size)
+        _redraw(fm)
+        if on_done is not None:
+            on_done(loader)
+
+    loader = SizeLoader(cache, by_path, refresh, one_file_system, done)
+    pending.update((path, loader) for path in by_path)
+    fm.loader.add(loader, append=True)
+    return loader
+
+
+def look_up_cumulative_size(self):
+    calculate_sizes(self.fm, [self])
+
+
+def get_cumulative_size(self):
+    calculate_sizes(self, [fobj for fobj in self.thistab.get_selection() or ()
+                           if fobj.is_directory], refresh=True)
+    self.ui.status.request_redraw()
+    self.ui.redraw_main_column()
+
+
+def _subdirectories_to_scan(directory):
+    if directory.stat is None:
+        return []
+    cache = directory.fm.size_cache
+    result = []
+    for fobj in directory.files_all:
+        if not fobj.is_directory or fobj.stat is None or not fobj.accessible:
+            continue
+        # Mount points below the listed directory are left alone.
+        if fobj.stat.st_dev != directory.stat.st_dev:
+            continue
+        if fobj.cumulative_size_calculated and \
+                cache.validated_since(fobj.stat, REVALIDATE_AFTER):
+            continue
+        result.append(fobj)
+    return result
+
+
+_load_bit_by_bit_prev = Directory.load_bit_by_bit
+
+
+def load_bit_by_bit(self):
+    yield from _load_bit_by_bit_prev(self)
+    if self.fm.settings.autoupdate_cumulative_size and self.files_all:
+        get_size_cache(self.fm)
+        subdirs = _subdirectories_to_scan(self)
+        if subdirs:
+            calculate_sizes(self.fm, subdirs, one_file_system=True)
+
+
+Directory.look_up_cumulative_size = look_up_cumulative_size
+Directory.load_bit_by_bit = load_bit_by_bit
+ranger.core.actions.Actions.get_cumulative_size = get_cumulative_size
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    # The command for fm.get_cumulative_size was generated before this
+    # plugin was loaded.
+    fm.commands.load_commands_from_object(fm, ['get_cumulative_size'])
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
+
+
+class du(Command):  # pylint: disable=invalid-name
+    """:du [-s]
+
+    Shows the cumulative sizes of the subdirectories of the current
+    directory in the pager, like du --max-depth=1 --apparent-size does.
+    With -s the largest directories come first.  The sizes come from the
+    directory size cache and are shown in the file list as well.
+    """
+
+    def execute(self):
+        sort = self.arg(1) == '-s'
+        cwd = self.fm.thisdir
+        subdirs = [fobj for fobj in cwd.files_all or () if fobj.is_directory]
+        if not subdirs:
+            self.fm.notify('No subdirectories here')
+            return
+        fm = self.fm
+
+        def show(loader):
+            if fm.thisdir is not cwd:
+                return
+            sizes = [(loader.sizes.get(fobj.path, fobj.size or 0), fobj.relative_path)
+                     for fobj in subdirs if fobj.cumulative_size_calculated]
+            files = sum(fobj.size or 0 for fobj in cwd.files_all if not fobj.is_directory)
+            total = files + sum(size for size, _ in sizes)
+            if sort:
+                sizes.sort(reverse=True)
+            lines = ['{0}\t{1}'.format(human_readable(size, separator=''), name)
+                     for size, name in sizes]
+            lines.append('{0}\t.'.format(human_readable(total, separator='')))
+            if sort:
+                lines.insert(0, lines.pop())
+            pager = fm.ui.open_pager()
+            pager.set_source(lines)
+
+        # Scans that are already queued for some of these directories are
+        # not waited for, this one covers all of them.
+        get_size_cache(fm)
+        for fobj in subdirs:
+            fm.size_cache_pending.pop(fobj.path, None)
+        calculate_sizes(fm, subdirs, on_done=show)
@@ -0,0 +1,213 @@
+# Cumulative directory sizes, cached per directory.
+#
+# Every directory that was scanned is remembered under its (device, inode)
+# together with its mtime, the apparent size of the files directly in it and
+# the names of its subdirectories.  A directory's mtime changes whenever an
+# entry is added, removed or renamed, so while it matches, the directory does
+# not have to be listed again and its files do not have to be stat()ed: a
+# rescan of an unchanged tree costs one stat() per directory.  Files that
+# changed size in place are only picked up by a forced rescan (see "dc").
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import time
+
+from ranger.ext.human_readable import human_readable
+
+from .._workers import WorkerLoadable
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dir_sizes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    own INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    children TEXT NOT NULL,
+    PRIMARY KEY (dev, ino)
+);
+'''
+
+
+class CachedDir(object):
+    __slots__ = ('mtime', 'own', 'total', 'children')
+
+    def __init__(self, mtime, own, total, children):
+        self.mtime = mtime
+        self.own = own
+        self.total = total
+        self.children = children
+
+
+class SizeCache(object):
+    """(device, inode) -> CachedDir, backed by the plugin store."""
+
+    def __init__(self, store):
+        self.store = store
+        self.store.create(SCHEMA)
+        # (dev, ino) -> CachedDir, or None if the store has none; rows are
+        # looked up one at a time, so the UI never waits for the whole table.
+        self._entries = {}
+        self._validated = {}
+
+    def _entry(self, key):
+        try:
+            return self._entries[key]
+        except KeyError:
+            pass
+        rows = self.store.query(
+            'SELECT mtime, own, total, children FROM dir_sizes WHERE dev = ? AND ino = ?', key)
+        entry = None
+        if rows:
+            mtime, own, total, children = rows[0]
+            entry = CachedDir(mtime, own, total, children.split('\0') if children else [])
+        return self._entries.setdefault(key, entry)
+
+    def get(self, st):
+        """The cached entry for a directory with this stat result, or None
+        if it is unknown or was modified since."""
+        entry = self._entry((st.st_dev, st.st_ino))
+        if entry is None or entry.mtime != st.st_mtime_ns:
+            return None
+        return entry
+
+    def validated_since(self, st, seconds):
+        """Whether the tree under this directory was verified recently."""
+        then = self._validated.get((st.st_dev, st.st_ino))
+        return then is not None and time.time() - then < seconds
+
+    def update(self, changed, validated):
+        """Store the changed entries, a dict (dev, ino) -> CachedDir, and
+        remember the keys of the validated trees."""
+        now = time.time()
+        for key in validated:
+            self._validated[key] = now
+        if not changed:
+            return
+        self._entries.update(changed)
+        self.store.write(
+            'INSERT OR REPLACE INTO dir_sizes VALUES (?, ?, ?, ?, ?, ?)',
+            [(dev, ino, entry.mtime, entry.own, entry.total, '\0'.join(entry.children))
+             for (dev, ino), entry in changed.items()])
+
+
+def show_size(fobj, size):
+    fobj.cumulative_size_calculated = True
+    fobj.size = size
+    fobj.infostring = ('-> ' if fobj.is_link else ' ') + human_readable(size)
+
+
+class _Node(object):
+    __slots__ = ('key', 'mtime', 'own', 'children', 'fresh', 'cached')
+
+    def __init__(self, key, mtime, own, children, fresh, cached=None):
+        self.key = key
+        self.mtime = mtime
+        self.own = own
+        self.children = children
+        self.fresh = fresh
+        self.cached = cached
+
+
+class SizeLoader(WorkerLoadable):
+    """Computes the cumulative sizes of directories on a worker pool.
+
+    With refresh, every directory is listed again; otherwise unchanged
+    directories are taken from the cache.  With one_file_system the walk
+    does not descend into other mounted file systems, like du -x.
+    """
+    progressbar_supported = False
+    workers = 8
+
+    def __init__(self, cache, paths, refresh=False, one_file_system=False,
+                 on_done=None):
+        self.cache = cache
+        self.paths = list(paths)
+        self.refresh = refresh
+        self.one_file_system = one_file_system
+        self.on_done = on_done
+        self.sizes = {}
+        self.scanned = 0
+        self.errors = []
+        WorkerLoadable.__init__(self, self.generate(), self._describe())
+
+    def _describe(self):
+        if len(self.paths) == 1:
+            what = self.paths[0]
+        else:
+            what = '{0} directories in {1}'.format(
+                len(self.paths), os.path.dirname(self.paths[0]))
+        return 'calculating size: {0} ({1} directories)'.format(what, self.scanned)
+
+    def _visit(self, path, device, follow):
+        self.checkpoint()
+        st = os.stat(path) if follow else os.lstat(path)
+        if device is not None and st.st_dev != device:
+            return None
+        key = (st.st_dev, st.st_ino)
+        entry = None if self.refresh else self.cache.get(st)
+        if entry is not None:
+            return _Node(key, st.st_mtime_ns, entry.own, entry.children, False, entry)
+
+        own = 0
+        children = []
+        with os.scandir(path) as entries:
+            for dirent in entries:
+                try:
+                    if dirent.is_dir(follow_symlinks=False):
+                        children.append(dirent.name)
+                    else:
+                        own += dirent.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+        return _Node(key, st.st_mtime_ns, own, children, True)
+
+    def generate(self):
+        pool = self.new_pool(self.workers)
+        nodes = {}
+        order = []
+        devices = {}
+        level = [(path, True) for path in self.paths]
+        while level:
+            futures = []
+            for path, follow in level:
+                device = devices.get(os.path.dirname(path)) if not follow else None
+                futures.append((path, pool.submit(self._visit, path, device, follow)))
+            level = []
+            for path, future in futures:
+                while not future.done():
+                    self.wait_some([future])
+                    self.description = self._describe()
+                    yield
+                if future.exception() is not None:
+                    self.errors.append((path, future.exception()))
+                    continue
+                node = future.result()
+                if node is None:
+                    continue
+                self.scanned += 1
+                nodes[path] = node
+                order.append(path)
+                if self.one_file_system:
+                    devices[path] = node.key[0]
+                level.extend((os.path.join(path, name), False) for name in node.children)
+        self.shutdown()
+
+        # Children were visited after their parents, so going backwards
+        # every subtree is summed up before the directory containing it.
+        changed = {}
+        totals = {}
+        for path in reversed(order):
+            node = nodes[path]
+            total = node.own + sum(totals.get(os.path.join(path, name), 0)
+                                   for name in node.children)
+            totals[path] = total
+            if node.fresh or node.cached.total != total:
+                changed[node.key] = CachedDir(node.mtime, node.own, total, node.children)
+        self.cache.update(changed, [nodes[path].key for path in self.paths
+                                    if path in nodes])
+        self.sizes = dict((path, totals[path]) for path in self.paths if path in totals)
+
+        if self.on_done is not None:
+            self.on_done(self)
@@ -0,0 +1,126 @@
+# filter_stack's hash, duplicate and unique filters on top of a staged,
+# cached comparison that runs in the background (see hashing.py).
+#
+# The filters let everything through while the files are being compared
+# and narrow the directory down once the result is there.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+from ranger.core.filter_stack import BaseFilter, stack_filter
+from ranger.core.shared import FileManagerAware
+
+from .._store import get_store
+from .hashing import DuplicateLoader, HashCache
+
+
+def get_hash_cache(fm):
+    if getattr(fm, 'hash_cache', None) is None:
+        fm.hash_cache = HashCache(get_store(fm))
+    return fm.hash_cache
+
+
+class ContentFilter(BaseFilter, FileManagerAware):
+    """Base for filters whose set of accepted paths is computed from the
+    file contents by a DuplicateLoader."""
+    name = None
+    # Bumped when the accepted paths change, so that the answers kept by
+    # plugins/filterstack are asked again.
+    revision = 0
+
+    def __init__(self, paths):
+        self.accepted = None
+        self.directory = self.fm.thisdir
+        loader = DuplicateLoader(get_hash_cache(self.fm), paths,
+                                 self.directory.path, self._done)
+        self.fm.loader.add(loader)
+
+    def select(self, groups):
+        raise NotImplementedError
+
+    def _done(self, loader):
+        self.accepted = self.select(loader.groups)
+        self.revision += 1
+        if self.directory.filter_stack:
+            self.directory.refilter()
+        self.fm.ui.redraw_main_column()
+
+    def __call__(self, fobj):
+        if self.accepted is None:
+            return True
+        return fobj.path in self.accepted
+
+    def describe(self):
+        return self.name
+
+    def __str__(self):
+        return '<Filter: {0}{1}>'.format(
+            self.describe(), ' (comparing...)' if self.accepted is None else '')
+
+
+def _file_paths(directory):
+    return [fobj.path for fobj in directory.files_all or ()
+            if not fobj.is_directory]
+
+
+@stack_filter("hash")
+class HashFilter(ContentFilter):
+    name = 'hash'
+
+    def __init__(self, filepath=None):
+        if not filepath:
+            filepath = self.fm.thisfile.path if self.fm.thisfile else None
+        if filepath is None:
+            self.fm.notify("Error: No file selected for hashing!", bad=True)
+        self.filepath = os.path.abspath(filepath) if filepath else None
+        # Only files of the same size can match, the others are not hashed.
+        candidates = set()
+        try:
+            size = os.stat(self.filepath).st_size
+        except (OSError, TypeError):
+            pass
+        else:
+            candidates.add(self.filepath)
+            candidates.update(fobj.path for fobj in self.fm.thisdir.files_all or ()
+                              if not fobj.is_directory and fobj.stat is not None
+                              and fobj.stat.st_size == size)
+        ContentFilter.__init__(self, candidates)
+
+    def select(self, groups):
+        for group in groups:
+            if self.filepath in group:
+                return set(group)
+        return set()
+
+    def describe(self):
+        return 'hash {0}'.format(self.filepath)
+
+
+@stack_filter("duplicate")
+class DuplicateFilter(ContentFilter):
+    name = 'duplicate'
+
+    def __init__(self, _):
+        ContentFilter.__init__(self, _file_paths(self.fm.thisdir))
+
+    def select(self, groups):
+        return set(path for group in groups if len(group) >= 2 for path in group)
+
+
+@stack_filter("unique")
+class UniqueFilter(ContentFilter):
+    """Accepts one file of every group of equal files, the oldest one."""
+    name = 'unique'
+
+    def __init__(self, _):
+        ContentFilter.__init__(self, _file_paths(self.fm.thisdir))
+
+    def select(self, groups):
+        unique = set()
+        for group in groups:
+            try:
+                unique.add(min(group, key=lambda path: os.stat(path).st_ctime))
+            except OSError:
+                unique.add(group[0])
+        return unique
@@ -0,0 +1,195 @@
+# Staged content comparison for the duplicate filters.
+#
+# Files can only be equal if their sizes are, so they are first grouped by
+# size.  Within a group of equal sizes the first and last SAMPLE bytes are
+# hashed, and only files whose samples collide are read completely.  Digests
+# are cached per (device, inode) together with mtime and size, so filtering
+# the same directory again does not read anything.
+
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+import os
+import stat
+
+from .._workers import WorkerLoadable
+
+SAMPLE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS file_hashes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sample TEXT,
+    full TEXT,
+    PRIMARY KEY (dev, ino)
+);
+'''
+
+
+def sample_digest(path, size):
+    """Digest of the first and last SAMPLE bytes.  For files of at most
+    2 * SAMPLE bytes this covers the whole file."""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as fobj:
+        digest.update(fobj.read(SAMPLE))
+        if size > 2 * SAMPLE:
+            fobj.seek(size - SAMPLE)
+        digest.update(fobj.read(SAMPLE))
+    return digest.hexdigest()
+
+
+def full_digest(path, checkpoint):
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as fobj:
+        for chunk in iter(lambda: fobj.read(CHUNK_SIZE), b''):
+            checkpoint()
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache(object):
+    """(device, inode) -> [mtime, size, sample, full], backed by the plugin
+    store.  Entries of files whose mtime or size changed are ignored."""
+
+    def __init__(self, store):
+        self.store = store
+        self.store.create(SCHEMA)
+        # (dev, ino) -> entry, or None if the store has none; rows are looked
+        # up one at a time, only for files that have others of their size.
+        self.entries = {}
+        self._dirty = set()
+
+    def _entry(self, key):
+        try:
+            return self.entries[key]
+        except KeyError:
+            pass
+        rows = self.store.query(
+            'SELECT mtime, size, sample, full FROM file_hashes WHERE dev = ? AND ino = ?', key)
+        return self.entries.setdefault(key, list(rows[0]) if rows else None)
+
+    def get(self, st, field):
+        entry = self._entry((st.st_dev, st.st_ino))
+        if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+            return None
+        return entry[2 if field == 'sample' else 3]
+
+    def put(self, st, field, digest):
+        key = (st.st_dev, st.st_ino)
+        entry = self._entry(key)
+        if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+            entry = self.entries[key] = [st.st_mtime_ns, st.st_size, None, None]
+        entry[2 if field == 'sample' else 3] = digest
+        self._dirty.add(key)
+
+    def flush(self):
+        self.store.write(
+            'INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?, ?)',
+            [key + tuple(self.entries[key]) for key in self._dirty])
+        self._dirty = set()
+
+
+def regular_files(paths):
+    """(path, stat) for the paths that are regular files, not links."""
+    result = []
+    for path in paths:
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            result.append((path, st))
+    return result
+
+
+class DuplicateLoader(WorkerLoadable):
+    """Groups paths by content.  When done, self.groups is a list of lists
+    of paths with equal content, including single-element lists for files
+    without duplicates."""
+    progressbar_supported = True
+    workers = 4
+
+    def __init__(self, cache, paths, description, on_done):
+        self.cache = cache
+        self.paths = list(paths)
+        self.on_done = on_done
+        self.groups = []
+        self.errors = []
+        self.hashed = 0
+        self.to_hash = 0
+        self._what = description
+        WorkerLoadable.__init__(self, self.generate(), self._describe())
+
+    def _describe(self):
+        return 'comparing {0}: {1}/{2} files hashed'.format(
+            self._what, self.hashed, self.to_hash)
+
+    def _digest(self, path, st, field):
+        self.checkpoint()
+        if field == 'sample':
+            return sample_digest(path, st.st_size)
+        return full_digest(path, self.checkpoint)
+
+    def _split(self, pool, groups, field):
+        """Split every group of (path, stat) by the digest field of its
+        members, hashing only what is not cached."""
+        digests = {}
+        futures = []
+        for group in groups:
+            for path, st in group:
+                digest = self.cache.get(st, field)
+                if digest is None:
+                    futures.append((path, st, pool.submit(self._digest, path, st, field)))
+                else:
+                    digests[path] = digest
+        self.to_hash += len(futures)
+        for path, st, future in futures:
+            while not future.done():
+                self.wait_some([future])
+                self.percent = self.hashed * 100. / max(1, self.to_hash)
+                self.description = self._describe()
+                yield
+            self.hashed += 1
+            if future.exception() is not None:
+                self.errors.append((path, future.exception()))
+                continue
+            digests[path] = future.result()
+            self.cache.put(st, field, digests[path])
+
+        result = []
+        for group in groups:
+            by_digest = {}
+            for path, st in group:
+                if path in digests:
+                    by_digest.setdefault(digests[path], []).append((path, st))
+            result.extend(by_digest.values())
+        return result
+
+    def generate(self):
+        by_size = {}
+        for path, st in regular_files(self.paths):
+            by_size.setdefault(st.st_size, []).append((path, st))
+        done = [group for size, group in by_size.items() if len(group) == 1 or size == 0]
+        pending = [group for size, group in by_size.items() if len(group) > 1 and size > 0]
+
+        pool = self.new_pool(self.workers)
+        pending = yield from self._split(pool, pending, 'sample')
+        done.extend(group for group in pending
+                    if len(group) == 1 or group[0][1].st_size <= 2 * SAMPLE)
+        pending = [group for group in pending
+                   if len(group) > 1 and group[0][1].st_size > 2 * SAMPLE]
+        pending = yield from self._split(pool, pending, 'full')
+        done.extend(pending)
+        self.shutdown()
+        self.cache.flush()
+
+        self.groups = [[path for path, _ in group] for group in done]
+        if self.errors:
+            path, ex = self.errors[0]
+            self.fm.notify('Could not read {0} files, e.g. {1}: {2}'.format(
+                len(self.errors), path, ex), bad=True)
+        self.on_done(self)
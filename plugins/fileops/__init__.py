@@ -0,0 +1,423 @@
+# Replacements for ranger's file operation commands that do the work
+# in-process instead of forking a shell per file.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+import ranger.api
+import ranger.core.actions
+from ranger.api.commands import Command
+from ranger.container.file import File
+from ranger.gui.widgets.statusbar import StatusBar
+
+from .chmod import ChmodLoader, chmod_entry, refresh_files
+from .copy import ParallelCopyLoader
+from .modes import parse_mode
+from .names import SafeNameAllocator
+from .remove import DeleteLoader, is_directory_with_files
+from .rename import RenameError, RenameJournal, apply_plan, plan_renames
+from .tagging import migrate_tags, untag_trees
+from .trash import Trasher, TrashIndex
+
+
+def paste(self, overwrite=False, append=False, dest=None, make_safe_path=None):
+    """:paste
+
+    Paste the selected items into the current directory or to dest
+    if provided.
+    """
+    if dest is None:
+        dest = self.thistab.path
+    if os.path.isdir(dest):
+        loadable = ParallelCopyLoader(self.copy_buffer, self.do_cut, overwrite,
+                                      dest, make_safe_path)
+        self.loader.add(loadable, append=append)
+        self.do_cut = False
+    else:
+        self.notify('Failed to paste. The destination is invalid.', bad=True)
+
+
+def delete(self, files=None):
+    # COMPAT: old command.py use fm.delete() without arguments
+    if files is None:
+        files = (fobj.path for fobj in self.thistab.get_selection())
+    files = [os.path.abspath(path) for path in files]
+    if not files:
+        return
+    self.notify("Deleting {0}!".format(
+        files[0] if len(files) == 1 else "{0} items".format(len(files))))
+
+    untag_trees(self, files)
+    deleted = set(files)
+    self.copy_buffer = set(fobj for fobj in self.copy_buffer
+                           if fobj.path not in deleted)
+    self.loader.add(DeleteLoader(files))
+
+
+def describe_files(files, limit=3):
+    """A short description of a list of file names for prompts."""
+    if len(files) <= limit:
+        return ', '.join(files)
+    return '{0} files ({1}, ...)'.format(len(files), ', '.join(files[:limit]))
+
+
+def get_trasher(fm):
+    if getattr(fm, 'trasher', None) is None:
+        fm.trasher = Trasher(TrashIndex(fm.datapath('trash_index')))
+    return fm.trasher
+
+
+ranger.core.actions.Actions.paste = paste
+ranger.core.actions.Actions.delete = delete
+
+_get_right_part_prev = StatusBar._get_right_part
+
+
+def _get_right_part(self, bar):
+    if self.settings.draw_progress_bar_in_status_bar:
+        for item in self.fm.loader.queue:
+            summary = getattr(item, 'progress_summary', None)
+            summary = summary and summary()
+            if summary:
+                bar.right.add(summary, 'loaded')
+                bar.right.add('  ', 'space')
+                break
+    return _get_right_part_prev(self, bar)
+
+
+StatusBar._get_right_part = _get_right_part
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    # The command for fm.paste was generated before this plugin was loaded.
+    fm.commands.load_commands_from_object(fm, ['paste'])
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
+
+
+class chmod(Command):
+    """:chmod [-R] <mode>
+
+    Sets the permissions of the selection to the given mode: an octal
+    number or a symbolic mode like chmod(1) accepts, e.g. u+x, go-w, a+X
+    or u=rwx,g=rx,o=.
+
+    The octal number is between 0 and 777. The digits specify the
+    permissions for the user, the group and others.
+
+    A 1 permits execution, a 2 permits writing, a 4 permits reading.
+    Add those numbers to combine them. So a 7 permits everything.
+
+    With -R the contents of selected directories are changed as well, in
+    the background (see the task view).  Only entries whose mode differs
+    are changed, and only those are refreshed afterwards.
+    """
+
+    def execute(self):
+        recursive = self.arg(1) == '-R'
+        mode_str = self.rest(2 if recursive else 1)
+        if not mode_str:
+            if self.quantifier is None:
+                self.fm.notify("Syntax: chmod [-R] <mode> "
+                               "or specify a quantifier", bad=True)
+                return
+            mode_str = str(self.quantifier)
+
+        try:
+            new_mode = parse_mode(mode_str)
+        except ValueError:
+            self.fm.notify("Need an octal number between 0 and 777 "
+                           "or a symbolic mode like u+x!", bad=True)
+            return
+
+        selection = [fobj.path for fobj in self.fm.thistab.get_selection()]
+        if not selection:
+            return
+        if recursive:
+            self.fm.loader.add(ChmodLoader(selection, new_mode, mode_str))
+            return
+
+        changed = []
+        for path in selection:
+            try:
+                if chmod_entry(path, os.stat(path).st_mode, new_mode):
+                    changed.append(path)
+            except OSError as ex:
+                self.fm.notify(ex)
+        refresh_files(self.fm, changed)
+
+
+class bulkrename(Command):
+    """:bulkrename [-r]
+
+    This command opens a list of selected files in an external editor.
+    After you edit and save the file, the resulting renames are listed in
+    the editor once more for you to review.  Delete a line to skip that
+    rename, clear the file to abort.
+
+    The renames are planned as a whole and done in-process: swaps and
+    cycles go through temporary names, missing directories are created,
+    and if any rename fails all previous ones are rolled back.
+
+    With -r, roll back a bulk rename that was interrupted (e.g. because
+    ranger was killed) using the journal it left behind.
+    """
+
+    journal_filename = 'bulkrename_journal'
+    review_header = [
+        "# The following renames will be done when you close the editor.",
+        "# Please double-check everything, clear the file to abort.",
+        "# Delete a line to skip it.  Missing directories are created and",
+        "# swaps or cycles are resolved automatically.",
+    ]
+
+    def execute(self):
+        flags, _ = self.parse_flags()
+        journal_path = self.fm.datapath(self.journal_filename)
+        if 'r' in flags:
+            self._rollback(journal_path)
+            return
+        if journal_path and os.path.exists(journal_path):
+            self.fm.notify("An interrupted bulk rename was found, "
+                           "run :bulkrename -r to roll it back", bad=True)
+            return
+
+        cwd = self.fm.thisdir
+        filenames = [f.relative_path for f in self.fm.thistab.get_selection()]
+        new_filenames = self._edit_lines(filenames)
+        if all(a == b for a, b in zip(filenames, new_filenames)):
+            self.fm.notify("No renaming to be done!")
+            return
+
+        pairs = [(old, new) for old, new in zip(filenames, new_filenames)
+                 if old != new and new]
+        try:
+            pairs = self._review(pairs)
+            if not pairs:
+                self.fm.notify("No renaming to be done!")
+                return
+            plan = plan_renames((os.path.join(cwd.path, old),
+                                 os.path.join(cwd.path, new))
+                                for old, new in pairs)
+        except (RenameError, ValueError) as ex:
+            self.fm.notify("bulkrename: {0}".format(ex), bad=True)
+            return
+
+        try:
+            journal = RenameJournal(journal_path)
+            apply_plan(plan, journal)
+        except OSError as ex:
+            if getattr(ex, 'rollback_failures', None):
+                self.fm.notify("bulkrename failed and could not be fully rolled "
+                               "back, run :bulkrename -r to try again: "
+                               "{0}".format(ex), bad=True, exception=ex)
+            else:
+                self.fm.notify("bulkrename failed, nothing was renamed: "
+                               "{0}".format(ex), bad=True)
+        else:
+            migrate_tags(self.fm, plan.pairs)
+            self.fm.notify("Renamed {0} files".format(len(plan)))
+        cwd.content_outdated = True
+
+    def _edit_lines(self, lines):
+        import tempfile
+        from ranger.container.file import File
+
+        with tempfile.NamedTemporaryFile(delete=False) as listfile:
+            listpath = listfile.name
+            listfile.write("\n".join(lines).encode(
+                encoding="utf-8", errors="surrogateescape"))
+        self.fm.execute_file([File(listpath)], app='editor')
+        with open(listpath, 'r', encoding="utf-8",
+                  errors="surrogateescape") as listfile:
+            result = listfile.read().split("\n")
+        os.unlink(listpath)
+        return result
+
+    def _review(self, pairs):
+        """Let the user review the renames in an editor and return the pairs
+        that are left after editing."""
+        import shlex
+        from ranger.ext.shell_escape import shell_escape as esc
+
+        lines = self.review_header + [
+            "mv -- {0} {1}".format(esc(old), esc(new)) for old, new in pairs]
+        reviewed = []
+        for line in self._edit_lines(lines):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            words = shlex.split(line)
+            if len(words) != 4 or words[:2] != ['mv', '--']:
+                raise ValueError("cannot parse line: " + line)
+            reviewed.append((words[2], words[3]))
+        return reviewed
+
+    def _rollback(self, journal_path):
+        if not journal_path or not os.path.exists(journal_path):
+            self.fm.notify("No interrupted bulk rename found")
+            return
+        failed = RenameJournal.load(journal_path).rollback()
+        if failed:
+            self.fm.notify("Could not undo {0} renames, e.g. {1}; run :bulkrename -r "
+                           "to try again".format(len(failed), failed[0][1]), bad=True)
+        else:
+            self.fm.notify("Interrupted bulk rename rolled back")
+        self.fm.thisdir.content_outdated = True
+
+
+class paste_ext(Command):
+    """
+    :paste_ext
+
+    Like paste but tries to rename conflicting files so that the
+    file extension stays intact (e.g. file_.ext).
+
+    Each destination directory is listed once per paste and the safe
+    names for all pasted files are allocated from that listing.
+    """
+
+    def execute(self):
+        return self.fm.paste(make_safe_path=SafeNameAllocator(keep_extension=True))
+
+
+class delete(Command):
+    """:delete
+
+    Tries to delete the selection or the files passed in arguments (if any).
+    The arguments use a shell-like escaping.
+
+    "Selection" is defined as all the "marked files" (by default, you
+    can mark files with space or v). If there are no marked files,
+    use the "current file" (where the cursor is)
+
+    When attempting to delete non-empty directories or multiple
+    marked files, it will require a confirmation.
+
+    The files are deleted in the background, see the task view (w).
+    """
+
+    allow_abbrev = False
+    escape_macros_for_shell = True
+
+    def execute(self):
+        import shlex
+        from functools import partial
+
+        if self.rest(1):
+            files = shlex.split(self.rest(1))
+            many_files = (len(files) > 1 or is_directory_with_files(files[0]))
+        else:
+            cwd = self.fm.thisdir
+            tfile = self.fm.thisfile
+            if not cwd or not tfile:
+                self.fm.notify("Error: no file selected for deletion!", bad=True)
+                return
+
+            # relative_path used for a user-friendly output in the confirmation.
+            files = [f.relative_path for f in self.fm.thistab.get_selection()]
+            many_files = (cwd.marked_items or is_directory_with_files(tfile.path))
+
+        confirm = self.fm.settings.confirm_on_delete
+        if confirm != 'never' and (confirm != 'multiple' or many_files):
+            self.fm.ui.console.ask(
+                "Confirm deletion of: %s (y/N)" % describe_files(files),
+                partial(self._question_callback, files),
+                ('n', 'N', 'y', 'Y'),
+            )
+        else:
+            # no need for a confirmation, just delete
+            self.perform(files)
+
+    def perform(self, files):
+        self.fm.delete(files)
+
+    def tab(self, tabnum):
+        return self._tab_directory_content()
+
+    def _question_callback(self, files, answer):
+        if answer == 'y' or answer == 'Y':
+            self.perform(files)
+
+
+class trash(delete):
+    """:trash
+
+    Tries to move the selection or the files passed in arguments (if any) to
+    the trash, following the freedesktop.org trash specification.
+    The arguments use a shell-like escaping.
+
+    "Selection" is defined as all the "marked files" (by default, you
+    can mark files with space or v). If there are no marked files,
+    use the "current file" (where the cursor is)
+
+    When attempting to trash non-empty directories or multiple
+    marked files, it will require a confirmation.
+
+    Files are renamed into the trash directory of their own file system.
+    Files for which that is not possible are passed on to the rifle rules
+    with label "trash".  Use :trash_restore to get files back.
+    """
+
+    def perform(self, files):
+        paths = [os.path.abspath(path) for path in files]
+        failed = get_trasher(self.fm).trash(paths)
+        if failed:
+            self.fm.execute_file([File(path) for path, _ in failed], label='trash')
+        trashed = set(paths).difference(path for path, _ in failed)
+        self.fm.copy_buffer = set(fobj for fobj in self.fm.copy_buffer
+                                  if fobj.path not in trashed)
+        self.fm.notify("Trashed {0}".format(
+            describe_files([os.path.basename(path) for path in sorted(trashed)])))
+        self.fm.thisdir.request_reload()
+
+
+class trash_restore(Command):
+    """:trash_restore [<filename>...]
+
+    Restores files that were moved to the trash with :trash.  Without
+    arguments the most recently trashed batch of files is restored,
+    otherwise the given files, which are looked up by their original
+    location.  Tab completion lists what was trashed from the current
+    directory.
+    """
+
+    def execute(self):
+        import shlex
+
+        trasher = get_trasher(self.fm)
+        if self.rest(1):
+            entries = []
+            for path in shlex.split(self.rest(1)):
+                entry = trasher.index.latest(os.path.abspath(path))
+                if entry is None:
+                    self.fm.notify("Not in the trash: " + path, bad=True)
+                    return
+                entries.append(entry)
+        else:
+            entries = trasher.index.last_batch()
+            if not entries:
+                self.fm.notify("Nothing to restore")
+                return
+
+        failed = trasher.restore(entries)
+        if failed:
+            path, reason = failed[0]
+            self.fm.notify("Could not restore {0} files, e.g. {1}: {2}".format(
+                len(failed), path, reason), bad=True)
+        else:
+            self.fm.notify("Restored {0}".format(describe_files(
+                [os.path.basename(entry['path']) for entry in entries])))
+        self.fm.thisdir.request_reload()
+
+    def tab(self, tabnum):
+        from ranger.ext.shell_escape import shell_escape as esc
+
+        entries = get_trasher(self.fm).index.items_in(self.fm.thisdir.path)
+        return (self.start(1) + esc(os.path.basename(entry['path']))
+                for entry in entries)
@@ -0,0 +1,126 @@
+# Recursive chmod on a worker pool.
+#
+# Each pool job handles one directory: it changes the entries whose mode
+# differs from the requested one and returns the subdirectories as new jobs.
+# Symbolic links are neither changed nor followed, like chmod -R does.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import stat
+
+from .._workers import WorkerLoadable
+
+
+def chmod_entry(path, st_mode, new_mode):
+    """Apply new_mode (a function from parse_mode) to path.  Returns True
+    if the mode had to be changed."""
+    old = stat.S_IMODE(st_mode)
+    new = new_mode(old, stat.S_ISDIR(st_mode))
+    if new == old:
+        return False
+    os.chmod(path, new)
+    return True
+
+
+def refresh_files(fm, paths):
+    """Re-stat the File objects of the given paths in directories that are
+    loaded, instead of reloading whole directories."""
+    by_dir = {}
+    for path in paths:
+        by_dir.setdefault(os.path.dirname(path), set()).add(path)
+    for dirname, changed in by_dir.items():
+        directory = fm.directories.get(dirname)
+        if directory is None or not directory.files_all:
+            continue
+        for fobj in directory.files_all:
+            if fobj.path in changed:
+                fobj.load()
+    fm.ui.redraw_main_column()
+    fm.ui.status.request_redraw()
+
+
+class ChmodLoader(WorkerLoadable):
+    progressbar_supported = False
+    workers = 8
+
+    def __init__(self, paths, new_mode, mode_str):
+        self.paths = list(paths)
+        self.new_mode = new_mode
+        self.mode_str = mode_str
+        self.changed = []
+        self.visited = 0
+        self.errors = []
+        WorkerLoadable.__init__(self, self.generate(), self._describe())
+
+    def _describe(self):
+        return 'chmod -R {0}: {1} ({2} entries checked, {3} changed)'.format(
+            self.mode_str, self.paths[0] if len(self.paths) == 1 else
+            os.path.dirname(self.paths[0]), self.visited, len(self.changed))
+
+    def _chmod(self, path, st_mode):
+        try:
+            if chmod_entry(path, st_mode, self.new_mode):
+                self.changed.append(path)
+        except OSError as ex:
+            self.errors.append((path, ex))
+
+    def _walk(self, path):
+        """Change the entries of one directory.  Returns its subdirectories
+        and the number of entries."""
+        self.checkpoint()
+        subdirs = []
+        count = 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                count += 1
+                try:
+                    st_mode = entry.stat(follow_symlinks=False).st_mode
+                except OSError as ex:
+                    self.errors.append((entry.path, ex))
+                    continue
+                if stat.S_ISLNK(st_mode):
+                    continue
+                if stat.S_ISDIR(st_mode):
+                    subdirs.append(entry.path)
+                self._chmod(entry.path, st_mode)
+        return subdirs, count
+
+    def generate(self):
+        pool = self.new_pool(self.workers)
+        level = []
+        for path in self.paths:
+            try:
+                st_mode = os.lstat(path).st_mode
+            except OSError as ex:
+                self.errors.append((path, ex))
+                continue
+            if stat.S_ISLNK(st_mode):
+                continue
+            self._chmod(path, st_mode)
+            if stat.S_ISDIR(st_mode):
+                level.append(path)
+
+        # Directories are changed before they are entered, so that e.g.
+        # u+rx makes unreadable trees walkable.
+        while level:
+            futures = [(path, pool.submit(self._walk, path)) for path in level]
+            level = []
+            for path, future in futures:
+                while not future.done():
+                    self.wait_some([future])
+                    self.description = self._describe()
+                    yield
+                if future.exception() is not None:
+                    self.errors.append((path, future.exception()))
+                else:
+                    subdirs, count = future.result()
+                    level.extend(subdirs)
+                    self.visited += count
+        self.shutdown()
+
+        if self.errors:
+            path, ex = self.errors[0]
+            self.fm.notify('chmod failed for {0} files, e.g. {1}: {2}'.format(
+                len(self.errors), path, ex), bad=True)
+        refresh_files(self.fm, self.changed)
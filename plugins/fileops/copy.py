@@ -0,0 +1,344 @@
+# Parallel copy/move engine behind :paste.
+#
+# The sources are scanned once on the loader (creating the destination
+# directories on the way, and refusing special files and pastes of a
+# directory into itself), then the files are copied by two thread pools:
+# many workers for small files, where the cost is per-file latency, and a
+# few for large files, where the cost is bandwidth.  Data is moved by the
+# kernel with copy_file_range() or sendfile() where possible.  Every file is
+# written to a temporary name next to its destination and renamed into place
+# when complete, so cancelling never leaves half-written files behind.
+
+from __future__ import (absolute_import, division, print_function)
+
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+
+from ranger.ext.human_readable import human_readable
+
+from .._workers import WorkerLoadable
+from .names import SafeNameAllocator
+from .tagging import migrate_tags
+
+PARTIAL_SUFFIX = '.ranger-part'
+CHUNK_SIZE = 8 * 1024 * 1024
+# Weight of a file in the progress computation, so copying many empty
+# files still moves the progress bar.
+FILE_COST = 64 * 1024
+
+_KERNEL_COPY_ERRNOS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                       errno.EOPNOTSUPP, errno.EBADF, errno.ETXTBSY)
+
+
+class _Job(object):  # pylint: disable=too-few-public-methods
+    __slots__ = ('src', 'dst', 'size', 'is_link', 'root')
+
+    def __init__(self, src, dst, size, is_link, root):
+        self.src = src
+        self.dst = dst
+        self.size = size
+        self.is_link = is_link
+        self.root = root
+
+
+def _copy_range(fsrc, fdst, size, progress, checkpoint):
+    """Copy with copy_file_range(), falling back to sendfile() and finally
+    to plain reads and writes.  Returns the number of bytes copied."""
+    done = 0
+    for method in ('copy_file_range', 'sendfile'):
+        func = getattr(os, method, None)
+        if func is None:
+            continue
+        try:
+            while True:
+                checkpoint()
+                if method == 'sendfile':
+                    n = func(fdst, fsrc, None, CHUNK_SIZE)
+                else:
+                    n = func(fsrc, fdst, CHUNK_SIZE)
+                if n == 0:
+                    break
+                done += n
+                progress(n)
+        except OSError as ex:
+            if done or ex.errno not in _KERNEL_COPY_ERRNOS:
+                raise
+            continue
+        if done or not size:
+            return done
+        # Some file systems (procfs, sysfs, some FUSE mounts) report 0
+        # bytes copied for files that do have content.
+
+    while True:
+        checkpoint()
+        buf = os.read(fsrc, CHUNK_SIZE)
+        if not buf:
+            break
+        os.write(fdst, buf)
+        done += len(buf)
+        progress(len(buf))
+    return done
+
+
+def _special_file_error(path, mode):
+    """The error shutil raises for entries that are neither regular files,
+    directories nor symlinks, None for those.  They are never opened: that
+    blocks forever on a FIFO."""
+    if stat.S_ISREG(mode) or stat.S_ISDIR(mode) or stat.S_ISLNK(mode):
+        return None
+    if stat.S_ISFIFO(mode):
+        what = 'a named pipe'
+    elif stat.S_ISSOCK(mode):
+        what = 'a socket'
+    else:
+        what = 'a device'
+    return shutil.SpecialFileError('`{0}` is {1}'.format(path, what))
+
+
+def _inside(path, directory):
+    """Whether path, which need not exist yet, is directory or lies under it,
+    following symbolic links."""
+    path = os.path.join(os.path.realpath(os.path.dirname(path)), os.path.basename(path))
+    directory = os.path.realpath(directory)
+    return path == directory or path.startswith(directory.rstrip('/') + '/')
+
+
+def copy_file(job, progress, checkpoint):
+    """Copy a single file or symlink, including its metadata."""
+    partial = os.path.join(os.path.dirname(job.dst),
+                           '.' + os.path.basename(job.dst) + PARTIAL_SUFFIX)
+    try:
+        if job.is_link:
+            os.symlink(os.readlink(job.src), partial)
+        else:
+            fsrc = os.open(job.src, os.O_RDONLY)
+            try:
+                fdst = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                try:
+                    _copy_range(fsrc, fdst, job.size, progress, checkpoint)
+                finally:
+                    os.close(fdst)
+            finally:
+                os.close(fsrc)
+            shutil.copystat(job.src, partial)
+        os.replace(partial, job.dst)
+    except BaseException:
+        try:
+            os.unlink(partial)
+        except OSError:
+            pass
+        raise
+
+
+class ParallelCopyLoader(WorkerLoadable):
+    """A drop-in replacement for ranger's CopyLoader"""
+    progressbar_supported = True
+    small_file_workers = 8
+    large_file_workers = 2
+    large_file_threshold = 4 * 1024 * 1024
+    scan_batch = 256
+
+    def __init__(self, copy_buffer, do_cut=False, overwrite=False, dest=None,
+                 make_safe_path=None):
+        self.copy_buffer = tuple(copy_buffer)
+        self.do_cut = do_cut
+        self.original_copy_buffer = copy_buffer
+        self.original_path = dest if dest is not None else self.fm.thistab.path
+        self.overwrite = overwrite
+        self.make_safe_path = make_safe_path or SafeNameAllocator()
+        self.total = 0
+        self.done = 0
+        self.copied = 0
+        self.started = None
+        self.errors = []
+        self.moved = []  # (source, destination) of the items moved
+        self._lock = threading.Lock()
+        WorkerLoadable.__init__(self, self.generate(), 'Calculating size...')
+
+    def _progress(self, nbytes):
+        with self._lock:
+            self.done += nbytes
+            self.copied += nbytes
+
+    def _file_done(self):
+        with self._lock:
+            self.done += FILE_COST
+
+    def progress_summary(self):
+        """Throughput and estimated time left, for the status bar."""
+        if not self.started or not self.done:
+            return None
+        elapsed = max(time.time() - self.started, 1e-3)
+        left = int((self.total - self.done) * elapsed / self.done)
+        return '{0}/s, {1}:{2:02d} left'.format(
+            human_readable(int(self.copied / elapsed), separator=''),
+            left // 60, left % 60)
+
+    def _destination(self, fobj):
+        dst = os.path.join(self.original_path, fobj.basename)
+        if not self.overwrite:
+            dst = self.make_safe_path(dst)
+        return dst
+
+    def _try_rename(self, fobj, dst):
+        """Move fobj with a single rename if source and destination are on
+        the same file system.  Returns False if it has to be copied."""
+        if self.overwrite and os.path.isdir(dst) and not os.path.islink(dst):
+            return False
+        try:
+            os.rename(fobj.path, dst)
+        except OSError as ex:
+            if ex.errno != errno.EXDEV:
+                self.errors.append((fobj.path, ex))
+            return ex.errno != errno.EXDEV
+        return True
+
+    def _scan(self, jobs, directories, roots, failed_roots):
+        """Walk the copy buffer, create destination directories and collect
+        the files to copy.  roots gets (source, destination) of the items
+        of the copy buffer to copy, failed_roots those of the sources that
+        can not be copied completely.  Yields every scan_batch entries."""
+        count = 0
+        for fobj in self.copy_buffer:
+            src = fobj.path
+            dst = self._destination(fobj)
+            if os.path.isdir(src) and not os.path.islink(src) and _inside(dst, src):
+                self.errors.append((src, shutil.Error(
+                    'Cannot copy a directory, {0}, into itself'.format(src))))
+                continue
+            if self.do_cut and self._try_rename(fobj, dst):
+                if not os.path.lexists(src):
+                    self.moved.append((src, dst))
+                continue
+            roots.append((src, dst))
+            try:
+                src_stat = os.lstat(src)
+            except OSError as ex:
+                self.errors.append((src, ex))
+                failed_roots.add(src)
+                continue
+            error = _special_file_error(src, src_stat.st_mode)
+            if error is not None:
+                self.errors.append((src, error))
+                failed_roots.add(src)
+                continue
+            if not stat.S_ISDIR(src_stat.st_mode):
+                jobs.append(_Job(src, dst, src_stat.st_size,
+                                 stat.S_ISLNK(src_stat.st_mode), src))
+                continue
+
+            stack = [(src, dst)]
+            while stack:
+                src_dir, dst_dir = stack.pop()
+                # Listed before the destination is created, like copytree().
+                try:
+                    entries = list(os.scandir(src_dir))
+                    os.makedirs(dst_dir, exist_ok=self.overwrite)
+                    directories.append((src_dir, dst_dir))
+                except OSError as ex:
+                    self.errors.append((src_dir, ex))
+                    failed_roots.add(src)
+                    continue
+                for entry in entries:
+                    target = os.path.join(dst_dir, entry.name)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, target))
+                            continue
+                        entry_stat = entry.stat(follow_symlinks=False)
+                        error = _special_file_error(entry.path, entry_stat.st_mode)
+                        if error is not None:
+                            raise error
+                        jobs.append(_Job(entry.path, target, entry_stat.st_size,
+                                         entry.is_symlink(), src))
+                    except OSError as ex:
+                        self.errors.append((entry.path, ex))
+                        failed_roots.add(src)
+                    count += 1
+                    if count % self.scan_batch == 0:
+                        yield
+
+    def generate(self):  # pylint: disable=too-many-branches
+        if not self.copy_buffer:
+            return
+
+        verb = 'moving' if self.do_cut else 'copying'
+        if self.do_cut:
+            self.original_copy_buffer.clear()
+
+        jobs, directories, roots = [], [], []
+        failed_roots = set()
+        for _ in self._scan(jobs, directories, roots, failed_roots):
+            self.description = 'Calculating size... ({0} files)'.format(len(jobs))
+            yield
+            if self.cancelled:
+                return
+
+        self.total = sum(job.size for job in jobs) + FILE_COST * len(jobs)
+        self.description = '{0} {1} files to: {2} ({3})'.format(
+            verb, len(jobs), self.original_path,
+            human_readable(self.total - FILE_COST * len(jobs)))
+        self.started = time.time()
+
+        small = self.new_pool(self.small_file_workers)
+        large = self.new_pool(self.large_file_workers)
+        futures = []
+        for job in jobs:
+            pool = large if job.size >= self.large_file_threshold else small
+            futures.append((job, pool.submit(self._run_job, job)))
+
+        pending = list(futures)
+        while pending:
+            still_pending = []
+            for job, future in pending:
+                if not future.done():
+                    still_pending.append((job, future))
+                elif future.exception() is not None:
+                    self.errors.append((job.src, future.exception()))
+                    failed_roots.add(job.root)
+            pending = still_pending
+            if self.total:
+                self.percent = min(100., self.done * 100. / self.total)
+            if pending:
+                self.wait_some([future for _, future in pending])
+                yield
+        self.shutdown()
+
+        for src_dir, dst_dir in reversed(directories):
+            try:
+                shutil.copystat(src_dir, dst_dir)
+            except OSError:
+                pass
+
+        if self.do_cut:
+            # Only sources whose whole tree was copied are removed.
+            for src, dst in roots:
+                if src in failed_roots or not os.path.lexists(src):
+                    continue
+                try:
+                    if os.path.isdir(src) and not os.path.islink(src):
+                        shutil.rmtree(src)
+                    else:
+                        os.unlink(src)
+                except OSError as ex:
+                    self.errors.append((src, ex))
+                else:
+                    self.moved.append((src, dst))
+                yield
+            if self.moved:
+                migrate_tags(self.fm, self.moved)
+
+        if self.errors:
+            path, ex = self.errors[0]
+            self.fm.notify('{0} failed for {1} files, e.g. {2}: {3}'.format(
+                verb, len(self.errors), path, ex), bad=True)
+        self.fm.get_directory(self.original_path).load_content()
+
+    def _run_job(self, job):
+        self.checkpoint()
+        copy_file(job, self._progress, self.checkpoint)
+        self._file_done()
@@ -0,0 +1,100 @@
+# Parsing of chmod(1) style modes.
+#
+# parse_mode() turns "755", "u+x", "go-w,a+X" or "u=rwx,g=rx,o=" into a
+# function that computes the new permission bits from the old ones.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import re
+import stat
+
+_WHO_BITS = {
+    'u': stat.S_IRWXU | stat.S_ISUID,
+    'g': stat.S_IRWXG | stat.S_ISGID,
+    'o': stat.S_IRWXO | stat.S_ISVTX,
+}
+_WHO_BITS['a'] = _WHO_BITS['u'] | _WHO_BITS['g'] | _WHO_BITS['o']
+
+_PERM_BITS = {
+    'r': 0o444,
+    'w': 0o222,
+    'x': 0o111,
+    's': stat.S_ISUID | stat.S_ISGID,
+    't': stat.S_ISVTX,
+}
+
+_CLAUSE_RE = re.compile(r'^([ugoa]*)((?:[-+=][rwxXst]*)+)$')
+_ACTION_RE = re.compile(r'([-+=])([rwxXst]*)')
+
+
+def _current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def _clause(who, actions, umask):
+    if who:
+        who_bits = 0
+        for char in who:
+            who_bits |= _WHO_BITS[char]
+        mask = 0o7777
+    else:
+        who_bits = _WHO_BITS['a']
+        mask = ~umask & 0o7777
+
+    def apply(mode, is_dir):
+        for operator, perms in actions:
+            bits = 0
+            for char in perms:
+                if char == 'X':
+                    if is_dir or mode & 0o111:
+                        bits |= _PERM_BITS['x']
+                else:
+                    bits |= _PERM_BITS[char]
+            bits &= who_bits & mask
+            if operator == '+':
+                mode |= bits
+            elif operator == '-':
+                mode &= ~bits
+            else:
+                # The umask only limits the bits set, all of who are cleared.
+                cleared = who_bits
+                if is_dir:
+                    # Like chmod(1), "=" keeps the set-id bits of directories.
+                    cleared &= ~(stat.S_ISUID | stat.S_ISGID)
+                mode = (mode & ~cleared) | bits
+        return mode
+    return apply
+
+
+def parse_mode(spec):
+    """Return a function (old_mode, is_dir) -> new_mode for a chmod mode.
+
+    Octal modes between 0 and 777 replace the whole mode, symbolic
+    modes are applied relative to the old bits.  Raises ValueError for
+    anything else.
+    """
+    if spec.isdigit():
+        value = int(spec, 8)
+        if value > 0o777:
+            raise ValueError(spec)
+        return lambda mode, is_dir: value
+
+    umask = None
+    clauses = []
+    for part in spec.split(','):
+        match = _CLAUSE_RE.match(part)
+        if not match:
+            raise ValueError(spec)
+        if not match.group(1) and umask is None:
+            umask = _current_umask()
+        clauses.append(_clause(match.group(1), _ACTION_RE.findall(match.group(2)),
+                               umask or 0))
+
+    def apply(mode, is_dir):
+        for clause in clauses:
+            mode = clause(mode, is_dir)
+        return mode
+    return apply
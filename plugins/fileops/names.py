@@ -0,0 +1,94 @@
+# Conflict-free destination names for a whole paste at once.
+#
+# ranger's make_safe_path callbacks probe os.path.exists() for every
+# candidate name.  SafeNameAllocator reads each destination directory once
+# and hands out names from memory, remembering what it already gave away so
+# that later files of the same paste never collide with earlier ones.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+SUFFIX = '_'
+
+
+def _list_names(path):
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def _is_case_insensitive(path, names):
+    """Detect case-insensitive file systems (drvfs, vfat, ...) with one stat."""
+    for name in names:
+        swapped = name.swapcase()
+        if swapped != name:
+            return swapped not in names and \
+                os.path.lexists(os.path.join(path, swapped))
+    return False
+
+
+class _DirectoryNames(object):
+    def __init__(self, path):
+        names = _list_names(path)
+        if _is_case_insensitive(path, names):
+            self.normalize = str.lower
+        else:
+            self.normalize = str
+        self.taken = set(self.normalize(name) for name in names)
+        self.counters = {}
+
+    def __contains__(self, name):
+        return self.normalize(name) in self.taken
+
+    def add(self, name):
+        self.taken.add(self.normalize(name))
+
+
+class SafeNameAllocator(object):
+    """A make_safe_path callable that allocates names for a batch of files.
+
+    With keep_extension the suffix goes before the extension (file_.ext,
+    file_0.ext, ...) like :paste_ext does, otherwise it is appended to the
+    whole name (file.ext_, file.ext_0, ...) like ranger's :paste.
+    """
+
+    def __init__(self, keep_extension=False):
+        self.keep_extension = keep_extension
+        self._directories = {}
+
+    def _names(self, dirname):
+        try:
+            return self._directories[dirname]
+        except KeyError:
+            names = self._directories[dirname] = _DirectoryNames(dirname)
+            return names
+
+    def _split(self, basename):
+        if self.keep_extension:
+            return os.path.splitext(basename)
+        return basename, ''
+
+    def __call__(self, dst):
+        dirname, basename = os.path.split(dst)
+        names = self._names(dirname)
+        if basename not in names:
+            names.add(basename)
+            return dst
+
+        stem, ext = self._split(basename)
+        if not stem.endswith(SUFFIX):
+            stem += SUFFIX
+            if stem + ext not in names:
+                names.add(stem + ext)
+                return os.path.join(dirname, stem + ext)
+
+        key = names.normalize(stem + ext)
+        n = names.counters.get(key, 0)
+        while stem + str(n) + ext in names:
+            n += 1
+        names.counters[key] = n + 1
+        names.add(stem + str(n) + ext)
+        return os.path.join(dirname, stem + str(n) + ext)
+
@@ -0,0 +1,129 @@
+# Background delete engine behind :delete.
+#
+# Directory trees are removed top-down by a bounded worker pool: each job
+# lists one directory, unlinks its files and hands the subdirectories back
+# as new jobs.  Once the walk is done the (now empty) directories are
+# removed level by level, deepest first, on the same pool.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import threading
+
+from .._workers import WorkerLoadable
+
+
+def is_directory_with_files(path):
+    """Whether path is a real directory with at least one entry.  Stops at
+    the first entry instead of listing the whole directory."""
+    if not os.path.isdir(path) or os.path.islink(path):
+        return False
+    try:
+        with os.scandir(path) as entries:
+            for _ in entries:
+                return True
+    except OSError:
+        pass
+    return False
+
+
+class DeleteLoader(WorkerLoadable):
+    workers = 8
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.removed = 0
+        self.found = 0
+        self.errors = []
+        self._lock = threading.Lock()
+        WorkerLoadable.__init__(self, self.generate(), self._describe())
+
+    def _describe(self):
+        if len(self.paths) == 1:
+            what = self.paths[0]
+        else:
+            what = '{0} items in {1}'.format(
+                len(self.paths), os.path.dirname(self.paths[0]))
+        return 'deleting: {0} ({1} entries removed)'.format(what, self.removed)
+
+    def _count(self, removed=0, found=0):
+        with self._lock:
+            self.removed += removed
+            self.found += found
+
+    def _clear_directory(self, path):
+        """Unlink the files in path and return its subdirectories."""
+        self.checkpoint()
+        subdirs = []
+        with os.scandir(path) as entries:
+            entries = list(entries)
+        self._count(found=len(entries))
+        for entry in entries:
+            self.checkpoint()
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                os.unlink(entry.path)
+                self._count(removed=1)
+            except OSError as ex:
+                self.errors.append((entry.path, ex))
+        return subdirs
+
+    def _rmdir(self, path):
+        self.checkpoint()
+        os.rmdir(path)
+        self._count(removed=1)
+
+    def _wait(self, futures):
+        """Yield until all futures are done, then return their results."""
+        results = []
+        for path, future in futures:
+            while not future.done():
+                self.wait_some([future])
+                self.percent = self.removed * 100. / max(1, self.found)
+                self.description = self._describe()
+                yield
+            if future.exception() is not None:
+                self.errors.append((path, future.exception()))
+            else:
+                results.append((path, future.result()))
+        self.percent = self.removed * 100. / max(1, self.found)
+        return results
+
+    def generate(self):
+        pool = self.new_pool(self.workers)
+        levels = []
+        level = []
+        self._count(found=len(self.paths))
+        for path in self.paths:
+            if os.path.isdir(path) and not os.path.islink(path):
+                level.append(path)
+                continue
+            try:
+                os.unlink(path)
+                self._count(removed=1)
+            except OSError as ex:
+                self.errors.append((path, ex))
+
+        while level:
+            levels.append(level)
+            futures = [(path, pool.submit(self._clear_directory, path))
+                       for path in level]
+            results = yield from self._wait(futures)
+            level = [subdir for _, subdirs in results for subdir in subdirs]
+
+        for level in reversed(levels):
+            futures = [(path, pool.submit(self._rmdir, path)) for path in level]
+            yield from self._wait(futures)
+        self.shutdown()
+
+        if self.errors:
+            path, ex = self.errors[0]
+            self.fm.notify('Deleting failed for {0} files, e.g. {1}: {2}'.format(
+                len(self.errors), path, ex), bad=True)
+        for dirname in set(os.path.dirname(path) for path in self.paths):
+            directory = self.fm.directories.get(dirname)
+            if directory is not None:
+                directory.request_reload()
+        self.fm.thistab.ensure_correct_pointer()
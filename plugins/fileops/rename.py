@@ -0,0 +1,222 @@
+# In-process rename engine used by :bulkrename.
+#
+# A rename set is planned as a whole before anything touches the disk:
+# destinations that are still occupied by another pending source wait until
+# that source has moved away, cycles (a->b, b->a) are broken by parking one
+# member under a temporary name, and missing directories are collected so they
+# can be created in one pass.  Every completed step is recorded in a journal so
+# a failure halfway through can be undone.
+
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+
+TEMP_PREFIX = '.ranger-rename-'
+
+
+class RenameError(Exception):
+    pass
+
+
+class RenamePlan(object):
+    """An ordered list of ("mkdir", path) and ("rename", src, dst) steps."""
+
+    def __init__(self, pairs, directories, steps):
+        self.pairs = pairs
+        self.directories = directories
+        self.steps = steps
+
+    def __len__(self):
+        return len(self.pairs)
+
+
+def _same_file(path_a, path_b):
+    try:
+        stat_a, stat_b = os.lstat(path_a), os.lstat(path_b)
+    except OSError:
+        return False
+    return (stat_a.st_dev, stat_a.st_ino) == (stat_b.st_dev, stat_b.st_ino)
+
+
+def _temp_name(path, taken):
+    dirname, basename = os.path.split(path)
+    n = 0
+    while True:
+        candidate = os.path.join(
+            dirname, '{0}{1}-{2}-{3}'.format(TEMP_PREFIX, os.getpid(), n, basename))
+        if candidate not in taken and not os.path.lexists(candidate):
+            taken.add(candidate)
+            return candidate
+        n += 1
+
+
+def _depth(path):
+    return path.count(os.sep)
+
+
+def plan_renames(pairs):
+    """Turn (source, destination) pairs of absolute paths into a RenamePlan.
+
+    Raises RenameError if two sources share a destination or if a
+    destination is occupied by a file that is not part of the rename set.
+    """
+    pending = {}
+    for src, dst in pairs:
+        src, dst = os.path.normpath(src), os.path.normpath(dst)
+        if src == dst:
+            continue
+        if src in pending:
+            raise RenameError("Renaming {0} twice".format(src))
+        pending[src] = dst
+
+    waiting_for = {}
+    for src, dst in pending.items():
+        if dst in waiting_for:
+            raise RenameError("Both {0} and {1} would be renamed to {2}".format(
+                waiting_for[dst], src, dst))
+        waiting_for[dst] = src
+        if dst not in pending and os.path.lexists(dst) and not _same_file(src, dst):
+            raise RenameError("{0} already exists".format(dst))
+
+    directories = []
+    seen = set()
+    for dst in pending.values():
+        parent = os.path.dirname(dst)
+        missing = []
+        while parent and parent not in seen and not os.path.isdir(parent):
+            missing.append(parent)
+            seen.add(parent)
+            parent = os.path.dirname(parent)
+        directories.extend(reversed(missing))
+    directories.sort(key=_depth)
+
+    steps = [('mkdir', path) for path in directories]
+    result_pairs = sorted(pending.items())
+    taken = set(pending) | set(waiting_for)
+
+    # Renames whose destination is free can run right away.  Deeper sources
+    # go first so that entries inside a renamed directory are moved before
+    # the directory itself.
+    ready = sorted((src for src, dst in pending.items() if dst not in pending),
+                   key=_depth)
+    while pending:
+        while ready:
+            src = ready.pop()
+            dst = pending.pop(src)
+            del waiting_for[dst]
+            steps.append(('rename', src, dst))
+            blocked = waiting_for.get(src)
+            if blocked is not None:
+                ready.append(blocked)
+        if pending:
+            # Only cycles are left: park one member to unblock the chain.
+            src = min(pending)
+            temp = _temp_name(src, taken)
+            dst = pending.pop(src)
+            steps.append(('rename', src, temp))
+            pending[temp] = dst
+            waiting_for[dst] = temp
+            ready.append(waiting_for[src])
+
+    return RenamePlan(result_pairs, directories, steps)
+
+
+class RenameJournal(object):
+    """Records completed steps, in memory and on disk, so they can be undone.
+
+    The journal file is removed once the rename set has been applied or
+    rolled back; a leftover file means ranger died in the middle of a bulk
+    rename, or that some steps could not be undone, and can be replayed
+    backwards with `RenameJournal.load()`.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.steps = []
+        self._fobj = None
+        if filename:
+            self._fobj = open(filename, 'w')
+
+    @classmethod
+    def load(cls, filename):
+        journal = cls()
+        journal.filename = filename
+        with open(filename, 'r') as fobj:
+            for line in fobj:
+                line = line.strip()
+                if line:
+                    journal.steps.append(tuple(json.loads(line)))
+        return journal
+
+    def record(self, step):
+        self.steps.append(step)
+        if self._fobj is not None:
+            self._fobj.write(json.dumps(step) + '\n')
+            self._fobj.flush()
+
+    def rollback(self):
+        """Undo the recorded steps in reverse order.
+
+        Returns a list of (step, OSError) for steps that could not be undone.
+        Those are kept in the journal file, to be tried again.
+        """
+        failed = []
+        for step in reversed(self.steps):
+            try:
+                if step[0] == 'rename':
+                    os.rename(step[2], step[1])
+                elif step[0] == 'mkdir':
+                    os.rmdir(step[1])
+            except OSError as ex:
+                failed.append((step, ex))
+        self.steps = [step for step, _ in reversed(failed)]
+        if self.steps and self.filename:
+            self._rewrite()
+        else:
+            self.close()
+        return failed
+
+    def _rewrite(self):
+        """Replace the journal file with the steps left."""
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+        tmp = self.filename + '.tmp'
+        try:
+            with open(tmp, 'w') as fobj:
+                fobj.write(''.join(json.dumps(step) + '\n' for step in self.steps))
+            os.replace(tmp, self.filename)
+        except OSError:
+            # The old journal stays; steps undone already fail harmlessly
+            # when they are tried again.
+            pass
+
+    def close(self):
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+        if self.filename and os.path.exists(self.filename):
+            os.unlink(self.filename)
+
+
+def apply_plan(plan, journal):
+    """Run the steps of a plan, recording each one in the journal.
+
+    On the first failure every completed step is rolled back and the
+    original OSError is re-raised with the list of steps that could not be
+    undone attached as `rollback_failures`.
+    """
+    for step in plan.steps:
+        try:
+            if step[0] == 'mkdir':
+                os.mkdir(step[1])
+            else:
+                os.rename(step[1], step[2])
+            # A step that could not be written to the journal file is still
+            # kept in memory and rolled back with the others.
+            journal.record(step)
+        except OSError as ex:
+            ex.rollback_failures = journal.rollback()
+            raise
+    journal.close()
@@ -0,0 +1,47 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+
+def migrate_tags(fm, renamed):
+    """Move tags from old to new paths, including paths below renamed
+    directories, and write the tag file once."""
+    tags = fm.tags
+    if hasattr(tags, 'move_trees'):
+        tags.move_trees(renamed)
+        return
+    tags.sync()
+    renamed = dict(renamed)
+    moves = []
+    for path in tags.tags:
+        # The deepest renamed path at or above path
+        old = path
+        while old not in renamed:
+            parent = os.path.dirname(old)
+            if parent == old:
+                break
+            old = parent
+        else:
+            moves.append((path, renamed[old] + path[len(old):]))
+    if moves:
+        # Taking all tags before putting any back keeps swapped paths' tags.
+        moved = [(new, tags.tags.pop(path)) for path, new in moves]
+        tags.tags.update(moved)
+        tags.dump()
+
+
+def untag_trees(fm, paths):
+    """Remove the tags of the paths and of everything below them."""
+    tags = fm.tags
+    if hasattr(tags, 'untag_trees'):
+        tags.untag_trees(paths)
+        return
+    removed = set(paths)
+    prefixes = tuple(path + os.sep for path in paths)
+    tags.sync()
+    untagged = [path for path in tags.tags
+                if path in removed or path.startswith(prefixes)]
+    if untagged:
+        for path in untagged:
+            del tags.tags[path]
+        tags.dump()
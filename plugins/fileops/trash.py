@@ -0,0 +1,287 @@
+# In-process implementation of the freedesktop.org trash specification.
+#
+# Files are renamed into the trash of their own file system: the home trash
+# if they live on the same device as $XDG_DATA_HOME, otherwise the
+# per-mount $topdir/.Trash/$uid or $topdir/.Trash-$uid.  For a batch the
+# .trashinfo files are written first, in one pass, then the files are
+# renamed.  Everything that was trashed is also recorded in an index in
+# ranger's data directory, so listing and restoring do not have to scan and
+# parse the trash directories.
+
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+import stat
+import time
+from urllib.parse import quote
+
+from ranger.ext.mount_path import mount_path
+
+INFO_SUFFIX = '.trashinfo'
+INFO_TEMPLATE = '[Trash Info]\nPath={0}\nDeletionDate={1}\n'
+
+
+class TrashError(Exception):
+    pass
+
+
+def home_trash_path():
+    data_home = os.environ.get('XDG_DATA_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(data_home, 'Trash')
+
+
+class TrashCan(object):
+    """One trash directory with its files/ and info/ subdirectories."""
+
+    def __init__(self, path, topdir=None):
+        self.path = path
+        self.topdir = topdir
+        self.files = os.path.join(path, 'files')
+        self.info = os.path.join(path, 'info')
+        self._taken = None
+
+    def ensure(self):
+        for path in (self.files, self.info):
+            if not os.path.isdir(path):
+                os.makedirs(path, 0o700)
+        return self
+
+    def info_path(self, name):
+        return os.path.join(self.info, name + INFO_SUFFIX)
+
+    def path_field(self, path):
+        """The Path= value: relative to the top directory for per-mount
+        trash directories, absolute for the home trash."""
+        if self.topdir and path.startswith(self.topdir.rstrip(os.sep) + os.sep):
+            path = os.path.relpath(path, self.topdir)
+        return quote(os.fsencode(path))
+
+    def start_batch(self):
+        """Forget the names taken, to list the trash again for the next
+        batch."""
+        self._taken = None
+
+    def reserve(self, path, date):
+        """Create the .trashinfo file for path and return the name the file
+        gets in the trash.  Names are allocated from one listing of the
+        trash per batch, O_EXCL guards against other trash users."""
+        if self._taken is None:
+            self._taken = set(os.listdir(self.files))
+            self._taken.update(name[:-len(INFO_SUFFIX)]
+                               for name in os.listdir(self.info))
+        stem, ext = os.path.splitext(os.path.basename(path))
+        name, n = stem + ext, 1
+        content = INFO_TEMPLATE.format(self.path_field(path), date).encode('utf-8')
+        while True:
+            if name not in self._taken:
+                self._taken.add(name)
+                try:
+                    fdesc = os.open(self.info_path(name),
+                                    os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except OSError as ex:
+                    if not os.path.exists(self.info_path(name)):
+                        raise TrashError(str(ex))
+                else:
+                    try:
+                        os.write(fdesc, content)
+                    finally:
+                        os.close(fdesc)
+                    return name
+            n += 1
+            name = '{0}.{1}{2}'.format(stem, n, ext)
+
+
+class TrashIndex(object):
+    """Append-only record of trashed items: original path -> (trash, name).
+
+    Each line is a JSON object; restored or purged items are recorded as
+    tombstones and the file is compacted when they outnumber live entries.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        self.by_path = {}
+        self.by_dir = {}
+        self._tombstones = 0
+        if filename and os.path.exists(filename):
+            with open(filename, 'r') as fobj:
+                for line in fobj:
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        continue
+            if self._tombstones > len(self.entries):
+                self.compact()
+
+    def _apply(self, record):
+        key = (record['trash'], record['name'])
+        if record.get('removed'):
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.by_path[entry['path']].remove(key)
+                self.by_dir[os.path.dirname(entry['path'])].discard(key)
+            self._tombstones += 1
+        else:
+            self.entries[key] = record
+            self.by_path.setdefault(record['path'], []).append(key)
+            self.by_dir.setdefault(os.path.dirname(record['path']), set()).add(key)
+
+    def _append(self, records):
+        for record in records:
+            self._apply(record)
+        if self.filename:
+            with open(self.filename, 'a') as fobj:
+                fobj.write(''.join(json.dumps(record) + '\n' for record in records))
+
+    def add(self, records):
+        self._append(records)
+
+    def remove(self, keys):
+        self._append([{'trash': trash, 'name': name, 'removed': True}
+                      for trash, name in keys])
+
+    def compact(self):
+        self._tombstones = 0
+        if not self.filename:
+            return
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as fobj:
+            for record in self.entries.values():
+                fobj.write(json.dumps(record) + '\n')
+        os.replace(tmp, self.filename)
+
+    def items_in(self, dirname):
+        """Trashed items that were in dirname, newest first."""
+        return sorted((self.entries[key] for key in self.by_dir.get(dirname, ())),
+                      key=lambda entry: entry['date'], reverse=True)
+
+    def latest(self, path):
+        keys = self.by_path.get(path)
+        return self.entries[keys[-1]] if keys else None
+
+    def last_batch(self):
+        if not self.entries:
+            return []
+        batch = max(entry['batch'] for entry in self.entries.values())
+        return [entry for entry in self.entries.values() if entry['batch'] == batch]
+
+
+class Trasher(object):
+    """Moves batches of paths into the right trash directories."""
+
+    def __init__(self, index):
+        self.index = index
+        self.uid = os.getuid()
+        self._cans = {}
+
+    def _per_mount_can(self, topdir):
+        shared = os.path.join(topdir, '.Trash')
+        try:
+            shared_stat = os.lstat(shared)
+        except OSError:
+            pass
+        else:
+            if stat.S_ISDIR(shared_stat.st_mode) and shared_stat.st_mode & stat.S_ISVTX:
+                try:
+                    return TrashCan(os.path.join(shared, str(self.uid)), topdir).ensure()
+                except OSError:
+                    pass
+        own = os.path.join(topdir, '.Trash-{0}'.format(self.uid))
+        if os.path.islink(own):
+            raise TrashError('{0} is a symlink'.format(own))
+        can = TrashCan(own, topdir).ensure()
+        if os.lstat(own).st_uid != self.uid:
+            raise TrashError('{0} is not owned by you'.format(own))
+        return can
+
+    def can_for(self, path):
+        """The trash directory on the same device as path, or None."""
+        device = os.lstat(path).st_dev
+        if device in self._cans:
+            return self._cans[device]
+        can = None
+        try:
+            home = TrashCan(home_trash_path()).ensure()
+            if os.stat(home.path).st_dev == device:
+                can = home
+            else:
+                can = self._per_mount_can(mount_path(os.path.dirname(path)))
+                if os.stat(can.path).st_dev != device:
+                    can = None
+        except (OSError, TrashError):
+            can = None
+        self._cans[device] = can
+        return can
+
+    def trash(self, paths):
+        """Trash the given absolute paths.
+
+        Returns a list of (path, reason) for the paths that could not be
+        trashed by a rename, e.g. because no trash directory is usable on
+        their file system.
+        """
+        date = time.strftime('%Y-%m-%dT%H:%M:%S')
+        batch = time.time()
+        for can in self._cans.values():
+            if can is not None:
+                can.start_batch()
+        failed = []
+        reserved = []
+        for path in paths:
+            try:
+                can = self.can_for(path)
+                if can is None:
+                    failed.append((path, 'no trash directory on this device'))
+                    continue
+                reserved.append((path, can, can.reserve(path, date)))
+            except (OSError, TrashError) as ex:
+                failed.append((path, str(ex)))
+
+        records = []
+        for path, can, name in reserved:
+            try:
+                os.rename(path, os.path.join(can.files, name))
+            except OSError as ex:
+                os.unlink(can.info_path(name))
+                failed.append((path, str(ex)))
+                continue
+            records.append({'path': path, 'trash': can.path, 'name': name,
+                            'date': date, 'batch': batch})
+        self.index.add(records)
+        return failed
+
+    def restore(self, entries):
+        """Move trashed items back to where they came from.
+
+        Returns a list of (path, reason) for the entries that could not be
+        restored.
+        """
+        failed = []
+        restored = []
+        for entry in entries:
+            can = TrashCan(entry['trash'])
+            path = entry['path']
+            if os.path.lexists(path):
+                failed.append((path, 'already exists'))
+                continue
+            try:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                os.rename(os.path.join(can.files, entry['name']), path)
+            except OSError as ex:
+                if not os.path.lexists(os.path.join(can.files, entry['name'])):
+                    # Purged by another program, forget about it.
+                    restored.append((entry['trash'], entry['name']))
+                failed.append((path, str(ex)))
+                continue
+            try:
+                os.unlink(can.info_path(entry['name']))
+            except OSError:
+                pass
+            restored.append((entry['trash'], entry['name']))
+        self.index.remove(restored)
+        return failed
+
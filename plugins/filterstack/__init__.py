@@ -0,0 +1,56 @@
+# filter_stack without evaluating the whole stack on every change.
+#
+# ranger refilters after every filter_stack command and asks every filter
+# in the stack about every file again, though after pop or rotate the
+# answers are all known, and asking mime or hash filters is slow.  Here the
+# directory is filtered without its stack first, and the stack is applied
+# to that listing by a FilterPipeline (see pipeline.py), which keeps the
+# answers of every filter for as long as the listing stays the same.  A
+# load, or a change of the listing through inotify events, starts over.
+
+from __future__ import (absolute_import, division, print_function)
+
+from time import time
+
+from ranger.container.directory import Directory
+
+from .pipeline import FilterPipeline
+
+Directory.filter_pipeline = None
+
+_refilter_prev = Directory.refilter
+
+
+def refilter(self):
+    stack = self.filter_stack
+    if not stack or self.files_all is None:
+        self.filter_pipeline = None
+        return _refilter_prev(self)
+
+    pointer = self.pointer
+    self.filter_stack = []
+    try:
+        _refilter_prev(self)
+    finally:
+        self.filter_stack = stack
+    base = self.files
+    if not base:
+        return None
+    self.pointer = pointer
+    stamp = self.load_content_mtime
+    pipeline = self.filter_pipeline
+    if pipeline is None or not pipeline.valid_for(base, stamp):
+        pipeline = self.filter_pipeline = FilterPipeline(base, stamp)
+
+    self.last_update_time = time()
+    self.files = pipeline.accepted(stack)
+    if self.files and not self.pointed_obj:
+        self.pointed_obj = self.files[0]
+    elif not self.files:
+        self.content_loaded = False
+        self.pointed_obj = None
+    self.move_to_obj(self.pointed_obj)
+    return None
+
+
+Directory.refilter = refilter
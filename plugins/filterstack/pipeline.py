@@ -0,0 +1,104 @@
+# The filter stack of a directory evaluated stage by stage, with the
+# results of every filter kept.
+#
+# A FilterPipeline holds, for every filter in the stack and the filters
+# inside the combinators, one byte per file of the listing the stack is
+# applied to: 1 if the filter accepts the file, 0 if not, UNKNOWN if it was
+# not asked yet.  Like ranger's filtering, a stage is only asked about the
+# files the stages before it accepted, and "and" and "or" only ask their
+# second filter when the first does not decide.  Answers are never asked
+# twice while the listing stays the same, so after pop, rotate or
+# decompose, or when one filter is added, only the answers that were never
+# needed before are computed.
+
+from __future__ import (absolute_import, division, print_function)
+
+from operator import is_
+
+from ranger.core.filter_stack import AndFilter, NotFilter, OrFilter
+
+UNKNOWN = 2
+
+
+def _same_files(files, other):
+    return len(files) == len(other) and all(map(is_, files, other))
+
+
+def _revision(filt):
+    """Filters whose answers change bump their revision (see
+    plugins/duplicates); combinators change with the filters inside."""
+    if isinstance(filt, NotFilter):
+        return (_revision(filt.subfilter),)
+    if isinstance(filt, (AndFilter, OrFilter)):
+        return tuple(map(_revision, filt.subfilters))
+    return getattr(filt, 'revision', 0)
+
+
+class FilterPipeline(object):
+    """The answers of the filters of a stack for one list of files."""
+
+    def __init__(self, files, stamp):
+        self.files = files
+        self.stamp = stamp
+        self.results = {}  # id(filter) -> (filter, revision, bytearray)
+
+    def valid_for(self, files, stamp):
+        return stamp == self.stamp and _same_files(files, self.files)
+
+    def _bits(self, filt, positions):
+        """The answers of filt, computed for positions where missing."""
+        revision = _revision(filt)
+        entry = self.results.get(id(filt))
+        if entry is None or entry[0] is not filt or entry[1] != revision:
+            bits = bytearray([UNKNOWN]) * len(self.files)
+            self.results[id(filt)] = (filt, revision, bits)
+        else:
+            bits = entry[2]
+        missing = [i for i in positions if bits[i] == UNKNOWN]
+        if not missing:
+            return bits
+
+        if isinstance(filt, NotFilter):
+            sub = self._bits(filt.subfilter, missing)
+            for i in missing:
+                bits[i] = 1 - sub[i]
+        elif isinstance(filt, (AndFilter, OrFilter)):
+            decided = 0 if isinstance(filt, AndFilter) else 1
+            first, second = filt.subfilters
+            first_bits = self._bits(first, missing)
+            undecided = [i for i in missing if first_bits[i] != decided]
+            second_bits = self._bits(second, undecided)
+            for i in missing:
+                bits[i] = decided
+            for i in undecided:
+                bits[i] = second_bits[i]
+        else:
+            files = self.files
+            for i in missing:
+                bits[i] = 1 if filt(files[i]) else 0
+        return bits
+
+    def _reachable(self, stack):
+        found = set()
+        todo = list(stack)
+        while todo:
+            filt = todo.pop()
+            found.add(id(filt))
+            if isinstance(filt, NotFilter):
+                todo.append(filt.subfilter)
+            elif isinstance(filt, (AndFilter, OrFilter)):
+                todo.extend(filt.subfilters)
+        return found
+
+    def accepted(self, stack):
+        """The files that all filters of stack accept."""
+        for key in set(self.results) - self._reachable(stack):
+            del self.results[key]
+        positions = range(len(self.files))
+        for filt in stack:
+            if filt is None:
+                continue
+            bits = self._bits(filt, positions)
+            positions = [i for i in positions if bits[i] == 1]
+        files = self.files
+        return [files[i] for i in positions]
@@ -0,0 +1,180 @@
+# Flattened directories (:flat) that load in the background.
+#
+# ranger walks the whole tree in one step of the directory's load generator
+# and checks a flattened directory for changes by stat()ing every directory
+# in it on every redraw.  Here the tree is walked by a FlatWalker on a worker
+# pool and the entries are added to the directory in chunks, so the view
+# fills while the walk runs.  At most flat_max_entries entries are loaded.
+# The walk stops when the level changes (:flat unloads the directory) or
+# when you leave the directory; it is restarted when you come back.
+# Changes are detected by the mtime of the top directory only, use
+# :reload_cwd to pick up changes further down.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+from time import time
+
+import ranger.api
+from ranger.container.directory import Directory
+from ranger.container.file import File
+from ranger.ext.mount_path import mount_path
+
+from .._settings import register_setting
+from .walker import FlatWalker
+
+CHUNK_SIZE = 256
+SORT_INTERVAL = 0.25
+
+register_setting('flat_max_entries', int, 100000)
+
+
+def _add_entries(self, chunk, marked_paths):
+    for path, stats, is_dir in chunk:
+        if is_dir:
+            item = self.fm.get_directory(path, preload=stats, path_is_abs=True,
+                                         basename_is_rel_to=self.path)
+            if not item.loaded:
+                item.load()
+            item.relative_path = os.path.relpath(item.path, self.path)
+            item.relative_path_lower = item.relative_path.lower()
+        else:
+            item = File(path, preload=stats, path_is_abs=True,
+                        basename_is_rel_to=self.path)
+            item.load()
+            self.disk_usage += item.size
+        if item.path in marked_paths:
+            item.mark_set(True)
+            self.marked_items.append(item)
+        else:
+            item.mark_set(False)
+        self.files_all.append(item)
+        self.filenames.append(path)
+
+
+def _show_entries(self):
+    self.sort()
+    if self.files:
+        self.content_loaded = True
+    self.last_update_time = time()
+
+
+def load_flat_bit_by_bit(self):
+    """Like Directory.load_bit_by_bit for flattened directories, adding the
+    entries in chunks as the walker finds them."""
+    self.loading = True
+    self.percent = 0
+    self.load_if_outdated()
+    walker = None
+    try:
+        if self.runnable:
+            yield
+            self.mount_path = mount_path(self.path)
+            self.load_content_mtime = os.stat(self.path).st_mtime
+            marked_paths = set(obj.path for obj in self.marked_items)
+            self._clear_marked_items()
+            self.files_all = []
+            self.filenames = []
+            self.disk_usage = 0
+            self.has_vcschild = False
+
+            walker = self.flat_walker = FlatWalker(
+                self.path, self.flat, self.settings.flat_max_entries)
+            last_shown = 0
+            for chunk in walker.chunks(CHUNK_SIZE):
+                if chunk:
+                    _add_entries(self, chunk, marked_paths)
+                    if time() - last_shown > SORT_INTERVAL:
+                        _show_entries(self)
+                        last_shown = time()
+                if walker.limit:
+                    self.percent = 100 * walker.produced // walker.limit
+                yield
+            _show_entries(self)
+
+            self.size = len(self.filenames)
+            self.infostring = ('->' if self.is_link else '') + ' %d' % self.size
+            if walker.truncated:
+                self.fm.notify('Flat view of {0} stopped at {1} entries (see '
+                               'flat_max_entries)'.format(self.path, walker.produced))
+            if self.files_all and self.pointed_obj is None:
+                self.move(to=0)
+        else:
+            self.filenames = None
+            self.files_all = None
+            self.files = None
+
+        self.cycle_list = None
+        self.content_loaded = True
+        self.last_update_time = time()
+        self.correct_pointer()
+
+    finally:
+        if walker is not None:
+            walker.cancel()
+        self.flat_walker = None
+        self.loading = False
+        self.fm.signal_emit("finished_loading_dir", directory=self)
+
+
+_load_bit_by_bit_prev = Directory.load_bit_by_bit
+_unload_prev = Directory.unload
+_load_content_if_outdated_prev = Directory.load_content_if_outdated
+
+
+def load_bit_by_bit(self):
+    if self.flat:
+        return load_flat_bit_by_bit(self)
+    return _load_bit_by_bit_prev(self)
+
+
+def unload(self):
+    walker = getattr(self, 'flat_walker', None)
+    if walker is not None:
+        walker.cancel()
+    _unload_prev(self)
+
+
+def load_content_if_outdated(self, *args, **kwargs):
+    if not self.flat:
+        return _load_content_if_outdated_prev(self, *args, **kwargs)
+    if self.load_content_once(*args, **kwargs):
+        return True
+    if self.files_all is None or self.content_outdated:
+        self.load_content(*args, **kwargs)
+        return True
+    if self.loading:
+        return False
+    try:
+        real_mtime = os.stat(self.path).st_mtime
+    except OSError:
+        return False
+    if real_mtime != self.load_content_mtime:
+        self.load_content(*args, **kwargs)
+        return True
+    return False
+
+
+Directory.flat_walker = None
+Directory.load_bit_by_bit = load_bit_by_bit
+Directory.unload = unload
+Directory.load_content_if_outdated = load_content_if_outdated
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    def stop_walk(signal):
+        previous = signal.previous
+        if previous is None or previous is signal.new or not previous.flat \
+                or previous.flat_walker is None:
+            return
+        fm.loader.remove(item=previous)
+        previous.unload()
+        previous.content_outdated = True
+
+    fm.signal_bind('cd', stop_walk)
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
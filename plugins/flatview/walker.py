@@ -0,0 +1,114 @@
+# Background walker for flattened directories.
+#
+# Each job on the pool lists one directory and stats its entries; the
+# consumer (the directory's load generator in the UI thread) receives the
+# entries in chunks as the jobs finish and decides when to stop.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import queue
+import stat
+import threading
+
+from .._workers import DaemonPool
+
+
+class FlatWalker(object):
+    """Walks path up to level directories deep (-1 for no limit) and
+    produces (path, stats, is_dir) tuples, stats being (stat, lstat) or
+    None, like Directory.load_bit_by_bit uses them.
+
+    Symbolic links to directories are followed for limited levels only,
+    like ranger's walklevel().  At most limit entries are produced (0 for no
+    limit); self.truncated tells whether entries were left out.
+    """
+    workers = 8
+    poll_interval = 0.01
+
+    def __init__(self, path, level, limit=0):
+        self.path = path
+        self.level = level
+        self.limit = limit
+        self.produced = 0
+        self.truncated = False
+        self._cancelled = threading.Event()
+        self._finished = queue.Queue()
+        self._pool = None
+        self._outstanding = 0
+
+    def cancel(self):
+        self._cancelled.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _scan(self, path, depth):
+        if self._cancelled.is_set():
+            return [], []
+        entries = []
+        subdirs = []
+        follow = self.level > 0
+        descend = self.level == -1 or depth < self.level
+        with os.scandir(path) as dirents:
+            for dirent in dirents:
+                if self._cancelled.is_set():
+                    break
+                try:
+                    lstat = dirent.stat(follow_symlinks=False)
+                    target = os.stat(dirent.path) if stat.S_ISLNK(lstat.st_mode) else lstat
+                except OSError:
+                    entries.append((dirent.path, None, False))
+                    continue
+                is_dir = stat.S_ISDIR(target.st_mode)
+                entries.append((dirent.path, (target, lstat), is_dir))
+                if is_dir and descend and (follow or not stat.S_ISLNK(lstat.st_mode)):
+                    subdirs.append(dirent.path)
+        return entries, [(subdir, depth + 1) for subdir in subdirs]
+
+    def _submit(self, path, depth):
+        if self._cancelled.is_set():
+            return
+        self._outstanding += 1
+        self._pool.submit(self._scan, path, depth).add_done_callback(self._finished.put)
+
+    def _collect(self):
+        try:
+            done = [self._finished.get(timeout=self.poll_interval)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                done.append(self._finished.get_nowait())
+            except queue.Empty:
+                return done
+
+    def chunks(self, size):
+        """Yields lists of at most size entries; empty lists while waiting
+        for the workers."""
+        self._pool = DaemonPool(self.workers)
+        self._submit(self.path, 0)
+        buffered = []
+        try:
+            while self._outstanding and not self._cancelled.is_set():
+                for future in self._collect():
+                    self._outstanding -= 1
+                    if future.cancelled() or future.exception() is not None:
+                        continue
+                    entries, subdirs = future.result()
+                    buffered.extend(entries)
+                    for subdir, depth in subdirs:
+                        self._submit(subdir, depth)
+                if self.limit and self.produced + len(buffered) > self.limit:
+                    del buffered[self.limit - self.produced:]
+                    self.truncated = True
+                    self.cancel()
+                if not buffered:
+                    yield []
+                while buffered:
+                    chunk = buffered[:size]
+                    del buffered[:size]
+                    self.produced += len(chunk)
+                    yield chunk
+        finally:
+            self.cancel()
@@ -0,0 +1,87 @@
+# :grep with an in-process, multi-threaded search whose matches stream
+# into a navigable results view instead of a pager.
+
+from __future__ import (absolute_import, division, print_function)
+
+import re
+
+from ranger.api.commands import Command
+from ranger.gui.ui import UI
+
+from .engine import GrepLoader
+from .view import GrepView
+
+
+def get_grep_view(fm):
+    ui = fm.ui
+    view = getattr(ui, 'grep_view', None)
+    if view is None:
+        view = ui.grep_view = GrepView(ui.win)
+        view.visible = False
+        ui.add_child(view)
+        _resize(ui)
+    return view
+
+
+def _resize(ui):
+    view = getattr(ui, 'grep_view', None)
+    if view is not None:
+        y, x = ui.termsize
+        view.resize(1, 0, y - 2, x)
+
+
+_update_size_prev = UI.update_size
+
+
+def update_size(self):
+    _update_size_prev(self)
+    _resize(self)
+
+
+UI.update_size = update_size
+
+
+class grep(Command):  # pylint: disable=invalid-name
+    """:grep [-i] [-F] <pattern>
+
+    Searches the marked files and directories for a Python regular
+    expression, or a fixed string with -F; -i ignores case.  Matches are
+    shown in a results view while the search runs: <Enter> selects the
+    file in ranger, e opens it in $EDITOR at the matching line, x stops the
+    search and q closes the view.  Without a pattern the view of the last
+    search is shown again.
+    """
+
+    def execute(self):
+        flags = 0
+        fixed = False
+        index = 1
+        while self.arg(index) in ('-i', '-F'):
+            if self.arg(index) == '-i':
+                flags |= re.IGNORECASE
+            else:
+                fixed = True
+            index += 1
+        pattern = self.rest(index)
+        view = get_grep_view(self.fm)
+        if not pattern:
+            if view.search is None:
+                self.fm.notify('Usage: grep [-i] [-F] <pattern>', bad=True)
+                return
+            view.open()
+            return
+
+        try:
+            regex = re.compile(re.escape(pattern) if fixed else pattern, flags)
+        except re.error as ex:
+            self.fm.notify('Invalid pattern {0}: {1}'.format(pattern, ex), bad=True)
+            return
+
+        def update(_):
+            view.need_redraw = True
+
+        search = GrepLoader([fobj.path for fobj in self.fm.thistab.get_selection()],
+                            regex, pattern, self.fm.settings.show_hidden, update)
+        view.show_search(search, self.fm.thisdir.path)
+        view.open()
+        self.fm.loader.add(search)
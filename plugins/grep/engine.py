@@ -0,0 +1,250 @@
+# The search behind :grep.
+#
+# Directories are listed and files are searched on a worker pool; matches
+# are collected by the loader generator as the jobs finish, so the results
+# view fills while the search is still running.  Like ripgrep, the walk
+# skips VCS directories, files excluded by .gitignore/.ignore files, symbolic
+# links below the selected paths and (by their first block) binary files.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import queue
+import re
+import stat
+
+from .._workers import WorkerLoadable
+
+VCS_DIRECTORIES = frozenset(['.git', '.hg', '.svn', '.bzr'])
+IGNORE_FILES = ('.gitignore', '.ignore')
+BINARY_CHECK_SIZE = 8192
+MAX_LINE_LENGTH = 500
+# Lines searched between checks for a paused or cancelled search
+CHECKPOINT_LINES = 4096
+
+
+def _glob_to_regex(pattern):
+    result = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            result.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            result.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            result.append('[^/]*')
+        elif char == '?':
+            result.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                result.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                result.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif char == '\\' and i + 1 < len(pattern):
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(char))
+        i += 1
+    return ''.join(result)
+
+
+class IgnoreRule(object):
+    __slots__ = ('base', 'regex', 'negate', 'dir_only', 'anchored')
+
+    def __init__(self, base, line):
+        self.base = base
+        self.negate = line.startswith('!')
+        if self.negate:
+            line = line[1:]
+        self.dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        # A slash at the beginning or in the middle anchors the pattern to
+        # the directory of the ignore file.
+        self.anchored = '/' in line
+        self.regex = re.compile('^' + _glob_to_regex(line.lstrip('/')) + '$')
+
+    def matches(self, path, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            return bool(self.regex.match(os.path.relpath(path, self.base)))
+        return bool(self.regex.match(os.path.basename(path)))
+
+
+def read_ignore_rules(directory):
+    rules = []
+    for name in IGNORE_FILES:
+        try:
+            with open(os.path.join(directory, name), 'r', errors='replace') as fobj:
+                lines = fobj.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            line = line.rstrip()
+            if line.startswith('\\'):
+                line = line[1:]
+            elif not line or line.startswith('#'):
+                continue
+            rules.append(IgnoreRule(directory, line))
+    return rules
+
+
+def inherited_ignore_rules(path):
+    """The ignore rules of the directories above path, up to the top of
+    the repository containing it."""
+    chain = []
+    directory = os.path.dirname(path.rstrip(os.sep)) or os.sep
+    while True:
+        chain.append(directory)
+        if os.path.isdir(os.path.join(directory, '.git')):
+            break
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return []
+        directory = parent
+    rules = []
+    for directory in reversed(chain):
+        rules.extend(read_ignore_rules(directory))
+    return rules
+
+
+def is_ignored(rules, path, is_dir):
+    ignored = False
+    for rule in rules:
+        if rule.matches(path, is_dir):
+            ignored = not rule.negate
+    return ignored
+
+
+class GrepLoader(WorkerLoadable):
+    """Searches the given paths for a regular expression.  Matches are
+    appended to self.results as (path, line number, line) in the order the
+    files are finished."""
+    progressbar_supported = False
+    workers = 8
+
+    def __init__(self, paths, regex, pattern, show_hidden=True, on_update=None):
+        self.paths = list(paths)
+        self.regex = regex
+        self.pattern = pattern
+        self.show_hidden = show_hidden
+        self.on_update = on_update
+        self.results = []
+        self.searched = 0
+        self.binary = 0
+        self.errors = []
+        self.finished = False
+        WorkerLoadable.__init__(self, self.generate(), self._describe())
+
+    def _describe(self):
+        return 'grep {0}: {1} matches in {2} files searched'.format(
+            self.pattern, len(self.results), self.searched)
+
+    def _list(self, path, rules):
+        """Returns the files to search and the subdirectories to walk,
+        with the ignore rules that apply to them."""
+        self.checkpoint()
+        rules = rules + read_ignore_rules(path)
+        files = []
+        subdirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if not self.show_hidden and entry.name.startswith('.'):
+                    continue
+                try:
+                    mode = entry.stat(follow_symlinks=False).st_mode
+                except OSError:
+                    continue
+                if stat.S_ISDIR(mode):
+                    if entry.name not in VCS_DIRECTORIES and \
+                            not is_ignored(rules, entry.path, True):
+                        subdirs.append(entry.path)
+                elif stat.S_ISREG(mode) and not is_ignored(rules, entry.path, False):
+                    files.append(entry.path)
+        return files, [(subdir, rules) for subdir in subdirs]
+
+    def _search(self, path):
+        self.checkpoint()
+        with open(path, 'rb') as fobj:
+            head = fobj.read(BINARY_CHECK_SIZE)
+            if b'\0' in head:
+                return None
+            fobj.seek(0)
+            matches = []
+            search = self.regex.search
+            for lineno, raw in enumerate(fobj, 1):
+                if lineno % CHECKPOINT_LINES == 0:
+                    self.checkpoint()
+                line = raw.decode('utf-8', 'replace').rstrip('\n')
+                if search(line):
+                    matches.append((path, lineno, line.rstrip('\r')[:MAX_LINE_LENGTH]))
+        return matches
+
+    def _submit(self, pool, fn, path, *args):
+        future = pool.submit(fn, path, *args)
+        self._paths[future] = path
+        future.add_done_callback(self._finished.put)
+
+    def _collect(self):
+        """The futures that finished since the last call, waiting at most
+        poll_interval for the first one."""
+        try:
+            done = [self._finished.get(timeout=self.poll_interval)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                done.append(self._finished.get_nowait())
+            except queue.Empty:
+                return done
+
+    def generate(self):
+        pool = self.new_pool(self.workers)
+        self._paths = {}
+        self._finished = queue.Queue()
+        for path in self.paths:
+            if os.path.isdir(path):
+                self._submit(pool, self._list, path, inherited_ignore_rules(path))
+            else:
+                self._submit(pool, self._search, path)
+
+        while self._paths:
+            updated = False
+            for future in self._collect():
+                path = self._paths.pop(future)
+                if future.exception() is not None:
+                    self.errors.append((path, future.exception()))
+                    continue
+                result = future.result()
+                if isinstance(result, tuple):
+                    files, subdirs = result
+                    for filepath in files:
+                        self._submit(pool, self._search, filepath)
+                    for subdir, rules in subdirs:
+                        self._submit(pool, self._list, subdir, rules)
+                    continue
+                self.searched += 1
+                if result is None:
+                    self.binary += 1
+                elif result:
+                    self.results.extend(result)
+                    updated = True
+            self.description = self._describe()
+            if updated and self.on_update is not None:
+                self.on_update(self)
+            yield
+        self.shutdown()
+        self.finished = True
+        if self.on_update is not None:
+            self.on_update(self)
@@ -0,0 +1,173 @@
+# The results view of :grep, drawn in place of the browser like the task
+# view.  It shows the matches of the running search as they come in.
+#
+#   j/k, arrows, g/G, page up/down, ^D/^U   move
+#   <Enter>, l, <right>                     select the file in ranger
+#   e                                       open the file at that line
+#   x, ^C                                   stop the search
+#   q, h, <left>, <Esc>                     close (and stop the search)
+#   :                                       open the console
+
+from __future__ import (absolute_import, division, print_function)
+
+import curses
+import os
+import shlex
+
+from ranger.ext.accumulator import Accumulator
+from ranger.gui.widgets import Widget
+
+KEY_CTRL_C = 3
+KEY_CTRL_D = 4
+KEY_CTRL_U = 21
+KEY_ESC = 27
+
+MOVES = {
+    ord('j'): {'down': 1}, curses.KEY_DOWN: {'down': 1},
+    ord('k'): {'up': 1}, curses.KEY_UP: {'up': 1},
+    ord('g'): {'to': 0}, curses.KEY_HOME: {'to': 0},
+    ord('G'): {'to': -1}, curses.KEY_END: {'to': -1},
+    curses.KEY_NPAGE: {'down': 1.0, 'pages': True},
+    curses.KEY_PPAGE: {'up': 1.0, 'pages': True},
+    KEY_CTRL_D: {'down': 0.5, 'pages': True},
+    KEY_CTRL_U: {'up': 0.5, 'pages': True},
+}
+SELECT_KEYS = (ord('\n'), ord('l'), curses.KEY_RIGHT)
+CLOSE_KEYS = (ord('q'), ord('h'), curses.KEY_LEFT, KEY_ESC)
+STOP_KEYS = (ord('x'), KEY_CTRL_C)
+
+
+class GrepView(Widget, Accumulator):
+    search = None
+    base = None
+
+    def __init__(self, win):
+        Widget.__init__(self, win)
+        Accumulator.__init__(self)
+        self.scroll_begin = 0
+
+    def show_search(self, search, base):
+        if self.search is not None and self.search is not search:
+            self.stop()
+        self.search = search
+        self.base = base
+        self.pointer = 0
+        self.scroll_begin = 0
+        self.need_redraw = True
+
+    def get_list(self):
+        return self.search.results if self.search is not None else []
+
+    def get_height(self):
+        return max(1, self.hei - 1)
+
+    def _title(self):
+        search = self.search
+        if search is None:
+            return 'grep'
+        state = 'done' if search.finished else (
+            'stopped' if search.cancelled else 'searching...')
+        extra = ', {0} binary skipped'.format(search.binary) if search.binary else ''
+        return 'grep {0}: {1} matches, {2} files searched{3} ({4})'.format(
+            search.pattern, len(search.results), search.searched, extra, state)
+
+    def _scroll(self, count):
+        height = self.get_height()
+        if self.pointer < self.scroll_begin:
+            self.scroll_begin = self.pointer
+        elif self.pointer >= self.scroll_begin + height:
+            self.scroll_begin = self.pointer - height + 1
+        self.scroll_begin = max(0, min(self.scroll_begin, count - height))
+
+    def draw(self):
+        if self.search is not None and not self.search.finished \
+                and not self.search.cancelled:
+            self.need_redraw = True
+        if not self.need_redraw:
+            return
+        self.need_redraw = False
+        self.win.erase()
+        if self.hei <= 0:
+            return
+        base_clr = ['in_taskview']
+        self.addstr(0, 0, self._title(), self.wid)
+        self.color_at(0, 0, self.wid, tuple(base_clr), 'title')
+
+        lst = self.get_list()
+        if not lst:
+            if self.hei > 1 and self.search is not None and self.search.finished:
+                self.addstr(1, 0, 'No matches.')
+                self.color_at(1, 0, self.wid, tuple(base_clr), 'error')
+            self.color_reset()
+            return
+
+        self.pointer = max(0, min(self.pointer, len(lst) - 1))
+        self._scroll(len(lst))
+        for y in range(1, self.hei):
+            i = self.scroll_begin + y - 1
+            if i >= len(lst):
+                break
+            path, lineno, line = lst[i]
+            location = '{0}:{1}: '.format(os.path.relpath(path, self.base), lineno)
+            clr = list(base_clr)
+            if i == self.pointer:
+                clr.append('selected')
+            self.addstr(y, 0, location + line.expandtabs(4), self.wid)
+            self.color_at(y, 0, self.wid, tuple(clr))
+            self.color_at(y, 0, len(location), tuple(clr), 'title')
+        self.color_reset()
+
+    def finalize(self):
+        y = self.y + 1 + self.pointer - self.scroll_begin
+        self.fm.ui.win.move(y, self.x)
+
+    def stop(self):
+        if self.search is not None and not self.search.finished:
+            self.fm.loader.remove(item=self.search)
+            self.search.destroy()
+            self.need_redraw = True
+
+    def close(self):
+        self.stop()
+        self.visible = False
+        self.focused = False
+        self.fm.ui.browser.visible = True
+
+    def open(self):
+        ui = self.fm.ui
+        ui.browser.columns[-1].clear_image(force=True)
+        ui.close_pager()
+        ui.close_taskview()
+        ui.browser.visible = False
+        self.visible = True
+        self.focused = True
+        self.need_redraw = True
+
+    def current(self):
+        lst = self.get_list()
+        if not lst:
+            return None
+        return lst[max(0, min(self.pointer, len(lst) - 1))]
+
+    def press(self, key):
+        if key in MOVES:
+            self.move(**MOVES[key])
+        elif key in SELECT_KEYS:
+            match = self.current()
+            if match is not None:
+                self.close()
+                self.fm.select_file(match[0])
+        elif key == ord('e'):
+            match = self.current()
+            if match is not None:
+                editor = shlex.split(os.environ.get('VISUAL') or
+                                     os.environ.get('EDITOR') or 'vi')
+                self.fm.execute_command(editor + ['+{0}'.format(match[1]), match[0]])
+        elif key in STOP_KEYS:
+            self.stop()
+        elif key in CLOSE_KEYS:
+            self.close()
+        elif key == ord(':'):
+            self.fm.open_console()
+        self.need_redraw = True
+        return True
@@ -0,0 +1,59 @@
+# Replaces ranger's metadata manager with one that keeps the parsed
+# .metadata.json files (see index.py), and makes :meta write each
+# .metadata.json once for all selected files.
+
+from __future__ import (absolute_import, division, print_function)
+
+import ranger.api
+from ranger.config.commands import prompt_metadata
+
+from .index import IndexedMetadataManager
+
+
+def _install(fm):
+    fm.metadata = IndexedMetadataManager()
+
+
+if getattr(ranger, 'fm', None) is not None:
+    _install(ranger.fm)
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    # ranger only follows changes of metadata_deep_search made after
+    # startup, apply the value from rc.conf.
+    fm.metadata.deep_search = fm.settings.metadata_deep_search
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
+
+
+class meta(prompt_metadata):  # pylint: disable=invalid-name
+    """
+    :meta <key> [<value>]
+
+    Change metadata of a file.  Deletes the key if value is empty.
+    """
+
+    def execute(self):
+        key = self.arg(1)
+        update_dict = dict()
+        update_dict[key] = self.rest(2)
+        selection = self.fm.thistab.get_selection()
+        try:
+            with self.fm.metadata.batch():
+                for fobj in selection:
+                    self.fm.metadata.set_metadata(fobj.path, update_dict)
+        except (OSError, ValueError) as ex:
+            self.fm.notify(ex, bad=True)
+        self._process_command_stack()
+
+    def tab(self, tabnum):
+        key = self.arg(1)
+        metadata = self.fm.metadata.get_metadata(self.fm.thisfile.path)
+        if key in metadata and metadata[key]:
+            return [" ".join([self.arg(0), self.arg(1), metadata[key]])]
+        return [self.arg(0) + " " + k for k in sorted(metadata)
+                if k.startswith(self.arg(1))]
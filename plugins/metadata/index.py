@@ -0,0 +1,175 @@
+# A MetadataManager that parses every .metadata.json once and writes it once
+# per command.
+#
+# ranger's MetadataManager writes the .metadata.json of a file for every
+# set_metadata() call, and looks for a file's entry in all applicable
+# .metadata.json files (checking whether each exists) every time a file
+# without metadata is drawn.  Here the parsed files are kept with their
+# mtime, the applicable files of a directory are remembered and checked for
+# changes at most every REVALIDATE_INTERVAL seconds, and updates made inside
+# batch() are written when it ends.
+
+from __future__ import (absolute_import, division, print_function)
+
+import copy
+import json
+import os
+from contextlib import contextmanager
+from time import time
+
+from ranger.core.metadata import MetadataManager
+from ranger.ext.openstruct import DefaultOpenStruct as ostruct
+
+REVALIDATE_INTERVAL = 1.0
+
+
+class MetafileChain(object):
+    """The existing .metadata.json files that apply to the files of a
+    directory, nearest first, as (metafile, entries) pairs."""
+    __slots__ = ('names', 'stamps', 'entries', 'checked')
+
+    def __init__(self, names, stamps, entries):
+        self.names = names
+        self.stamps = stamps
+        self.entries = entries
+        self.checked = time()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class IndexedMetadataManager(MetadataManager):
+
+    def __init__(self):
+        # metafiles maps .metadata.json filenames to (mtime, entries)
+        self.metafiles = {}
+        # chains maps directories to their MetafileChain
+        self.chains = {}
+        self._batch_depth = 0
+        self._dirty = set()
+        self._deep_search = False
+        MetadataManager.__init__(self)
+
+    @property
+    def deep_search(self):
+        return self._deep_search
+
+    @deep_search.setter
+    def deep_search(self, value):
+        self._deep_search = value
+        self.chains.clear()
+
+    def reset(self):
+        MetadataManager.reset(self)
+        self.metafiles.clear()
+        self.chains.clear()
+
+    # Reading
+
+    def _load(self, metafile, mtime):
+        if metafile in self._dirty:
+            return self.metafiles[metafile][1]
+        if mtime is None:
+            self.metafiles.pop(metafile, None)
+            return None
+        cached = self.metafiles.get(metafile)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(metafile, "r") as fobj:
+            try:
+                entries = json.load(fobj)
+            except ValueError:
+                raise ValueError("Failed decoding JSON file %s" % metafile)
+        self.metafiles[metafile] = (mtime, entries)
+        return entries
+
+    def _get_metafile_content(self, metafile):
+        entries = self._load(metafile, _mtime(metafile))
+        return {} if entries is None else entries
+
+    def _chain(self, dirname):
+        chain = self.chains.get(dirname)
+        if chain is not None:
+            if time() - chain.checked < REVALIDATE_INTERVAL:
+                return chain
+            if [_mtime(name) for name in chain.names] == chain.stamps:
+                chain.checked = time()
+                return chain
+        names = list(self._get_metafile_names(os.path.join(dirname, '')))
+        stamps = [_mtime(name) for name in names]
+        entries = []
+        for name, mtime in zip(names, stamps):
+            content = self._load(name, mtime)
+            if content:
+                entries.append((name, content))
+        chain = self.chains[dirname] = MetafileChain(names, stamps, entries)
+        return chain
+
+    def _get_entry(self, filename):
+        dirname, basename = os.path.split(filename)
+        for _, entries in self._chain(dirname).entries:
+            if filename in entries:
+                return entries[filename]
+            if basename in entries:
+                return entries[basename]
+        raise KeyError
+
+    def get_metadata(self, filename):
+        try:
+            return ostruct(copy.deepcopy(self._get_entry(filename)))
+        except KeyError:
+            return ostruct()
+
+    # Writing
+
+    @contextmanager
+    def batch(self):
+        """Write the .metadata.json files changed inside the block once, at
+        its end."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.commit()
+
+    def _set_metadata_raw(self, filename, update_dict, metafile):
+        entries = self._get_metafile_content(metafile)
+        if metafile not in self.metafiles:
+            self.metafiles[metafile] = (None, entries)
+        basename = os.path.basename(filename)
+        key = filename if filename in entries else basename
+        entry = entries.setdefault(key, {})
+        entry.update(update_dict)
+
+        # Delete key if the value is empty
+        for name, value in update_dict.items():
+            if value == "":
+                del entry[name]
+
+        # If file's metadata become empty after an update, remove it entirely
+        if not entry:
+            del entries[key]
+
+        self._dirty.add(metafile)
+        if not self._batch_depth:
+            self.commit()
+
+    def commit(self):
+        """Write the changed .metadata.json files."""
+        dirty, self._dirty = self._dirty, set()
+        for metafile in dirty:
+            entries = self.metafiles[metafile][1]
+            tmp = metafile + '.tmp'
+            with open(tmp, "w") as fobj:
+                json.dump(entries, fobj, check_circular=True, indent=2)
+            os.replace(tmp, metafile)
+            self.metafiles[metafile] = (_mtime(metafile), entries)
+        if dirty:
+            # A new file can apply to any directory below it.
+            self.chains.clear()
@@ -0,0 +1,200 @@
+# MIME types detected from the file contents, for everything in ranger that
+# asks for them.
+#
+# ranger guesses MIME types from file names, rifle runs file(1) for every
+# file it can not guess, and scope.sh runs file(1) for every preview.  Here
+# the types are detected from the first bytes of the files (see magic.py)
+# and cached persistently (see cache.py):
+#
+#   * "filter_stack add mime" and "search_next order=mimetype" detect the
+#     types of the whole directory in one batch in the background, and use
+#     the names' types until the batch is done;
+#   * rifle and the preview script get the type of the one file they are
+#     about, detected right away if it is not cached; scope.sh takes it as
+#     its sixth argument instead of running file(1).
+
+from __future__ import (absolute_import, division, print_function)
+
+import atexit
+import os
+import re
+
+import ranger.api
+import ranger.core.actions
+from ranger.core.actions import Actions
+from ranger.core.filter_stack import BaseFilter, stack_filter
+from ranger.core.loader import CommandLoader
+from ranger.core.shared import FileManagerAware
+
+from .._store import get_store
+from .cache import MimeCache, MimeLoader
+from .magic import classify_path, classify_stat, guess_from_name
+
+# Types detected one at a time are written to the store in batches of this
+# many, and when ranger exits.
+FLUSH_EVERY = 32
+
+
+def get_mime_cache(fm):
+    if getattr(fm, 'mime_cache', None) is None:
+        fm.mime_cache = MimeCache(get_store(fm))
+        fm.mime_pending = {}
+        atexit.register(fm.mime_cache.flush)
+    return fm.mime_cache
+
+
+def directory_types(fm, directory, callback=None):
+    """The detected MIME types of the files of directory by path if all of
+    them are known.  Otherwise None; the missing ones are then detected in
+    the background and callback(types) is called once they are."""
+    cache = get_mime_cache(fm)
+    types = {}
+    missing = []
+    cache.look_up(fobj.stat for fobj in directory.files_all or () if fobj.stat is not None)
+    for fobj in directory.files_all or ():
+        # fobj.stat follows symbolic links, like file --dereference.
+        if fobj.stat is None:
+            continue
+        mimetype = classify_stat(fobj.stat) or cache.get(fobj.stat)
+        if mimetype is None:
+            missing.append((fobj.path, fobj.stat))
+        else:
+            types[fobj.path] = mimetype
+    if not missing:
+        return types
+
+    pending = fm.mime_pending
+    loader = pending.get(directory.path)
+    if loader is None or loader not in fm.loader.queue:
+        loader = pending[directory.path] = MimeLoader(cache, missing, directory.path)
+
+        def done(loader):
+            if pending.get(directory.path) is loader:
+                del pending[directory.path]
+        loader.callbacks.append(done)
+        fm.loader.add(loader, append=True)
+    if callback is not None:
+        def call(_):
+            types = directory_types(fm, directory, callback)
+            if types is not None:
+                callback(types)
+        loader.callbacks.append(call)
+    return None
+
+
+def mimetype_of(fm, path):
+    """The detected MIME type of the file at path, detected right away if
+    it is not cached.  None if the file can not be read."""
+    cache = get_mime_cache(fm)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    mimetype = classify_stat(st) or cache.get(st)
+    if mimetype is None:
+        try:
+            mimetype = classify_path(path, st)
+        except OSError:
+            return None
+        cache.put(st, mimetype)
+        if cache.unsaved() >= FLUSH_EVERY:
+            cache.flush()
+    return mimetype
+
+
+@stack_filter("mime")
+class MimeFilter(BaseFilter, FileManagerAware):
+    # Bumped when the detected types arrive (see plugins/filterstack).
+    revision = 0
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.directory = self.fm.thisdir
+        self.types = directory_types(self.fm, self.directory, self._done)
+
+    def _done(self, types):
+        self.types = types
+        self.revision += 1
+        if self.directory.filter_stack:
+            self.directory.refilter()
+        self.fm.ui.redraw_main_column()
+
+    def __call__(self, fobj):
+        mimetype = None
+        if self.types is not None:
+            mimetype = self.types.get(fobj.path)
+        if mimetype is None:
+            mimetype = guess_from_name(fobj.relative_path)
+        if mimetype is None:
+            return False
+        return self.regex.search(mimetype)
+
+    def __str__(self):
+        return "<Filter: mimetype =~ /{0}/{1}>".format(
+            self.pattern, '' if self.types is not None else ' (detecting...)')
+
+
+_search_next_prev = Actions.search_next
+
+
+def search_next(self, order=None, offset=1, forward=True):
+    if (self.search_method if order is None else order) != 'mimetype' \
+            or (order is None and self.thisdir.cycle_list):
+        return _search_next_prev(self, order, offset, forward)
+
+    cwd = self.thisdir
+
+    def cycle_list(types):
+        lst = list(cwd.files)
+        lst.sort(key=lambda item: types.get(item.path) or item.mimetype or '')
+        cwd.set_cycle_list(lst)
+
+    def done(types):
+        # Later jumps follow the detected types.
+        if self.thisdir is cwd and self.search_method == 'mimetype':
+            cycle_list(types)
+
+    types = directory_types(self, cwd, done)
+    if types is None:
+        return _search_next_prev(self, order, offset, forward)
+    self.set_search_method(order='mimetype')
+    cycle_list(types)
+    return cwd.cycle(forward=None)
+
+
+Actions.search_next = search_next
+
+
+class PreviewLoader(CommandLoader):
+    """Passes the MIME type of the file to the preview script as its sixth
+    argument."""
+
+    def __init__(self, args, *pargs, **kwargs):
+        if len(args) == 6 and args[0] == self.fm.settings.preview_script:
+            mimetype = mimetype_of(self.fm, args[1])
+            if mimetype:
+                args = list(args) + [mimetype]
+        CommandLoader.__init__(self, args, *pargs, **kwargs)
+
+
+ranger.core.actions.CommandLoader = PreviewLoader
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    rifle = fm.rifle
+    get_mimetype_prev = rifle.get_mimetype
+
+    def get_mimetype(fname):
+        # pylint: disable=protected-access
+        if not rifle._mimetype:
+            rifle._mimetype = mimetype_of(fm, fname)
+        return rifle._mimetype or get_mimetype_prev(fname)
+
+    rifle.get_mimetype = get_mimetype
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
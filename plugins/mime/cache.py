@@ -0,0 +1,135 @@
+# Detected MIME types, kept in the plugin store and detected in batches.
+#
+# Types are cached per (device, inode) together with mtime and size, so a
+# file is read again only after it changed.  A MimeLoader detects the types
+# of the files of one directory that are not cached, reading the first
+# bytes of the files on a thread pool, and stores them in one transaction.
+# Cached types are looked up when they are asked for, a directory's at once.
+
+from __future__ import (absolute_import, division, print_function)
+
+from .._workers import TaskCancelled, WorkerLoadable
+from .magic import classify_path, guess_from_name
+
+# Inodes looked up per query, below sqlite's limit of variables
+LOOKUP_BATCH = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS mime_types (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mimetype TEXT NOT NULL,
+    PRIMARY KEY (dev, ino)
+);
+'''
+
+
+class MimeCache(object):
+    """(device, inode) -> (mtime, size, MIME type), backed by the plugin
+    store.  Entries of files whose mtime or size changed are ignored."""
+
+    def __init__(self, store):
+        self.store = store
+        self.store.create(SCHEMA)
+        # (dev, ino) -> entry, or None if the store has none
+        self.entries = {}
+        self._dirty = set()
+
+    def look_up(self, stats):
+        """Read the entries of the files with these stat results that were
+        not looked up yet, in a few queries."""
+        by_dev = {}
+        for st in stats:
+            if (st.st_dev, st.st_ino) not in self.entries:
+                by_dev.setdefault(st.st_dev, set()).add(st.st_ino)
+        for dev, inodes in by_dev.items():
+            inodes = list(inodes)
+            for i in range(0, len(inodes), LOOKUP_BATCH):
+                batch = inodes[i:i + LOOKUP_BATCH]
+                for ino in batch:
+                    self.entries.setdefault((dev, ino), None)
+                for ino, mtime, size, mimetype in self.store.query(
+                        'SELECT ino, mtime, size, mimetype FROM mime_types '
+                        'WHERE dev = ? AND ino IN ({0})'.format(','.join('?' * len(batch))),
+                        [dev] + batch):
+                    self.entries[dev, ino] = (mtime, size, mimetype)
+
+    def get(self, st):
+        key = (st.st_dev, st.st_ino)
+        if key not in self.entries:
+            self.look_up([st])
+        entry = self.entries[key]
+        if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+            return None
+        return entry[2]
+
+    def put(self, st, mimetype, persistent=True):
+        key = (st.st_dev, st.st_ino)
+        self.entries[key] = (st.st_mtime_ns, st.st_size, mimetype)
+        if persistent:
+            self._dirty.add(key)
+        else:
+            self._dirty.discard(key)
+
+    def unsaved(self):
+        return len(self._dirty)
+
+    def flush(self):
+        self.store.write(
+            'INSERT OR REPLACE INTO mime_types VALUES (?, ?, ?, ?, ?)',
+            [key + self.entries[key] for key in self._dirty])
+        self._dirty = set()
+
+
+class MimeLoader(WorkerLoadable):
+    """Detects the MIME types of files, a list of (path, stat following
+    links).  When done, self.types maps their paths to the types.  Files
+    that can not be read get the type their name suggests, which is only
+    kept until ranger exits."""
+    progressbar_supported = True
+    workers = 8
+
+    def __init__(self, cache, files, description):
+        self.cache = cache
+        self.files = files
+        self.types = {}
+        self.callbacks = []
+        self.detected = 0
+        self._what = description
+        WorkerLoadable.__init__(self, self.generate(), self._describe())
+
+    def _describe(self):
+        return 'detecting file types in {0}: {1}/{2}'.format(
+            self._what, self.detected, len(self.files))
+
+    def _classify(self, path, st):
+        self.checkpoint()
+        return classify_path(path, st)
+
+    def generate(self):
+        pool = self.new_pool(self.workers)
+        futures = [(path, st, pool.submit(self._classify, path, st))
+                   for path, st in self.files]
+        for path, st, future in futures:
+            while not future.done():
+                self.wait_some([future])
+                self.percent = self.detected * 100. / max(1, len(self.files))
+                self.description = self._describe()
+                yield
+            self.detected += 1
+            try:
+                mimetype = future.result()
+            except TaskCancelled:
+                continue
+            except OSError:
+                mimetype = guess_from_name(path) or 'application/octet-stream'
+                self.cache.put(st, mimetype, persistent=False)
+            else:
+                self.cache.put(st, mimetype)
+            self.types[path] = mimetype
+        self.shutdown()
+        self.cache.flush()
+        for callback in self.callbacks:
+            callback(self)
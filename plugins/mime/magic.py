@@ -0,0 +1,231 @@
+# MIME types from the first bytes of a file, in the spirit of
+# "file --mime-type --dereference".
+#
+# Only the formats that matter for opening and previewing files are known;
+# the rest is told apart as text or binary.  Where the content only says
+# "text" or "zip", the type the file name suggests is taken if it is one of
+# those (application/json for a .json file, an OpenDocument or Office
+# document for a zip), like file(1) does with its own rules.
+
+from __future__ import (absolute_import, division, print_function)
+
+import codecs
+import mimetypes
+import os
+import stat
+
+HEAD_SIZE = 4096
+
+# (offset, bytes, MIME type), tried in order
+SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'8BPS', 'image/vnd.adobe.photoshop'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'%!PS', 'application/postscript'),
+    (0, b'AT&TFORM', 'image/vnd.djvu'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'PK\x05\x06', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'BZh', 'application/x-bzip2'),
+    (0, b'\xfd7zXZ\x00', 'application/x-xz'),
+    (0, b'(\xb5/\xfd', 'application/zstd'),
+    (0, b'\x04\"M\x18', 'application/x-lz4'),
+    (0, b"7z\xbc\xaf'\x1c", 'application/x-7z-compressed'),
+    (0, b'Rar!\x1a\x07', 'application/x-rar'),
+    (0, b'!<arch>\n', 'application/x-archive'),
+    (257, b'ustar', 'application/x-tar'),
+    (0, b'\xed\xab\xee\xdb', 'application/x-rpm'),
+    (0, b'MZ', 'application/x-dosexec'),
+    (0, b'\xcf\xfa\xed\xfe', 'application/x-mach-binary'),
+    (0, b'\xce\xfa\xed\xfe', 'application/x-mach-binary'),
+    (0, b'\xca\xfe\xba\xbe', 'application/x-java-applet'),
+    (0, b'\x00asm', 'application/wasm'),
+    (0, b'SQLite format 3\x00', 'application/vnd.sqlite3'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'MThd', 'audio/midi'),
+    (0, b'\x1aE\xdf\xa3', 'video/x-matroska'),
+    (0, b'FLV\x01', 'video/x-flv'),
+    (0, b'\x00\x00\x01\xba', 'video/mpeg'),
+    (0, b'\x00\x00\x01\xb3', 'video/mpeg'),
+    (0, b'wOFF', 'font/woff'),
+    (0, b'wOF2', 'font/woff2'),
+    (0, b'OTTO', 'font/otf'),
+    (0, b'\x00\x01\x00\x00\x00', 'font/sfnt'),
+    (0, b'{\\rtf', 'text/rtf'),
+    (0, b'-----BEGIN PGP', 'application/pgp-keys'),
+)
+
+_RIFF = {b'WAVE': 'audio/x-wav', b'AVI ': 'video/x-msvideo', b'WEBP': 'image/webp'}
+_FTYP = {b'qt  ': 'video/quicktime', b'M4A ': 'audio/x-m4a', b'M4B ': 'audio/x-m4a',
+         b'heic': 'image/heic', b'heix': 'image/heic', b'mif1': 'image/heif',
+         b'avif': 'image/avif', b'3gp4': 'video/3gpp', b'3gp5': 'video/3gpp'}
+_ELF = {1: 'application/x-object', 2: 'application/x-executable',
+        3: 'application/x-sharedlib', 4: 'application/x-coredump'}
+_INTERPRETERS = {
+    'sh': 'text/x-shellscript', 'bash': 'text/x-shellscript', 'dash': 'text/x-shellscript',
+    'zsh': 'text/x-shellscript', 'ksh': 'text/x-shellscript', 'fish': 'text/x-shellscript',
+    'python': 'text/x-script.python', 'perl': 'text/x-perl', 'ruby': 'text/x-ruby',
+    'node': 'application/javascript', 'lua': 'text/x-lua', 'php': 'text/x-php',
+    'awk': 'text/x-awk', 'gawk': 'text/x-awk', 'tclsh': 'text/x-tcl',
+}
+# Control characters that do occur in text
+_TEXT_CONTROLS = frozenset(b'\t\n\r\f\b\x1b')
+_BINARY_CONTROLS = bytes(c for c in range(32) if c not in _TEXT_CONTROLS) + b'\x7f'
+
+
+def guess_from_name(name):
+    return mimetypes.guess_type(name, False)[0]
+
+
+def _is_text(head):
+    if b'\x00' in head:
+        return False
+    controls = len(head) - len(head.translate(None, _BINARY_CONTROLS))
+    if controls * 100 > len(head):
+        return False
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        # Latin-1 and the like; file(1) calls these text as well.
+        return not controls
+    return True
+
+
+def _text_type(head):
+    if head.startswith(b'#!'):
+        line = head[2:].split(b'\n', 1)[0].decode('utf-8', 'replace').split()
+        if line:
+            name = os.path.basename(line[0])
+            if name == 'env' and len(line) > 1:
+                name = line[-1] if line[1].startswith('-') else line[1]
+            name = name.rstrip('0123456789.')
+            return _INTERPRETERS.get(name, 'text/plain')
+    start = head.lstrip(b'\xef\xbb\xbf \t\r\n')[:256].lower()
+    if start.startswith((b'<!doctype html', b'<html')):
+        return 'text/html'
+    if start.startswith(b'<svg') or (start.startswith(b'<?xml') and b'<svg' in head.lower()):
+        return 'image/svg+xml'
+    if start.startswith(b'<?xml'):
+        return 'text/xml'
+    return 'text/plain'
+
+
+def _elf_type(head):
+    order = 'little' if head[5:6] == b'\x01' else 'big'
+    elf_type = int.from_bytes(head[16:18], order)
+    if elf_type == 3:
+        # Position independent executables are shared objects that name an
+        # interpreter (PT_INTERP) in their program headers.
+        wide = head[4:5] == b'\x02'
+        phoff = int.from_bytes(head[32:40] if wide else head[28:32], order)
+        size = int.from_bytes(head[54:56] if wide else head[42:44], order)
+        count = int.from_bytes(head[56:58] if wide else head[44:46], order)
+        for i in range(count):
+            start = phoff + i * size
+            if start + 4 > len(head):
+                break
+            if int.from_bytes(head[start:start + 4], order) == 3:
+                return 'application/x-pie-executable'
+    return _ELF.get(elf_type, 'application/x-executable')
+
+
+def _zip_type(head):
+    # OpenDocument and EPUB store their type uncompressed as first entry.
+    if head[30:38] == b'mimetype':
+        mimetype = head[38:38 + 80].split(b'PK', 1)[0]
+        try:
+            return mimetype.decode('ascii')
+        except UnicodeDecodeError:
+            pass
+    return 'application/zip'
+
+
+def _refined(mimetype, name):
+    """The type the name suggests if the content fits it."""
+    guess = guess_from_name(name)
+    if guess is None or guess == mimetype:
+        return mimetype
+    if mimetype == 'inode/x-empty':
+        return guess
+    if mimetype == 'text/plain' and (
+            guess.startswith('text/') or guess.endswith(('json', 'javascript', 'xml', 'x-sh',
+                                                          'x-tex', 'x-latex', 'yaml', 'toml'))):
+        return guess
+    if mimetype == 'application/zip' and (
+            guess.startswith('application/vnd.') or guess.endswith(('+zip', 'java-archive'))):
+        return guess
+    if mimetype in ('application/x-ole-storage', 'application/octet-stream') \
+            and guess.startswith('application/'):
+        return guess
+    return mimetype
+
+
+def classify(head, name=''):
+    """The MIME type of a regular file that starts with the bytes head."""
+    if not head:
+        return _refined('inode/x-empty', name)
+    for offset, magic, mimetype in SIGNATURES:
+        if head.startswith(magic, offset):
+            break
+    else:
+        mimetype = None
+    if mimetype == 'application/zip':
+        mimetype = _zip_type(head)
+    elif mimetype is None:
+        if head.startswith(b'\x7fELF') and len(head) > 17:
+            mimetype = _elf_type(head)
+        elif head.startswith(b'RIFF') and head[8:12] in _RIFF:
+            mimetype = _RIFF[head[8:12]]
+        elif head[4:8] == b'ftyp':
+            mimetype = _FTYP.get(head[8:12], 'video/mp4')
+        elif head.startswith(b'OggS'):
+            mimetype = 'video/ogg' if b'\x80theora' in head else 'audio/ogg'
+        elif head.startswith(b'BM') and head[14:18] in (
+                b'\x0c\x00\x00\x00', b'(\x00\x00\x00', b'l\x00\x00\x00', b'|\x00\x00\x00'):
+            mimetype = 'image/bmp'
+        elif head[:1] == b'\xff' and len(head) > 1 and head[1] & 0xe0 == 0xe0 \
+                and not _is_text(head):
+            mimetype = 'audio/mpeg'
+        elif _is_text(head):
+            mimetype = _text_type(head)
+        else:
+            mimetype = 'application/octet-stream'
+    return _refined(mimetype, name)
+
+
+def classify_stat(st):
+    """The MIME type of anything but a regular file, None for those."""
+    mode = st.st_mode
+    if stat.S_ISREG(mode):
+        return None
+    if stat.S_ISDIR(mode):
+        return 'inode/directory'
+    if stat.S_ISFIFO(mode):
+        return 'inode/fifo'
+    if stat.S_ISSOCK(mode):
+        return 'inode/socket'
+    if stat.S_ISCHR(mode):
+        return 'inode/chardevice'
+    if stat.S_ISBLK(mode):
+        return 'inode/blockdevice'
+    return 'application/octet-stream'
+
+
+def classify_path(path, st):
+    """The MIME type of the file at path with the stat (following links)
+    st; raises OSError if it can not be read."""
+    mimetype = classify_stat(st)
+    if mimetype is not None:
+        return mimetype
+    if not st.st_size:
+        return classify(b'', os.path.basename(path))
+    with open(path, 'rb') as fobj:
+        head = fobj.read(HEAD_SIZE)
+    return classify(head, os.path.basename(path))
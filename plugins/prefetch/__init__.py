@@ -0,0 +1,273 @@
+# Directories are listed on a thread pool ahead of their loading.
+#
+# ranger loads directories one after the other in the UI thread, stat()ing
+# every entry, and after a cd to a deep path it loads the parent column
+# before the current directory.  On drvfs or network file systems each of
+# those stat() calls is a round trip.  Here every directory that is
+# scheduled for loading, and on a cd the ancestors shown in the parent
+# columns, are listed and stat()ed by a Prefetcher on worker threads at the
+# same time, larger directories in chunks on several threads.  Loading a
+# directory waits for its listing without blocking the UI and takes the
+# names, stats and mtime from it.  The current directory is moved to the
+# front of the loader queue, so it is shown first and the other columns
+# fill in as their listings arrive.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import stat
+import threading
+from time import perf_counter, time
+
+import ranger.api
+import ranger.container.directory
+from ranger.container.directory import Directory
+from ranger.core.loader import Loader
+
+from .._workers import DaemonPool
+
+WORKERS = 4
+CHUNK = 64
+POLL_INTERVAL = 0.005
+# Listings older than this are not used any more
+MAX_AGE = 2.0
+
+# path -> (stat, lstat) of the entries of the directory that is being
+# loaded; an OSError in place of a stat is raised.
+_STATS = {}
+# path -> Listing of the directory that is being loaded
+_LISTINGS = {}
+# path -> mtime of the listing that listdir() just returned the names of
+_MTIMES = {}
+
+
+def _is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _stats(fullpath):
+    try:
+        file_lstat = os.lstat(fullpath)
+    except OSError as ex:
+        return (ex, ex)
+    file_stat = file_lstat
+    if stat.S_ISLNK(file_lstat.st_mode):
+        try:
+            file_stat = os.stat(fullpath)
+        except OSError as ex:
+            file_stat = ex
+    return (file_stat, file_lstat)
+
+
+class Listing(object):  # pylint: disable=too-many-instance-attributes
+    """A directory listed on the pool.  Once listed is set, entries holds
+    (path, whether it is a directory) of every entry, told by the type the
+    listing reports where it can; the entries are then stat()ed in chunks
+    of CHUNK, which are added to chunks as they are done.  mtime is the one
+    of the directory before it was listed."""
+
+    def __init__(self, pool, path):
+        self.pool = pool
+        self.path = path
+        self.started = time()
+        self.entries = None
+        self.mtime = None
+        self.error = None
+        self.stats = {}
+        self.chunks = []
+        self.stat_time = 0.0
+        self.stat_count = 0
+        self.listed = threading.Event()
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._remaining = 0
+        pool.submit(self._list)
+
+    def _list(self):
+        try:
+            # Changes after this stat() are caught by the next load.
+            self.mtime = os.stat(self.path).st_mtime
+            with os.scandir(self.path) as entries:
+                self.entries = [(entry.path, _is_dir(entry)) for entry in entries]
+        except OSError as ex:
+            self.error = ex
+            self.entries = []
+        self.listed.set()
+        paths = [path for path, _ in self.entries]
+        chunks = [paths[i:i + CHUNK] for i in range(0, len(paths), CHUNK)]
+        if not chunks:
+            self.done.set()
+            return
+        self._remaining = len(chunks)
+        for chunk in chunks:
+            self.pool.submit(self._stat, chunk)
+
+    def _stat(self, paths):
+        start = perf_counter()
+        stats = dict((path, _stats(path)) for path in paths)
+        elapsed = perf_counter() - start
+        with self._lock:
+            self.stats.update(stats)
+            self.chunks.append(stats)
+            self.stat_time += elapsed
+            self.stat_count += len(paths)
+            self._remaining -= 1
+            if not self._remaining:
+                self.done.set()
+
+
+class Prefetcher(object):
+    def __init__(self):
+        # Daemon threads: a listing stuck on a hung mount must not keep
+        # ranger from exiting.
+        self.pool = DaemonPool(WORKERS)
+        self.pending = {}  # path -> Listing
+
+    def prefetch(self, path):
+        listing = self.pending.get(path)
+        if listing is None or time() - listing.started > MAX_AGE:
+            self.pending[path] = Listing(self.pool, path)
+
+    def take(self, path):
+        """The Listing of path, if one is fresh enough."""
+        listing = self.pending.pop(path, None)
+        if listing is None or time() - listing.started > MAX_AGE:
+            return None
+        return listing
+
+    def forget(self, keep):
+        for path in list(self.pending):
+            if path not in keep and self.pending[path].done.is_set():
+                del self.pending[path]
+
+
+def get_prefetcher(fm):
+    if 'prefetcher' not in fm.__dict__:
+        fm.__dict__['prefetcher'] = Prefetcher()
+    return fm.__dict__['prefetcher']
+
+
+def _lstat(path):
+    stats = _STATS.get(path)
+    if stats is None:
+        return os.lstat(path)
+    if isinstance(stats[1], OSError):
+        raise stats[1]
+    return stats[1]
+
+
+def _stat(path):
+    stats = _STATS.get(path)
+    if stats is None:
+        return os.stat(path)
+    if isinstance(stats[0], OSError):
+        raise stats[0]
+    return stats[0]
+
+
+class _Os(object):
+    """The os module for ranger.container.directory, with the names and the
+    mtime of the directory that is being loaded taken from its Listing."""
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+    @staticmethod
+    def listdir(path):
+        listing = _LISTINGS.get(path)
+        if listing is None:
+            return os.listdir(path)
+        if listing.error is not None:
+            raise listing.error
+        _MTIMES[path] = listing.mtime
+        start = len(path if path == '/' else path + '/')
+        return [entry_path[start:] for entry_path, _ in listing.entries]
+
+    @staticmethod
+    def stat(path, *args, **kwargs):
+        mtime = _MTIMES.pop(path, None)
+        if mtime is None or args or kwargs:
+            return os.stat(path, *args, **kwargs)
+        # Right after listdir(), for load_content_mtime, which is all that
+        # is used of it.
+        return os.stat_result((0,) * 8 + (mtime, 0))
+
+
+ranger.container.directory.os_lstat = _lstat
+ranger.container.directory.os_stat = _stat
+ranger.container.directory.os = _Os()
+
+_load_content_prev = Directory.load_content
+
+
+def load_content(self, schedule=None):
+    if schedule is not False and not self.loading and self.load_generator is None \
+            and not self.flat and not self.settings.freeze_files and self.fm:
+        get_prefetcher(self.fm).prefetch(self.path)
+    return _load_content_prev(self, schedule)
+
+
+_load_bit_by_bit_prev = Directory.load_bit_by_bit
+
+
+def load_bit_by_bit(self):
+    listing = None
+    if not self.flat and 'prefetcher' in self.fm.__dict__:
+        listing = self.fm.__dict__['prefetcher'].take(self.path)
+    stats = {}
+    if listing is not None:
+        while not listing.done.is_set():
+            yield
+            listing.done.wait(POLL_INTERVAL)
+        stats = listing.stats
+        _LISTINGS[self.path] = listing
+    _STATS.update(stats)
+    try:
+        yield from _load_bit_by_bit_prev(self)
+    finally:
+        if listing is not None:
+            _LISTINGS.pop(self.path, None)
+            _MTIMES.pop(self.path, None)
+        for path in stats:
+            _STATS.pop(path, None)
+
+
+Directory.load_content = load_content
+Directory.load_bit_by_bit = load_bit_by_bit
+
+_add_prev = Loader.add
+
+
+def add(self, obj, append=False):
+    _add_prev(self, obj, append)
+    thisdir = self.fm.thisdir
+    if isinstance(obj, Directory) and obj is not thisdir and thisdir in self.queue \
+            and self.queue[0] is not thisdir:
+        self.move(pos_src=self.queue.index(thisdir), pos_dest=0)
+
+
+Loader.add = add
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    def prefetch_ancestors(signal):
+        tab = signal.fm.thistab
+        prefetcher = get_prefetcher(signal.fm)
+        # Parent columns of the miller view
+        parents = tab.pathway[:-1][-max(1, len(signal.fm.settings.column_ratios) - 2):]
+        prefetcher.forget(set(directory.path for directory in tab.pathway))
+        for directory in reversed(parents):
+            if directory.files_all is None and not directory.loading \
+                    and directory.load_generator is None:
+                prefetcher.prefetch(directory.path)
+
+    fm.signal_bind('cd', prefetch_ancestors)
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
@@ -0,0 +1,96 @@
+# Browsing mounts where every stat() is a round trip.
+#
+# On drvfs and 9p of WSL a stat() takes milliseconds, and ranger stat()s
+# every entry before it shows a directory, lists every subdirectory in
+# view to count its files, and reads every file it previews.  The latency
+# of each mount is measured (see latency.py), and on mounts whose stat()s
+# take longer than slow_fs_latency milliseconds:
+#
+#   * directories show their names as soon as they are listed and fill in
+#     sizes and times as they arrive (see listing.py);
+#   * subdirectories are not counted, as with automatically_count_files
+#     off, and files are not previewed.
+#
+# Cumulative sizes (plugins/dirsize) are not updated automatically there
+# either.  Mounts become fast again, and the rest with them, when they are
+# measured again.  "set slow_fs_latency 0" turns this off.
+
+from __future__ import (absolute_import, division, print_function)
+
+from ranger.container.directory import Directory
+from ranger.container.file import File
+from ranger.ext.lazy_property import lazy_property
+
+from .._mounts import mount_point
+from .._settings import register_setting
+from ..prefetch import Listing, get_prefetcher
+from .latency import LatencyEstimator
+from .listing import load_names
+
+register_setting('slow_fs_latency', float, 1.0)
+
+
+def get_estimator(fm):
+    if 'latency_estimator' not in fm.__dict__:
+        fm.__dict__['latency_estimator'] = LatencyEstimator()
+    return fm.__dict__['latency_estimator']
+
+
+def is_slow(fm, path):
+    """Whether the mount of the directory path, free of symbolic links, is
+    slow."""
+    threshold = fm.settings.slow_fs_latency
+    if threshold <= 0:
+        return False
+    return get_estimator(fm).is_slow(mount_point(path), path, threshold / 1000.)
+
+
+def _listed_in(fm, fobj):
+    """The path of the directory fobj is listed in, resolved if ranger has
+    it."""
+    directory = fm.directories.get(fobj.dirname)
+    if directory is None:
+        return fobj.dirname
+    return directory.realpath or directory.path
+
+
+_load_bit_by_bit_prev = Directory.load_bit_by_bit
+
+
+def load_bit_by_bit(self):
+    if self.flat or not is_slow(self.fm, self.realpath or self.path):
+        return _load_bit_by_bit_prev(self)
+    prefetcher = get_prefetcher(self.fm)
+    listing = prefetcher.take(self.path) or Listing(prefetcher.pool, self.path)
+    return load_names(self, listing, get_estimator(self.fm))
+
+
+Directory.load_bit_by_bit = load_bit_by_bit
+
+_size_prev = Directory.__dict__['size']
+
+
+@lazy_property
+def size(self):
+    if self.fm.settings.automatically_count_files \
+            and is_slow(self.fm, _listed_in(self.fm, self)):
+        # As with automatically_count_files off
+        self.infostring = ''
+        self.accessible = True
+        self.runnable = True
+        return None
+    return _size_prev._method(self)  # pylint: disable=protected-access
+
+
+Directory.size = size
+
+_has_preview_prev = File.has_preview
+
+
+def has_preview(self):
+    if self.fm.settings.preview_files and is_slow(self.fm, _listed_in(self.fm, self)):
+        return False
+    return _has_preview_prev(self)
+
+
+File.has_preview = has_preview
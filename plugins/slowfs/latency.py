@@ -0,0 +1,85 @@
+# How long a stat() takes, per mount point.
+#
+# A probe lstat()s the first PROBE_SIZE entries of a directory on the mount
+# in a thread of its own, and loads of slow directories report the time
+# their stat()s took (see listing.py).  The estimate is a moving average of
+# those.  A mount is probed again when it is asked about PROBE_INTERVAL
+# seconds after its last probe; until its first probe is done it counts as
+# slow if it is a drvfs, 9p or network file system.  A slow mount only
+# counts as fast again below half the threshold, so that it does not switch
+# back and forth on every probe when its latency is about the threshold.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import threading
+from time import perf_counter, time
+
+from .._mounts import REMOTE_TYPES, mount_type
+
+PROBE_SIZE = 8
+PROBE_INTERVAL = 30.0
+# Weight of a new measurement in the moving average
+WEIGHT = 0.3
+
+
+def probe(path):
+    """Seconds per lstat() of entries of the directory path, None if it can
+    not be listed."""
+    paths = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                paths.append(entry.path)
+                if len(paths) == PROBE_SIZE:
+                    break
+    except OSError:
+        return None
+    if not paths:
+        paths = [path]
+    start = perf_counter()
+    for entry_path in paths:
+        try:
+            os.lstat(entry_path)
+        except OSError:
+            pass
+    return (perf_counter() - start) / len(paths)
+
+
+class LatencyEstimator(object):
+    def __init__(self):
+        self.latency = {}     # mount point -> seconds per stat()
+        self.slow = {}        # mount point -> whether it counts as slow
+        self.probed = {}      # mount point -> time of the last probe
+        self.probing = set()
+
+    def record(self, mount, seconds):
+        old = self.latency.get(mount)
+        self.latency[mount] = seconds if old is None else old + WEIGHT * (seconds - old)
+
+    def is_slow(self, mount, path, threshold):
+        """Whether stat()s on mount take longer than threshold seconds.
+        path is a directory on it that a probe may list."""
+        if mount not in self.probing and time() - self.probed.get(mount, 0) > PROBE_INTERVAL:
+            self._probe(mount, path)
+        latency = self.latency.get(mount)
+        if latency is None:
+            return mount_type(mount) in REMOTE_TYPES
+        slow = latency > (threshold / 2 if self.slow.get(mount) else threshold)
+        self.slow[mount] = slow
+        return slow
+
+    def _probe(self, mount, path):
+        self.probing.add(mount)
+        self.probed[mount] = time()
+        thread = threading.Thread(target=self._run_probe, args=(mount, path))
+        thread.daemon = True
+        thread.start()
+
+    def _run_probe(self, mount, path):
+        try:
+            seconds = probe(path)
+            if seconds is not None:
+                self.record(mount, seconds)
+        finally:
+            self.probing.discard(mount)
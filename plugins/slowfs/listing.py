@@ -0,0 +1,203 @@
+# Directories on slow mounts, loaded names first.
+#
+# load_names() takes the place of Directory.load_bit_by_bit: it shows the
+# entries as soon as the Listing (see plugins/prefetch) has read the
+# directory, telling directories from files by the types the listing
+# reports, and queues a StatFiller.  That gives the entries their stats as
+# the workers of the Listing stat() them, a chunk at a time, and looks up
+# their VCS status.  Until then entries show no size, and sorting by size
+# or time puts them in their place once all stats are in.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+from time import time
+
+from ranger.container.file import File
+from ranger.core.loader import Loadable
+from ranger.core.shared import FileManagerAware
+from ranger.ext.human_readable import human_readable
+
+from .._mounts import mount_point
+from ..prefetch import POLL_INTERVAL
+
+
+def _wait(event):
+    while not event.is_set():
+        yield
+        event.wait(POLL_INTERVAL)
+
+
+def _fill(fobj, stats):
+    if isinstance(stats[0], OSError) or isinstance(stats[1], OSError):
+        # Like ranger, load() tries again and finds what is missing.
+        fobj.preload = None
+    else:
+        fobj.preload = stats
+    fobj.load()
+
+
+def load_names(self, listing, estimator):  # pylint: disable=too-many-branches
+    """Like Directory.load_bit_by_bit, without stat()ing the entries."""
+    self.loading = True
+    self.percent = 0
+    self.load_if_outdated()
+
+    try:
+        if self.runnable:
+            yield
+            yield from _wait(listing.listed)
+            if listing.error is not None:
+                raise listing.error
+            mypath = self.path
+            self.mount_path = mount_point(self.realpath or mypath)
+            # From before the listing, so later changes are noticed.
+            self.load_content_mtime = listing.mtime
+            filenames = [path for path, _ in listing.entries]
+
+            if self.cumulative_size_calculated:
+                if self.content_loaded:
+                    if self.fm.settings.autoupdate_cumulative_size:
+                        self.look_up_cumulative_size()
+                    else:
+                        self.infostring = ' %s' % human_readable(
+                            self.size, separator='? ')
+                else:
+                    self.infostring = ' %s' % human_readable(self.size)
+            else:
+                self.size = len(filenames)
+                self.infostring = ' %d' % self.size
+            if self.is_link:
+                self.infostring = '->' + self.infostring
+
+            yield
+
+            marked_paths = [obj.path for obj in self.marked_items]
+
+            files = []
+            for path, is_dir in listing.entries:
+                if is_dir:
+                    item = self.fm.get_directory(path, path_is_abs=True)
+                    item.relative_path = item.basename
+                    item.relative_path_lower = item.relative_path.lower()
+                else:
+                    item = File(path, path_is_abs=True)
+                files.append(item)
+                self.percent = 100 * len(files) // len(filenames)
+                yield
+            self.has_vcschild = False
+            self.disk_usage = 0
+
+            self.filenames = filenames
+            self.files_all = files
+
+            self._clear_marked_items()
+            for item in self.files_all:
+                if item.path in marked_paths:
+                    item.mark_set(True)
+                    self.marked_items.append(item)
+                else:
+                    item.mark_set(False)
+
+            self.sort()
+
+            if files:
+                if self.pointed_obj is not None:
+                    self.sync_index()
+                else:
+                    self.move(to=0)
+                self.fm.loader.add(StatFiller(self, listing, estimator), append=True)
+        else:
+            self.filenames = None
+            self.files_all = None
+            self.files = None
+
+        self.cycle_list = None
+        self.content_loaded = True
+        self.last_update_time = time()
+        self.correct_pointer()
+
+    finally:
+        self.loading = False
+        self.fm.signal_emit("finished_loading_dir", directory=self)
+        if self.vcs:
+            self.fm.ui.vcsthread.process(self)
+
+
+class StatFiller(Loadable, FileManagerAware):
+    """Gives the entries of a directory loaded by load_names() their stats
+    from its Listing, and reports how long the stat()s took."""
+    progressbar_supported = True
+
+    def __init__(self, directory, listing, estimator):
+        self.directory = directory
+        self.listing = listing
+        self.estimator = estimator
+        self.files = directory.files_all
+        self.waiting = dict((fobj.path, fobj) for fobj in self.files)
+        self.filled = []
+        Loadable.__init__(self, self.generate(), self._describe())
+
+    def _describe(self):
+        return 'reading file info in {0}: {1}/{2}'.format(
+            self.directory.path, len(self.filled), len(self.files))
+
+    def _current(self):
+        # A load or a change of the listing made other File objects.
+        return self.directory.files_all is self.files
+
+    def generate(self):
+        directory = self.directory
+        listing = self.listing
+        taken = 0
+        while True:
+            finished = listing.done.is_set()
+            while taken < len(listing.chunks):
+                if not self._current():
+                    return
+                for path, stats in listing.chunks[taken].items():
+                    fobj = self.waiting.pop(path, None)
+                    if fobj is not None:
+                        _fill(fobj, stats)
+                        self.filled.append(fobj)
+                taken += 1
+                self.percent = 100 * len(self.filled) // len(self.files)
+                self.description = self._describe()
+                directory.last_update_time = time()
+                yield
+            if finished:
+                break
+            yield
+            listing.done.wait(POLL_INTERVAL)
+
+        if listing.stat_count:
+            self.estimator.record(directory.mount_path, listing.stat_time / listing.stat_count)
+
+        disk_usage = 0
+        has_vcschild = False
+        for item in self.filled:
+            if not self._current():
+                return
+            if item.is_directory:
+                if item.vcs and item.vcs.track:
+                    if item.vcs.is_root_pointer:
+                        has_vcschild = True
+                    else:
+                        item.vcsstatus = \
+                            item.vcs.rootvcs.status_subpath(  # pylint: disable=no-member
+                                os.path.join(directory.realpath, item.basename),
+                                is_directory=True,
+                            )
+            else:
+                disk_usage += item.size
+                if directory.vcs and directory.vcs.track:
+                    item.vcsstatus = \
+                        directory.vcs.rootvcs.status_subpath(  # pylint: disable=no-member
+                            os.path.join(directory.realpath, item.basename))
+            yield
+        directory.has_vcschild = has_vcschild
+        directory.disk_usage = disk_usage
+
+        # Filters and orders that look at stats see them now.
+        directory.filter_pipeline = None
+        directory.change_entries([], [], self.filled)
@@ -0,0 +1,155 @@
+# Commands that scan the visible files of a directory, reimplemented on a
+# columnar snapshot of them (see columns.py).
+#
+# :jump_non finds the next file of the other type with a binary search over
+# the positions where directories and files alternate, :scout counts matches
+# on the name column without copying the file list and filters as you type
+# by searching only the files the pattern matched before (see narrowing.py),
+# and :narrow keeps the selected names in a set.  :scout -v negates the result
+# of the pattern instead of rewriting it (see inverted.py), and marks the
+# matching files in one pass over the name column.
+
+from __future__ import (absolute_import, division, print_function)
+
+from ranger.api.commands import Command
+from ranger.config import commands as default_commands
+from ranger.container.directory import Directory
+
+from .columns import DirSnapshot, mark_files
+from .inverted import InvertedRegex, positive
+from .narrowing import narrow_to
+
+Directory.snapshot = None
+Directory.scout_matches = None
+
+
+def get_snapshot(directory):
+    """The snapshot of directory.files, made anew when the list changed."""
+    snap = directory.snapshot
+    if snap is None or snap.files is not directory.files:
+        snap = directory.snapshot = DirSnapshot(directory.files or [])
+    return snap
+
+
+class jump_non(Command):  # pylint: disable=invalid-name
+    """:jump_non [-FLAGS...]
+
+    Jumps to first non-directory if highlighted file is a directory and vice versa.
+
+    Flags:
+     -r    Jump in reverse order
+     -w    Wrap around if reaching end of filelist
+    """
+    def __init__(self, *args, **kwargs):
+        super(jump_non, self).__init__(*args, **kwargs)
+
+        flags, _ = self.parse_flags()
+        self._flag_reverse = 'r' in flags
+        self._flag_wrap = 'w' in flags
+
+    def execute(self):
+        cwd = self.fm.thisdir
+        if not cwd.files:
+            return
+        snap = get_snapshot(cwd)
+        index = snap.index(self.fm.thisfile, hint=cwd.pointer)
+        if index is None:
+            return
+        target = snap.next_other_type(index, reverse=self._flag_reverse,
+                                      wrap=self._flag_wrap)
+        if target is not None and target != index:
+            self.fm.select_file(snap.files[target].path)
+
+
+class scout(default_commands.scout):  # pylint: disable=invalid-name
+    __doc__ = default_commands.scout.__doc__
+
+    # Flags that change which names a pattern matches
+    METHOD_FLAGS = 'gilrsv'
+
+    def quick(self):
+        flags = self.flags
+        asyoutype = self.AS_YOU_TYPE in flags
+        filtering = self.FILTER in flags or (self.PERM_FILTER in flags and asyoutype)
+        if filtering:
+            thisdir = self.fm.thisdir
+            regex = self._build_regex()
+            if self.FILTER in flags:
+                thisdir.temporary_filter = regex
+            if self.PERM_FILTER in flags and asyoutype:
+                thisdir.filter = regex
+            method = ''.join(sorted(set(flags).intersection(self.METHOD_FLAGS)))
+            narrow_to(thisdir, method, self.pattern, regex)
+        if self._count(move=asyoutype) == 1 and self.AUTO_OPEN in flags:
+            return True
+        return False
+
+    def execute(self):
+        flags = self.flags
+        thisdir = self.fm.thisdir
+        if (self.MARK in flags or self.UNMARK in flags) and thisdir.files:
+            value = flags.find(self.MARK) > flags.find(self.UNMARK)
+            snap = get_snapshot(thisdir)
+            if self.FILTER in flags:
+                items = snap.files
+            else:
+                regex, invert = positive(self._build_regex())
+                items = [snap.files[i] for i in snap.matching(regex.search, invert)]
+            mark_files(thisdir, items, value)
+            self.flags = flags.replace(self.MARK, '').replace(self.UNMARK, '')
+        try:
+            super(scout, self).execute()
+        finally:
+            self.flags = flags
+
+    def _build_regex(self):
+        if self._regex is not None or self.INVERT not in self.flags:
+            return super(scout, self)._build_regex()
+        flags = self.flags
+        self.flags = flags.replace(self.INVERT, '')
+        try:
+            regex = super(scout, self)._build_regex()
+        finally:
+            self.flags = flags
+        # ranger matches everything for "." and invalid patterns, inverted or not
+        if regex.pattern or not self.pattern:
+            regex = InvertedRegex(regex)
+        self._regex = regex
+        return regex
+
+    def _count(self, move=False, offset=0):
+        cwd = self.fm.thisdir
+        pattern = self.pattern
+
+        if not pattern or not cwd.files:
+            return 0
+        if pattern == '.':
+            return 0
+        if pattern == '..':
+            return 1
+
+        snap = get_snapshot(cwd)
+        regex, invert = positive(self._build_regex())
+        found = snap.find(regex.search, cwd.pointer + offset, limit=2, invert=invert)
+        if move and found:
+            cwd.move(to=found[0])
+            self.fm.thisfile = cwd.pointed_obj
+        if len(found) > 1:
+            return len(found)
+        return len(found) == 1
+
+
+class narrow(Command):  # pylint: disable=invalid-name
+    """
+    :narrow
+
+    Show only the files selected right now. If no files are selected,
+    disable narrowing.
+    """
+    def execute(self):
+        if self.fm.thisdir.marked_items:
+            selection = set(f.basename for f in self.fm.thistab.get_selection())
+            self.fm.thisdir.narrow_filter = selection
+        else:
+            self.fm.thisdir.narrow_filter = None
+        self.fm.thisdir.refilter()
@@ -0,0 +1,153 @@
+# Columnar snapshots of the visible files of a directory.
+#
+# Commands that look at every file (jump_non, mark_tag, scout) read the
+# attributes they need from a DirSnapshot instead of from the File objects.
+# A snapshot belongs to one Directory.files list; ranger builds a new list
+# whenever it sorts or filters, so a snapshot never has to be updated, only
+# replaced.  Columns are built on first use.
+
+from __future__ import (absolute_import, division, print_function)
+
+from array import array
+from bisect import bisect_right
+from itertools import chain
+
+# Bit of DirSnapshot.types
+DIR = 1
+
+_NONZERO = bytes([0] + [1] * 255)
+_FLIP = bytes([1] + [0] * 255)
+
+
+class DirSnapshot(object):
+    """Columns of the attributes of files, a list of File objects."""
+
+    def __init__(self, files):
+        self.files = files
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def column(self, name, build, stamp=None):
+        """The column name, built by build(files) or taken from the cache
+        if it was built with the same stamp."""
+        try:
+            cached_stamp, values = self._columns[name]
+        except KeyError:
+            pass
+        else:
+            if cached_stamp == stamp:
+                return values
+        values = build(self.files)
+        self._columns[name] = (stamp, values)
+        return values
+
+    @property
+    def names(self):
+        return self.column('names', lambda files: [fobj.relative_path for fobj in files])
+
+    @property
+    def types(self):
+        return self.column('types', lambda files: bytearray(
+            DIR if fobj.is_directory else 0 for fobj in files))
+
+    @property
+    def boundaries(self):
+        """Indices of the files whose DIR bit differs from the one before."""
+        def build(_):
+            types = self.types
+            return array('l', [i for i in range(1, len(types))
+                               if (types[i] ^ types[i - 1]) & DIR])
+        return self.column('boundaries', build)
+
+    def index(self, fobj, hint=None):
+        """Position of fobj, trying hint first."""
+        if hint is not None and 0 <= hint < len(self.files) and self.files[hint] is fobj:
+            return hint
+        for i, item in enumerate(self.files):
+            if item is fobj:
+                return i
+        return None
+
+    def next_other_type(self, index, reverse=False, wrap=False):
+        """Position of the next file after (or before) index that is a
+        directory if the file at index is none, and vice versa."""
+        types = self.types
+        bounds = self.boundaries
+        if not bounds:
+            return None
+        is_dir = types[index] & DIR
+        if not reverse:
+            pos = bisect_right(bounds, index)
+            if pos < len(bounds):
+                return bounds[pos]
+            if wrap:
+                return 0 if types[0] & DIR != is_dir else bounds[0]
+        else:
+            pos = bisect_right(bounds, index) - 1
+            if pos >= 0:
+                return bounds[pos] - 1
+            if wrap:
+                last = len(types) - 1
+                return last if types[last] & DIR != is_dir else bounds[-1] - 1
+        return None
+
+    def find(self, match, start=0, limit=None, invert=False):
+        """Positions of the names for which match(name) is true (false, with
+        invert), starting at start and wrapping around, at most limit of
+        them."""
+        names = self.names
+        size = len(names)
+        if not size:
+            return []
+        start %= size
+        found = []
+        for i in chain(range(start, size), range(0, start)):
+            if (not match(names[i])) is invert:
+                found.append(i)
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+    def matching(self, match, invert=False):
+        """Positions of all names for which match(name) is true (false, with
+        invert), in one pass over the name column."""
+        hits = bytearray(map(bool, map(match, self.names)))
+        if invert:
+            hits = hits.translate(_FLIP)
+        return self.nonzero(hits)
+
+    def positions(self, codes, values):
+        """Positions at which the bytes column codes holds one of values."""
+        found = []
+        for value in set(values):
+            index = codes.find(value)
+            while index != -1:
+                found.append(index)
+                index = codes.find(value, index + 1)
+        found.sort()
+        return found
+
+    def nonzero(self, codes):
+        """Positions at which the bytes column codes is not 0."""
+        return self.positions(codes.translate(_NONZERO), (1,))
+
+
+def mark_files(directory, items, val):
+    """Like calling directory.mark_item() for each of items, which must be
+    visible files of directory, without a list search for each."""
+    marked = directory.marked_items
+    if val:
+        present = set(map(id, marked))
+        for item in items:
+            item.mark_set(True)
+            if id(item) not in present:
+                present.add(id(item))
+                marked.append(item)
+    else:
+        removed = set(map(id, items))
+        for item in items:
+            item.mark_set(False)
+        marked[:] = [item for item in marked if id(item) not in removed]
+
@@ -0,0 +1,33 @@
+# Inverted scout patterns (:scout -v).
+#
+# ranger inverts a pattern by wrapping it in ^(?:(?!pattern).)*$, which
+# tries the pattern again at every character of every name and can take
+# very long for patterns that backtrack.  The pattern is compiled as it is
+# instead and the result of searching for it negated.
+
+from __future__ import (absolute_import, division, print_function)
+
+
+class InvertedRegex(object):
+    """Stands in for a compiled regular expression where ranger expects one
+    (the filters of a directory, the last search) and matches the strings
+    regex does not match."""
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.pattern = '!' + regex.pattern
+        self.flags = regex.flags
+
+    def search(self, string, *args):
+        return None if self.regex.search(string, *args) else True
+
+    def __repr__(self):
+        return '<InvertedRegex %r>' % (self.regex,)
+
+
+def positive(regex):
+    """The regular expression to search for and whether to negate the
+    result."""
+    if isinstance(regex, InvertedRegex):
+        return regex.regex, True
+    return regex, False
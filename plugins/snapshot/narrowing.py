@@ -0,0 +1,92 @@
+# Filtering the visible files as a scout pattern is typed.
+#
+# With the -f flag (or -p with -t) every key typed into the console filters
+# the directory by the new pattern.  When the pattern only grew, the files
+# it matches are a subset of the files the shorter pattern matched, so only
+# those are searched again instead of all of files_all.  The files shown for
+# each prefix of the pattern are kept, so deleting a character only puts
+# back the list shown before.  Everything else that refilters the directory
+# (a load, a sort, other filters) makes a new files list and so ends this.
+
+from __future__ import (absolute_import, division, print_function)
+
+import re
+from time import time
+
+# Characters that extend a regular expression without changing the meaning
+# of what is before them, so that the longer one matches fewer names.
+_LITERAL = re.compile(r'[\w ]*\Z')
+_TRAILING_WORD = re.compile(r'\w*\Z')
+
+
+def _narrows(old, old_icase, new, new_icase, method):
+    """Whether pattern new matches only names that pattern old matches."""
+    if 'v' in method or not new.startswith(old) or old.endswith('$') \
+            or (new_icase and not old_icase):
+        return False
+    if 'r' in method:
+        if not _LITERAL.match(new, len(old)):
+            return False
+        # Digits or letters after an escape, like \0 or \x4, are part of it.
+        head = old[:_TRAILING_WORD.search(old).start()]
+        if (len(head) - len(head.rstrip('\\'))) % 2:
+            return False
+    return True
+
+
+class ScoutMatches(object):
+    """The files shown for the prefixes of the pattern of one scout."""
+
+    def __init__(self, method):
+        self.method = method
+        self.files = None
+        self.shown = {}  # pattern -> (files, case insensitive)
+
+
+def _show(directory, files):
+    """Set the visible files like Directory.refilter() does."""
+    directory.last_update_time = time()
+    directory.files = files
+    if files and not directory.pointed_obj:
+        directory.pointed_obj = files[0]
+    elif not files:
+        directory.content_loaded = False
+        directory.pointed_obj = None
+    directory.move_to_obj(directory.pointed_obj)
+
+
+def narrow_to(directory, method, pattern, regex):
+    """Show the files of directory that regex, built from pattern with the
+    flags method, matches; the scout filter must be set to regex."""
+    icase = bool(regex.flags & re.IGNORECASE)
+    state = directory.scout_matches
+    if state is None or state.method != method or state.files is not directory.files \
+            or directory.files is None or (pattern and not regex.pattern):
+        # An invalid regular expression is compiled to one matching everything.
+        directory.refilter()
+        state = directory.scout_matches = ScoutMatches(method)
+        state.files = directory.files
+        state.shown[pattern] = (directory.files, icase)
+        return
+
+    shown = state.shown
+    if pattern in shown:
+        files = shown[pattern][0]
+    else:
+        base = None
+        for prefix in sorted(shown, key=len, reverse=True):
+            if _narrows(prefix, shown[prefix][1], pattern, icase, method):
+                base = shown[prefix][0]
+                break
+        if base is None:
+            directory.refilter()
+            files = directory.files
+        else:
+            search = regex.search
+            files = [fobj for fobj in base if search(fobj.basename)]
+        shown[pattern] = (files, icase)
+    for prefix in [prefix for prefix in shown if not pattern.startswith(prefix)]:
+        del shown[prefix]
+    if files is not directory.files:
+        _show(directory, files)
+    state.files = directory.files
@@ -0,0 +1,75 @@
+# Sorting that reuses its work (see orders.py).
+#
+# ranger sorts the whole listing from scratch on every sort: after each
+# load, and whenever the sort options change.  Here every sort mode keeps
+# its order of the entries once computed, so switching the mode with the
+# s and o keys back to one used before, or toggling sort_reverse and
+# sort_directories_first, only rearranges the entries.  The keys of the
+# orders that depend on stat (size, mtime, ctime, atime) are checked
+# against the entries again, and entries stat()ed again or directories
+# whose size changed are moved to their place.  Directories updated from file system events (see
+# plugins/watcher) insert the new entries into the kept orders instead of
+# sorting them again.  The random order and sort modes added by other
+# plugins are sorted by ranger as before.
+
+from __future__ import (absolute_import, division, print_function)
+
+from ranger.container.directory import Directory
+
+from .orders import SortState, key_function
+
+Directory.sort_state = None
+
+_BUILTIN_SORT_DICT = dict(Directory.sort_dict)
+_sort_prev = Directory.sort
+
+
+def _spec(self):
+    settings = self.settings
+    mode = settings.sort
+    keyfunc = None
+    if self.sort_dict.get(mode) is _BUILTIN_SORT_DICT.get(mode):
+        keyfunc = key_function(mode, settings.sort_case_insensitive, settings.sort_unicode)
+    return (mode, settings.sort_case_insensitive, settings.sort_unicode), keyfunc
+
+
+def sort(self):
+    if self.files_all is None:
+        return
+    spec, keyfunc = _spec(self)
+    if keyfunc is None:
+        self.sort_state = None
+        _sort_prev(self)
+        return
+
+    state = self.sort_state
+    if state is None or not state.valid_for(self.files_all):
+        state = self.sort_state = SortState(self.files_all)
+    order = state.order(spec, keyfunc)
+    self.files_all[:] = order.arranged(self.settings.sort_reverse,
+                                       self.settings.sort_directories_first)
+    self.refilter()
+
+
+def change_entries(self, added, removed, changed):
+    """Put the entries added into files_all, take the ones removed out, and
+    move the ones changed (stat()ed again) to their place, then filter."""
+    state = self.sort_state
+    if state is None or not state.valid_for(self.files_all) \
+            or len(added) + len(removed) + len(changed) > len(self.files_all) // 4 + 16:
+        if removed:
+            self.files_all = [fobj for fobj in self.files_all if fobj not in removed]
+        self.files_all.extend(added)
+        self.sort()
+        return
+    state.change(added, removed, changed)
+    if removed:
+        self.files_all = [fobj for fobj in self.files_all if fobj not in removed]
+    self.files_all.extend(added)
+    state.files = self.files_all
+    state.length = len(self.files_all)
+    self.sort()
+
+
+Directory.sort = sort
+Directory.change_entries = change_entries
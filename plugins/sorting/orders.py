@@ -0,0 +1,131 @@
+# Sorted orders of the entries of a directory, kept between sorts.
+#
+# An order holds the entries ascending by the key of one sort mode, with
+# ties in the order the entries were listed in, and the keys beside them, so
+# that single entries can be taken out and put back with a binary search.
+# sort_reverse and sort_directories_first are applied on top of it in
+# linear time, as ranger applies them after sorting.
+
+from __future__ import (absolute_import, division, print_function)
+
+import locale
+from bisect import bisect_left
+
+
+def _strxfrm_list(key):
+    return [locale.strxfrm(str(part)) for part in key]
+
+
+# mode -> (key function, key function with sort_case_insensitive, whether
+# the key can change while the entry stays listed)
+KEYS = {
+    'basename': (lambda fobj: fobj.relative_path,
+                 lambda fobj: fobj.relative_path_lower, False),
+    'natural': (lambda fobj: fobj.basename_natural,
+                lambda fobj: fobj.basename_natural_lower, False),
+    'size': (lambda fobj: -(fobj.size or 1), None, True),
+    'mtime': (lambda fobj: -(fobj.stat and fobj.stat.st_mtime or 1), None, True),
+    'ctime': (lambda fobj: -(fobj.stat and fobj.stat.st_ctime or 1), None, True),
+    'atime': (lambda fobj: -(fobj.stat and fobj.stat.st_atime or 1), None, True),
+    'type': (lambda fobj: fobj.mimetype or '', None, False),
+    'extension': (lambda fobj: fobj.extension or '', None, False),
+}
+
+
+def key_function(mode, case_insensitive, unicode_):
+    """The key function for a sort mode, None for modes that are not
+    kept (random, or ones added by other plugins)."""
+    try:
+        func, func_icase, _ = KEYS[mode]
+    except KeyError:
+        return None
+    if case_insensitive and func_icase is not None:
+        func = func_icase
+    if unicode_ and mode == 'basename':
+        return lambda fobj, func=func: locale.strxfrm(func(fobj))
+    if unicode_ and mode == 'natural':
+        return lambda fobj, func=func: _strxfrm_list(func(fobj))
+    return func
+
+
+class SortedOrder(object):
+    def __init__(self, mode, keyfunc, files, seq):
+        self.keyfunc = keyfunc
+        self.stat_based = KEYS[mode][2]
+        decorated = sorted(((keyfunc(fobj), seq[fobj.path]), fobj) for fobj in files)
+        self.keys = [key for key, _ in decorated]
+        self.items = [fobj for _, fobj in decorated]
+        self.key_of = dict((fobj.path, key) for key, fobj in decorated)
+
+    def remove(self, fobj):
+        key = self.key_of.pop(fobj.path, None)
+        if key is None:
+            return
+        i = bisect_left(self.keys, key)
+        del self.keys[i]
+        del self.items[i]
+
+    def insert(self, fobj, seq):
+        key = (self.keyfunc(fobj), seq[fobj.path])
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.items.insert(i, fobj)
+        self.key_of[fobj.path] = key
+
+    def restat(self, fobjs, seq):
+        """Move entries whose key changed to their new place."""
+        if self.stat_based:
+            for fobj in fobjs:
+                self.remove(fobj)
+                self.insert(fobj, seq)
+
+    def stale(self):
+        """Entries whose key changed since they were put in, such as ones
+        stat()ed again or directories whose size was counted."""
+        if not self.stat_based:
+            return []
+        keyfunc = self.keyfunc
+        key_of = self.key_of
+        return [fobj for fobj in self.items if keyfunc(fobj) != key_of[fobj.path][0]]
+
+    def arranged(self, reverse, directories_first):
+        files = self.items[::-1] if reverse else list(self.items)
+        if directories_first:
+            files = [fobj for fobj in files if fobj.is_directory] \
+                + [fobj for fobj in files if not fobj.is_directory]
+        return files
+
+
+class SortState(object):
+    """The orders kept for the entries of one directory listing."""
+
+    def __init__(self, files):
+        self.files = files
+        self.length = len(files)
+        self.seq = dict((fobj.path, i) for i, fobj in enumerate(files))
+        self.next_seq = len(files)
+        self.orders = {}
+
+    def valid_for(self, files):
+        return files is self.files and len(files) == self.length
+
+    def order(self, spec, keyfunc):
+        order = self.orders.get(spec)
+        if order is None:
+            order = self.orders[spec] = SortedOrder(spec[0], keyfunc, self.files, self.seq)
+        else:
+            order.restat(order.stale(), self.seq)
+        return order
+
+    def change(self, added, removed, changed):
+        for fobj in removed:
+            for order in self.orders.values():
+                order.remove(fobj)
+            del self.seq[fobj.path]
+        for order in self.orders.values():
+            order.restat(changed, self.seq)
+        for fobj in added:
+            self.seq[fobj.path] = self.next_seq
+            self.next_seq += 1
+            for order in self.orders.values():
+                order.insert(fobj, self.seq)
@@ -0,0 +1,109 @@
+# Replaces ranger's tag file with an indexed journal (see store.py).
+#
+# Tagging a file appends a record to datadir/tags.journal instead of
+# rewriting datadir/tagged, which is imported once and not written anymore.
+# :mark_tag and :unmark_tag look up the tags of the current directory in the
+# directory index and keep them as a column of the directory's snapshot (see
+# the snapshot plugin).  Tags changed in another ranger instance show up at
+# the next UI loop.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+import ranger
+from ranger.api.commands import Command
+from ranger.gui.ui import UI
+
+from ..snapshot import get_snapshot
+from ..snapshot.columns import mark_files
+from .store import TagStore
+
+JOURNAL_FILENAME = 'tags.journal'
+
+
+def _install(fm):
+    # FM.initialize() keeps tags that are already set.
+    if fm.tags is None and not ranger.args.clean:
+        fm.tags = TagStore(fm.datapath(JOURNAL_FILENAME), fm.datapath('tagged'))
+
+
+if getattr(ranger, 'fm', None) is not None:
+    _install(ranger.fm)
+
+_redraw_prev = UI.redraw
+
+
+def redraw(self):
+    tags = self.fm.tags
+    if isinstance(tags, TagStore) and tags.sync():
+        for column in getattr(self.browser, 'columns', ()):
+            column.need_redraw = True
+    _redraw_prev(self)
+
+
+UI.redraw = redraw
+
+
+def tag_codes(tags, files):
+    """The tag characters of the files as a bytearray, 0 for untagged
+    files."""
+    codes = bytearray(len(files))
+    if not isinstance(tags, TagStore):
+        for i, fobj in enumerate(files):
+            tag = tags.tags.get(fobj.realpath)
+            if tag and len(tag) == 1:
+                codes[i] = ord(tag)
+        return codes
+    by_dir = {}
+    for i, fobj in enumerate(files):
+        if fobj.is_link:
+            tag = tags.tags.get(fobj.realpath)
+        else:
+            entries = by_dir.get(fobj.dirname)
+            if entries is None:
+                entries = by_dir[fobj.dirname] = tags.in_directory(
+                    os.path.realpath(fobj.dirname))
+            tag = entries.get(os.path.basename(fobj.path)) if entries else None
+        if tag:
+            codes[i] = ord(tag)
+    return codes
+
+
+class mark_tag(Command):  # pylint: disable=invalid-name
+    """:mark_tag [<tags>]
+
+    Mark all tags that are tagged with either of the given tags.
+    When leaving out the tag argument, all tagged files are marked.
+    """
+    do_mark = True
+
+    def execute(self):
+        cwd = self.fm.thisdir
+        wanted = self.rest(1).replace(" ", "")
+        tags = self.fm.tags
+        if not tags or not cwd.files:
+            return
+        if wanted and isinstance(tags, TagStore) and not tags.any_tagged(wanted):
+            return
+        snap = get_snapshot(cwd)
+        if isinstance(tags, TagStore):
+            codes = snap.column('tags', lambda files: tag_codes(tags, files), tags.version)
+        else:
+            codes = tag_codes(tags, snap.files)
+        if wanted:
+            positions = snap.positions(codes, [ord(tag) for tag in wanted if ord(tag) < 256])
+        else:
+            positions = snap.nonzero(codes)
+        mark_files(cwd, [snap.files[i] for i in positions], self.do_mark)
+        self.fm.ui.status.need_redraw = True
+        self.fm.ui.need_redraw = True
+
+
+class unmark_tag(mark_tag):  # pylint: disable=invalid-name
+    """:unmark_tag [<tags>]
+
+    Unmark all tags that are tagged with either of the given tags.
+    When leaving out the tag argument, all tagged files are unmarked.
+    """
+    do_mark = False
@@ -0,0 +1,262 @@
+# Tags in an append-only journal (see _journal.py) with indexes.
+#
+# ranger's Tags rewrites the whole tag file for every change.  Here a
+# change appends a few records:
+#
+#   S              remove all tags
+#   D<dir>         directory of the following relative records
+#   +<tag><name>   tag <dir>/<name> with the character <tag>
+#   -<name>        untag <dir>/<name>
+#
+# Besides path -> tag, the store keeps tag -> paths and directory ->
+# {name: tag}, so looking up the tags of a directory or moving a tagged
+# tree does not go through all tags.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+from ranger.container.tags import ALLOWED_KEYS, Tags
+
+from .._journal import Journal
+
+
+def _encode_changes(changes):
+    """Records for {path: tag or None}, grouped by directory."""
+    by_dir = {}
+    for path, tag in changes.items():
+        dirname, name = os.path.split(path)
+        by_dir.setdefault(dirname, []).append((name, tag))
+    records = []
+    for dirname, entries in by_dir.items():
+        records.append('D' + dirname)
+        records.extend('-' + name if tag is None else '+' + tag + name
+                       for name, tag in entries)
+    return records
+
+
+class TagDict(dict):
+    """The path -> tag dictionary of a TagStore.  Changes made through it
+    are written to the journal by TagStore.dump(), like with ranger's Tags,
+    and may be made while iterating over it."""
+
+    def __init__(self, store):
+        dict.__init__(self)
+        self.store = store
+
+    def __iter__(self):
+        return iter(list(self.keys()))
+
+    def __setitem__(self, path, tag):
+        self.store.queue(path, tag)
+
+    def __delitem__(self, path):
+        if path not in self:
+            raise KeyError(path)
+        self.store.queue(path, None)
+
+    def pop(self, path, *default):
+        if path not in self:
+            if default:
+                return default[0]
+            raise KeyError(path)
+        tag = self.get(path)
+        self.store.queue(path, None)
+        return tag
+
+    def update(self, *args, **kwargs):
+        for path, tag in dict(*args, **kwargs).items():
+            self.store.queue(path, tag)
+
+    def clear(self):
+        for path in list(self.keys()):
+            self.store.queue(path, None)
+
+
+class TagStore(Journal, Tags):  # pylint: disable=too-many-ancestors
+    """Drop-in replacement for ranger's Tags.  Tags of the old tag file
+    legacy_filename are imported when the journal does not exist yet."""
+
+    def __init__(self, filename, legacy_filename=None):  # pylint: disable=super-init-not-called
+        Journal.__init__(self, filename)
+        self.tags = TagDict(self)
+        self.by_tag = {}
+        self.by_dir = {}
+        self.version = 0
+        self._pending = {}
+        if legacy_filename and not self.exists():
+            self._import(legacy_filename)
+        self.sync()
+
+    def _import(self, legacy_filename):
+        try:
+            with open(legacy_filename, 'r', errors='replace') as fobj:
+                tags = self._parse(fobj)
+        except OSError:
+            return
+        self._write(['S'] + _encode_changes(
+            dict((path, tag) for path, tag in tags.items() if path)))
+
+    # The state and its indexes
+
+    def _set(self, path, tag):
+        old = dict.get(self.tags, path)
+        if old == tag:
+            return
+        if old is not None:
+            self.by_tag[old].discard(path)
+        dict.__setitem__(self.tags, path, tag)
+        self.version += 1
+        self.by_tag.setdefault(tag, set()).add(path)
+        dirname, name = os.path.split(path)
+        self.by_dir.setdefault(dirname, {})[name] = tag
+
+    def _unset(self, path):
+        old = dict.pop(self.tags, path, None)
+        if old is None:
+            return
+        self.version += 1
+        self.by_tag[old].discard(path)
+        dirname, name = os.path.split(path)
+        entries = self.by_dir[dirname]
+        del entries[name]
+        if not entries:
+            del self.by_dir[dirname]
+
+    def reset(self):
+        self.version += 1
+        dict.clear(self.tags)
+        self.by_tag = {}
+        self.by_dir = {}
+
+    def apply(self, records):
+        prefix = ''
+        for record in records:
+            kind = record[0]
+            if kind == '+' and len(record) > 1:
+                self._set(prefix + record[2:], record[1])
+            elif kind == '-':
+                self._unset(prefix + record[1:])
+            elif kind == 'D':
+                prefix = record[1:].rstrip('/') + '/'
+            elif kind == 'S':
+                self.reset()
+
+    def snapshot(self):
+        records = ['S']
+        for dirname, entries in self.by_dir.items():
+            records.append('D' + dirname)
+            records.extend('+' + tag + name for name, tag in entries.items())
+        return records
+
+    def __len__(self):
+        return len(self.tags)
+
+    # Queries
+
+    def in_directory(self, path):
+        """{name: tag} of the tagged entries of the directory path."""
+        return self.by_dir.get(path, {})
+
+    def any_tagged(self, tags):
+        """Whether any path is tagged with one of the tag characters."""
+        return any(self.by_tag.get(tag) for tag in tags)
+
+    def tree(self, path):
+        """The tagged paths at or below path."""
+        return self.trees([path])[path]
+
+    def trees(self, paths):
+        """The tagged paths at or below each of paths, by path, from one
+        pass over the tagged directories.  Paths below several of them
+        count for the deepest one."""
+        found = dict((path, [path] if path in self.tags else []) for path in paths)
+        for dirname, entries in self.by_dir.items():
+            root = dirname
+            while root not in found:
+                parent = os.path.dirname(root)
+                if parent == root:
+                    break
+                root = parent
+            else:
+                found[root].extend(os.path.join(dirname, name) for name in entries)
+        return found
+
+    # Changes
+
+    def queue(self, path, tag):
+        """Change the tag of path (None to untag) until the next dump()."""
+        if tag is None:
+            self._unset(path)
+        elif str(tag) in ALLOWED_KEYS and path:
+            self._set(path, str(tag))
+        else:
+            return
+        self._pending[path] = None if tag is None else str(tag)
+
+    def sync(self):
+        changed = Journal.sync(self)
+        if changed:
+            # Reading may have reset the state, keep what is not dumped yet.
+            for path, tag in self._pending.items():
+                if tag is None:
+                    self._unset(path)
+                else:
+                    self._set(path, tag)
+        return changed
+
+    def dump(self):
+        changes, self._pending = self._pending, {}
+        self._write(_encode_changes(changes))
+
+    def add(self, *items, **others):
+        tag = others.get('tag', self.default_tag)
+        self.sync()
+        for item in items:
+            self.queue(item, tag)
+        self.dump()
+
+    def remove(self, *items):
+        self.sync()
+        for item in items:
+            if item in self.tags:
+                self.queue(item, None)
+        self.dump()
+
+    def toggle(self, *items, **others):
+        tag = str(others.get('tag', self.default_tag))
+        if tag not in ALLOWED_KEYS:
+            return
+        self.sync()
+        for item in items:
+            if tag in (self.tags.get(item), self.default_tag) and item in self.tags:
+                self.queue(item, None)
+            else:
+                self.queue(item, tag)
+        self.dump()
+
+    def move_trees(self, renamed):
+        """Move the tags at or below each old path of the (old, new) pairs
+        to the new path."""
+        self.sync()
+        found = self.trees([old for old, _ in renamed])
+        # All tags are taken before any is put back, so that swapped paths
+        # keep both.
+        moves = [(path, new + path[len(old):], self.tags[path])
+                 for old, new in renamed for path in found[old]]
+        for path, _, _ in moves:
+            self.queue(path, None)
+        for _, path, tag in moves:
+            self.queue(path, tag)
+        self.dump()
+
+    def update_path(self, path_old, path_new):
+        self.move_trees([(path_old, path_new)])
+
+    def untag_trees(self, paths):
+        """Remove the tags at or below the paths."""
+        self.sync()
+        for tagged in self.trees(paths).values():
+            for path in tagged:
+                self.queue(path, None)
+        self.dump()
@@ -0,0 +1,193 @@
+# VCS status of git repositories for the rows in view only (see lazy.py).
+#
+# Entering a directory of a repository no longer walks and loads the whole
+# working tree to see whether it changed, nor asks git for the status of
+# every path in it: whether the repository needs its branch and HEAD read
+# again is decided by a stamp of the index and HEAD, and the status of the
+# rows is asked for as they are drawn.  Other VCS work as before.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import queue
+import time
+
+import ranger.api
+from ranger.api.commands import Command
+from ranger.ext.vcs import VcsError
+from ranger.ext.vcs.vcs import GitRoot, VcsRoot, VcsThread
+from ranger.gui.ui import UI
+from ranger.gui.widgets.browsercolumn import BrowserColumn
+
+from .lazy import get_lazy, requests, show_rows
+from .status import repo_stamp
+
+VcsRoot.stamp = None
+
+
+def init_root(self):
+    try:
+        self.head = self.data_info(self.HEAD)
+        self.branch = self.data_branch()
+        self.obj.vcsremotestatus = self.data_status_remote()
+    except VcsError as ex:
+        self.obj.fm.notify('VCS Exception: View log for more info', bad=True, exception=ex)
+        return False
+    self.obj.vcsstatus = self._status_root()
+    self.rootinit = True
+    return True
+
+
+def update_root(self):
+    stamp = repo_stamp(self)
+    if not self.init_root():
+        return False
+    self.stamp = stamp
+    self.updatetime = time.time()
+    return True
+
+
+def check_outdated(self):
+    return self.updatetime is None or repo_stamp(self) != self.stamp
+
+
+def status_subpath(self, path, is_directory=False):  # pylint: disable=unused-argument
+    lazy = get_lazy(self, create=False)
+    if lazy is None:
+        return None
+    return lazy.cached(os.path.relpath(path, self.path))
+
+
+def _status_root(self):
+    return status_subpath(self, self.path)
+
+
+GitRoot.init_root = init_root
+GitRoot.update_root = update_root
+GitRoot.check_outdated = check_outdated
+GitRoot.status_subpath = status_subpath
+GitRoot._status_root = _status_root  # pylint: disable=protected-access
+
+_queue_process_prev = VcsThread._queue_process  # pylint: disable=protected-access
+
+
+def _queue_process(self):
+    _queue_process_prev(self)
+    while True:
+        try:
+            lazy = requests.get_nowait()
+        except queue.Empty:
+            break
+        if lazy.process():
+            self._redraw = True  # pylint: disable=protected-access
+
+
+VcsThread._queue_process = _queue_process  # pylint: disable=protected-access
+
+_draw_directory_prev = BrowserColumn._draw_directory  # pylint: disable=protected-access
+
+
+def _draw_directory(self):
+    target = self.target
+    if target.content_loaded and target.files and target.accessible \
+            and (self.level <= 0 or self.settings.preview_directories):
+        self._set_scroll_begin()  # pylint: disable=protected-access
+        show_rows(self)
+    _draw_directory_prev(self)
+
+
+BrowserColumn._draw_directory = _draw_directory  # pylint: disable=protected-access
+
+_redraw_prev = UI.redraw
+
+
+def redraw(self):
+    if self.settings.vcs_aware and 'browser' in self.__dict__:
+        now = time.time()
+        changed = False
+        for column in self.browser.columns:
+            target = column.target
+            if target is None or not target.is_directory or not target.vcs \
+                    or not target.vcs.track:
+                continue
+            lazy = get_lazy(target.vcs.rootvcs, create=False)
+            if lazy is not None and lazy.validate(now):
+                changed = True
+        if changed:
+            for column in self.browser.columns:
+                column.need_redraw = True
+            self.status.need_redraw = True
+    _redraw_prev(self)
+
+
+UI.redraw = redraw
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    def forget_ancestors(signal):
+        directory = signal.directory
+        if not directory.vcs or not directory.vcs.track or not directory.stat:
+            return
+        lazy = get_lazy(directory.vcs.rootvcs, create=False)
+        if lazy is not None:
+            relpath = os.path.relpath(directory.realpath, lazy.rootvcs.path)
+            lazy.loaded(relpath, directory.stat.st_mtime)
+
+    fm.signal_bind('finished_loading_dir', forget_ancestors)
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
+
+
+class stage(Command):  # pylint: disable=invalid-name
+    """
+    :stage
+
+    Stage selected files for the corresponding version control system
+    """
+    action = 'action_add'
+    failure = 'Unable to stage files'
+
+    def execute(self):
+        thisdir = self.fm.thisdir
+        if not thisdir.vcs or not thisdir.vcs.track:
+            self.fm.notify('{0}: Not in repository'.format(self.failure))
+            return
+
+        rootvcs = thisdir.vcs.rootvcs
+        lazy = get_lazy(rootvcs, create=False)
+        filelist = [f.path for f in self.fm.thistab.get_selection()]
+        # Only the changes made here can be accounted for.
+        explained = lazy is not None and repo_stamp(rootvcs) == lazy.stamp
+        try:
+            getattr(thisdir.vcs, self.action)(filelist)
+        except VcsError as ex:
+            self.fm.notify('{0}: {1}'.format(self.failure, ex))
+
+        if explained:
+            stamp = repo_stamp(rootvcs)
+            relpaths = [os.path.relpath(os.path.realpath(path), rootvcs.path)
+                        for path in filelist]
+            lazy.changed(relpaths, stamp)
+            rootvcs.stamp = stamp
+            for column in self.fm.ui.browser.columns:
+                column.need_redraw = True
+            self.fm.ui.status.need_redraw = True
+        else:
+            if lazy is not None:
+                # Look at the index again right away.
+                lazy.checked = 0
+            self.fm.ui.vcsthread.process(thisdir)
+
+
+class unstage(stage):  # pylint: disable=invalid-name
+    """
+    :unstage
+
+    Unstage selected files for the corresponding version control system
+    """
+    action = 'action_reset'
+    failure = 'Unable to unstage files'
@@ -0,0 +1,202 @@
+# The VCS status of the rows in view.
+#
+# Instead of the status of a whole repository, git is asked for the status
+# of the rows the browser columns show, MARGIN more on either side, with one
+# git status limited to those paths.  As the parent columns list the
+# ancestors of the current directory, their rows are included.
+#
+# Results are kept per repository (one VcsRoot serves every tab showing
+# it), and are dropped:
+#  - all of them when the stamp of the index and HEAD changed, which is
+#    looked at every REVALIDATE_INTERVAL seconds, unless the change was a
+#    :stage or :unstage, which only drops the rows of the paths it staged;
+#  - for a row whose mtime differs from the one it was asked for with;
+#  - for the ancestors of a directory whose mtime changed since ranger
+#    listed it before, as the status of what was changed in it counts
+#    for them.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import queue
+import threading
+import time
+
+from ranger.ext.vcs import VcsError
+
+from .status import repo_stamp, row_statuses
+
+MARGIN = 10
+REVALIDATE_INTERVAL = 1.0
+ROOT = '.'
+
+# LazyStatus objects with rows asked for, processed by the VCS thread.
+requests = queue.Queue()
+
+
+class LazyStatus(object):  # pylint: disable=too-many-instance-attributes
+    def __init__(self, rootvcs):
+        self.rootvcs = rootvcs
+        # relpath -> (status, mtime), ROOT for the root itself
+        self.rows = {}
+        self.stamp = repo_stamp(rootvcs)
+        self.checked = time.time()
+        self.listed = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending = {}
+        self._requested = set()
+
+    def cached(self, relpath, mtime=None):
+        entry = self.rows.get(relpath)
+        if entry is None or (mtime is not None and entry[1] != mtime):
+            return None
+        return entry[0]
+
+    def validate(self, now=None):
+        """Drop everything if the index or HEAD changed.  Returns True
+        then."""
+        now = time.time() if now is None else now
+        if now - self.checked < REVALIDATE_INTERVAL:
+            return False
+        self.checked = now
+        stamp = repo_stamp(self.rootvcs)
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        self.invalidate()
+        return True
+
+    def invalidate(self, relpaths=None):
+        """Drop the rows at relpaths, or all of them.  Results asked for
+        before are discarded when they come in."""
+        with self._lock:
+            self._generation += 1
+            self._pending = {}
+            self._requested = set()
+            if relpaths is None:
+                self.rows = {}
+            else:
+                for relpath in relpaths:
+                    self.rows.pop(relpath, None)
+
+    def changed(self, relpaths, stamp):
+        """ranger staged or unstaged relpaths, which changed the index to
+        stamp: drop the rows at, below and above them and keep the others.
+        The root row is kept too, as its status takes a git status of the
+        whole repository; it is updated with the next change made outside
+        ranger."""
+        dropped = set()
+        with self._lock:
+            rows = list(self.rows)
+        for relpath in relpaths:
+            if relpath == ROOT:
+                dropped.update(rows)
+            prefix = relpath + os.sep
+            dropped.update(row for row in rows if row.startswith(prefix))
+            while relpath and relpath != ROOT:
+                dropped.add(relpath)
+                relpath = os.path.dirname(relpath)
+        self.stamp = stamp
+        self.invalidate(dropped)
+
+    def loaded(self, relpath, mtime):
+        """A directory was (re)loaded."""
+        previous = self.listed.get(relpath)
+        self.listed[relpath] = mtime
+        if previous is None or previous == mtime:
+            return
+        ancestors = [ROOT]
+        while relpath and relpath != ROOT:
+            ancestors.append(relpath)
+            relpath = os.path.dirname(relpath)
+        self.invalidate(ancestors)
+
+    def want(self, relpath, is_directory, mtime):
+        """Ask for the status of a row.  Returns False if it is asked for
+        already."""
+        with self._lock:
+            if relpath in self._requested:
+                return False
+            self._requested.add(relpath)
+            self._pending[relpath] = (is_directory, mtime)
+        return True
+
+    def process(self):
+        """Get the status of the rows asked for (in the VCS thread).
+        Returns True if there are new ones."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            generation = self._generation
+        if not pending:
+            return False
+
+        rootvcs = self.rootvcs
+        rows = dict((relpath, is_directory) for relpath, (is_directory, _)
+                    in pending.items() if relpath != ROOT)
+        try:
+            statuses = row_statuses(rootvcs, rows)
+            if ROOT in pending:
+                statuses[ROOT] = rootvcs.data_status_root()
+        except VcsError as ex:
+            rootvcs.obj.fm.notify('VCS Exception: View log for more info', bad=True, exception=ex)
+            statuses = dict.fromkeys(pending, 'unknown')
+
+        with self._lock:
+            if generation != self._generation:
+                return False
+            for relpath, status in statuses.items():
+                self.rows[relpath] = (status, pending[relpath][1])
+            self._requested.difference_update(pending)
+        if ROOT in statuses:
+            rootvcs.obj.vcsstatus = statuses[ROOT]
+        return True
+
+
+def get_lazy(rootvcs, create=True):
+    """The LazyStatus of a git repository, None for other ones."""
+    if rootvcs is None or rootvcs.repotype != 'git' or not rootvcs.track:
+        return None
+    lazy = rootvcs.__dict__.get('lazy')
+    if lazy is None and create:
+        lazy = rootvcs.lazy = LazyStatus(rootvcs)
+    return lazy
+
+
+def show_rows(column):
+    """Give the rows of a browser column, and MARGIN more on either side,
+    their cached status, and ask for the missing ones."""
+    directory = column.target
+    start = max(0, column.scroll_begin - MARGIN)
+    rows = directory.files[start:column.scroll_begin + column.hei + MARGIN]
+
+    lazy = None
+    dirvcs = directory.vcs
+    if dirvcs and dirvcs.track and not dirvcs.in_repodir:
+        lazy = get_lazy(dirvcs.rootvcs)
+        if lazy is not None:
+            dirrel = os.path.relpath(directory.realpath, lazy.rootvcs.path)
+
+    wanted = set()
+    for fsobj in rows:
+        rowlazy, relpath, mtime = lazy, None, None
+        if fsobj.is_directory:
+            fsvcs = fsobj.vcs
+            if fsvcs and fsvcs.track and fsvcs.is_root_pointer:
+                rowlazy, relpath = get_lazy(fsvcs.rootvcs), ROOT
+        if rowlazy is None:
+            continue
+        if relpath is None:
+            relpath = os.path.normpath(os.path.join(dirrel, fsobj.relative_path))
+            mtime = fsobj.stat.st_mtime if fsobj.stat else None
+        status = rowlazy.cached(relpath, mtime)
+        if status is None:
+            if rowlazy.want(relpath, fsobj.is_directory, mtime):
+                wanted.add(rowlazy)
+        elif fsobj.vcsstatus != status:
+            fsobj.vcsstatus = status
+
+    if wanted:
+        for rowlazy in wanted:
+            requests.put(rowlazy)
+        column.fm.ui.vcsthread._awoken.set()  # pylint: disable=protected-access
@@ -0,0 +1,133 @@
+# Git status of single paths.
+#
+# ranger asks for the status of a whole repository (git status --ignored
+# and two git ls-files over the entire tree) whenever it thinks something
+# changed.  The functions here ask git only about the given paths, and
+# compute from that the status of each of them as ranger would show it.
+#
+# Changes to the index or HEAD are detected by a stamp of .git/index,
+# .git/HEAD and the branch ref; git status itself may rewrite the index,
+# which does not change what it reports.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+PATHS_PER_RUN = 256
+
+
+def git_dir(rootvcs):
+    """The git directory of the repository; .git can be a file pointing
+    to it in worktrees and submodules."""
+    repodir = rootvcs.repodir
+    if os.path.isfile(repodir):
+        try:
+            with open(repodir, 'r') as fobj:
+                line = fobj.readline().strip()
+        except OSError:
+            return repodir
+        if line.startswith('gitdir:'):
+            return os.path.normpath(os.path.join(rootvcs.root, line[7:].strip()))
+    return repodir
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def repo_stamp(rootvcs):
+    """Changes when the index, HEAD or the branch HEAD points to change."""
+    gitdir = git_dir(rootvcs)
+    head = os.path.join(gitdir, 'HEAD')
+    try:
+        with open(head, 'r') as fobj:
+            ref = fobj.read().strip()
+    except OSError:
+        ref = None
+    stamp = [ref, _mtime(os.path.join(gitdir, 'index'))]
+    if ref and ref.startswith('ref: '):
+        stamp.append(_mtime(os.path.join(gitdir, ref[5:])))
+        stamp.append(_mtime(os.path.join(gitdir, 'packed-refs')))
+    return tuple(stamp)
+
+
+def parse_porcelain_v2(rootvcs, output):
+    """{path relative to the root: status} from git status --porcelain=v2
+    -z output."""
+    statuses = {}
+    records = output.split('\0')
+    i = 0
+    while i < len(records):
+        record = records[i]
+        i += 1
+        if not record:
+            continue
+        kind = record[0]
+        if kind in '?!':
+            code, path = kind * 2, record[2:]
+        elif kind in '12u':
+            fields = record.split(' ', {'1': 8, '2': 9, 'u': 10}[kind])
+            code, path = fields[1].replace('.', ' '), fields[-1]
+            if kind == '2':
+                i += 1  # the original path of a rename
+        else:
+            continue
+        statuses[os.path.normpath(path)] = rootvcs._status_translate(code)  # pylint: disable=protected-access
+    return statuses
+
+
+def status_of(rootvcs, relpaths):
+    """The status of the paths and of everything below them."""
+    statuses = {}
+    for start in range(0, len(relpaths), PATHS_PER_RUN):
+        output = rootvcs._run(  # pylint: disable=protected-access
+            ['--literal-pathspecs', '--no-optional-locks', 'status',
+             '--porcelain=v2', '-z', '--ignored', '--']
+            + relpaths[start:start + PATHS_PER_RUN],
+            path=rootvcs.path, rstrip_newline=False)
+        statuses.update(parse_porcelain_v2(rootvcs, output))
+    return statuses
+
+
+def _is_empty(path):
+    try:
+        return not os.listdir(path)
+    except OSError:
+        return False
+
+
+def row_statuses(rootvcs, rows):
+    """{relpath: status} for rows, {relpath: is_directory}.  A directory
+    gets the status of its own if it has one (untracked, ignored), else the
+    most important one of the paths below it, like status_subpath()."""
+    statuses = status_of(rootvcs, sorted(rows)) if rows else {}
+    below = {}
+    for path in statuses:
+        parent = os.path.dirname(path)
+        while parent:
+            if parent in rows:
+                below.setdefault(parent, set()).add(statuses[path])
+            parent = os.path.dirname(parent)
+
+    result = {}
+    for row, is_directory in rows.items():
+        status = None
+        path = row
+        while path and status is None:
+            status = statuses.get(path)
+            path = os.path.dirname(path)
+        if status is None and is_directory:
+            found = below.get(row, ())
+            for dirstatus in rootvcs.DIRSTATUSES:
+                if dirstatus in found:
+                    status = dirstatus
+                    break
+            else:
+                # git does not know empty directories
+                if _is_empty(os.path.join(rootvcs.path, row)):
+                    status = 'none'
+        result[row] = status or 'sync'
+    return result
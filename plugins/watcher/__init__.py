@@ -0,0 +1,299 @@
+# Directories in view follow changes on disk through inotify.
+#
+# ranger notices changes by the mtime of the directories it draws and then
+# lists and stats the whole directory again.  The directories shown in the
+# browser columns (current, parents, preview) are watched with inotify
+# instead; the names that events arrive for are collected for
+# COALESCE_DELAY seconds and then only those entries are stat()ed again,
+# added or dropped (see patch.py), so the cursor, the marks and the other
+# File objects stay as they are.  Waiting for a key press also waits for
+# events, so changes show up without a key press or the idle_delay tick.
+#
+# At most watch_limit directories are watched.  Directories beyond that,
+# after the kernel's limit of watches was hit, and on file systems that do
+# not report changes made elsewhere (drvfs and 9p of WSL, network file
+# systems) are checked by their mtime as before.  "set watch_directories
+# false" turns the watching off.
+
+from __future__ import (absolute_import, division, print_function)
+
+import curses
+import errno
+import os
+import select
+import sys
+from time import time
+
+import ranger.api
+from ranger.container.directory import Directory
+from ranger.ext.mount_path import mount_path
+from ranger.gui.ui import UI
+
+from .._mounts import REMOTE_TYPES, mount_type
+from .._settings import register_setting
+from . import inotify
+from .patch import patch_entries
+
+COALESCE_DELAY = 0.1
+# Seconds between the checks for a resized terminal while waiting for input
+RESIZE_CHECK_INTERVAL = 0.1
+WATCH_MASK = (inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MOVED_FROM
+              | inotify.IN_MOVED_TO | inotify.IN_ATTRIB | inotify.IN_CLOSE_WRITE
+              | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_ONLYDIR)
+SELF_EVENTS = inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_UNMOUNT
+
+register_setting('watch_directories', bool, True)
+register_setting('watch_limit', int, 32)
+
+
+class DirWatcher(object):  # pylint: disable=too-many-instance-attributes
+    def __init__(self, fm):
+        self.fm = fm
+        self.inotify = inotify.Inotify()
+        self.watches = {}     # path -> wd
+        self.paths = {}       # wd -> paths (several for symlinked directories)
+        self.polled = set()   # paths in view that are not watched
+        self.changes = {}     # path -> changed names, None to reload
+        self.pending_since = None
+        self.exhausted = False
+
+    def fileno(self):
+        return self.inotify.fileno()
+
+    def due_in(self):
+        """Seconds until the collected changes are applied, None if there
+        are none."""
+        if self.pending_since is None:
+            return None
+        return max(0, self.pending_since + COALESCE_DELAY - time())
+
+    def _watchable(self, directory):
+        if directory.flat or not directory.accessible:
+            return False
+        return mount_type(mount_path(directory.realpath)) not in REMOTE_TYPES
+
+    def _watch(self, directory):
+        path = directory.path
+        try:
+            wd = self.inotify.add_watch(path, WATCH_MASK)
+        except OSError as ex:
+            if ex.errno in (errno.ENOSPC, errno.EMFILE):
+                self.exhausted = True
+            return False
+        self.watches[path] = wd
+        self.paths.setdefault(wd, set()).add(path)
+        # Changes made while the directory was not watched
+        if directory.content_loaded and directory.files_all is not None:
+            try:
+                if os.stat(path).st_mtime != directory.load_content_mtime:
+                    directory.content_outdated = True
+            except OSError:
+                directory.content_outdated = True
+        return True
+
+    def _unwatch(self, path):
+        wd = self.watches.pop(path)
+        paths = self.paths.get(wd)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self.paths[wd]
+                self.inotify.rm_watch(wd)
+                self.exhausted = False
+        self.changes.pop(path, None)
+
+    def update(self, directories):
+        """Watch the directories in view and only those."""
+        wanted = dict((directory.path, directory) for directory in directories)
+        for path in list(self.watches):
+            if path not in wanted:
+                self._unwatch(path)
+        self.polled.intersection_update(wanted)
+        limit = self.fm.settings.watch_limit
+        for path, directory in wanted.items():
+            if path in self.watches or path in self.polled:
+                continue
+            if self.exhausted or len(self.watches) >= limit \
+                    or not self._watchable(directory) or not self._watch(directory):
+                self.polled.add(path)
+
+    def read(self):
+        """Collect the changes from the pending events."""
+        for wd, mask, name in self.inotify.read():
+            if mask & inotify.IN_Q_OVERFLOW:
+                for path in self.watches:
+                    self.changes[path] = None
+            elif mask & inotify.IN_IGNORED:
+                # The directory is gone or unmounted.
+                for path in self.paths.pop(wd, ()):
+                    if self.watches.get(path) == wd:
+                        del self.watches[path]
+                        self.polled.add(path)
+                        self.changes[path] = None
+                continue
+            for path in self.paths.get(wd, ()):
+                if mask & SELF_EVENTS or not name:
+                    self.changes[path] = None
+                else:
+                    names = self.changes.setdefault(path, set())
+                    if names is not None:
+                        names.add(name)
+        if self.changes and self.pending_since is None:
+            self.pending_since = time()
+
+    def apply(self):
+        """Patch (or reload) the directories with changes if they are due.
+        Returns True if any was changed."""
+        if self.pending_since is None or self.due_in() > 0:
+            return False
+        changes, self.changes = self.changes, {}
+        self.pending_since = None
+        for path, names in changes.items():
+            directory = self.fm.directories.get(path)
+            if directory is None:
+                continue
+            if directory.loading:
+                # The listing may have been taken before the changes.
+                self.changes[path] = None
+                self.pending_since = time()
+                continue
+            if not directory.content_loaded:
+                continue
+            if names is None or not patch_entries(directory, names):
+                directory.content_outdated = True
+                continue
+            self.fm.signal_emit('finished_loading_dir', directory=directory)
+            if directory.vcs:
+                self.fm.ui.vcsthread.process(directory)
+        return True
+
+    def close(self):
+        self.inotify.close()
+        self.watches.clear()
+        self.paths.clear()
+
+
+def get_watcher(fm):
+    """The DirWatcher, or None if watching is off or not possible."""
+    if not fm.settings.watch_directories:
+        return None
+    if 'watcher' not in fm.__dict__:
+        try:
+            watcher = DirWatcher(fm)
+        except OSError:
+            watcher = None
+        fm.__dict__['watcher'] = watcher
+    return fm.__dict__['watcher']
+
+
+def _watching(directory):
+    watcher = directory.fm.__dict__.get('watcher')
+    return watcher is not None and not directory.flat and directory.path in watcher.watches
+
+
+_load_content_if_outdated_prev = Directory.load_content_if_outdated
+
+
+def load_content_if_outdated(self, *args, **kwargs):
+    if not _watching(self):
+        return _load_content_if_outdated_prev(self, *args, **kwargs)
+    if self.load_content_once(*args, **kwargs):
+        return True
+    if self.files_all is None or self.content_outdated:
+        self.load_content(*args, **kwargs)
+        return True
+    return False
+
+
+Directory.load_content_if_outdated = load_content_if_outdated
+
+_redraw_prev = UI.redraw
+
+
+def redraw(self):
+    watcher = get_watcher(self.fm)
+    if watcher is not None and 'browser' in self.__dict__:
+        watcher.read()
+        columns = getattr(self.browser, 'columns', ())
+        if watcher.apply():
+            for column in columns:
+                column.need_redraw = True
+            self.status.need_redraw = True
+        watcher.update([column.target for column in columns
+                        if column.target is not None and column.target.is_directory])
+    _redraw_prev(self)
+
+
+UI.redraw = redraw
+
+_handle_input_prev = UI.handle_input
+
+
+def _pending_key(ui):
+    """Whether curses has a key to return, which it is then given back."""
+    # halfdelay takes precedence over nodelay; set_load_mode() does the same.
+    curses.cbreak()
+    ui.win.nodelay(1)
+    key = ui.win.getch()
+    ui.win.nodelay(0)
+    curses.halfdelay(min(255, max(1, ui.settings.idle_delay // 100)))
+    if key == -1:
+        return False
+    curses.ungetch(key)
+    return True
+
+
+def handle_input(self):
+    watcher = self.fm.__dict__.get('watcher')
+    if watcher is None or self.load_mode:
+        return _handle_input_prev(self)
+
+    # Keys that curses read already are not seen by select()
+    if _pending_key(self):
+        return _handle_input_prev(self)
+
+    timeout = self.settings.idle_delay / 1000.0
+    due = watcher.due_in()
+    if due is None:
+        waitfor = [sys.stdin, watcher]
+    else:
+        # Let a burst of events pile up until the changes are due.
+        waitfor = [sys.stdin]
+        timeout = min(timeout, due)
+    deadline = time() + timeout
+    while True:
+        try:
+            readable = select.select(waitfor, [], [], max(
+                0, min(RESIZE_CHECK_INTERVAL, deadline - time())))[0]
+        except (OSError, ValueError):
+            return _handle_input_prev(self)
+        if readable or time() >= deadline:
+            break
+        # select() is resumed after a SIGWINCH, which curses turns into
+        # KEY_RESIZE for the next getch().
+        if _pending_key(self):
+            return _handle_input_prev(self)
+    if sys.stdin in readable:
+        return _handle_input_prev(self)
+    if not readable and not os.isatty(sys.stdin.fileno()):
+        # STDIN has been closed
+        self.fm.exit()
+    return None
+
+
+UI.handle_input = handle_input
+
+hook_init_prev = ranger.api.hook_init
+
+
+def hook_init(fm):
+    def reset_watcher(signal):
+        watcher = signal.fm.__dict__.pop('watcher', None)
+        if watcher is not None:
+            watcher.close()
+
+    fm.settings.signal_bind('setopt.watch_directories', reset_watcher)
+    return hook_init_prev(fm)
+
+
+ranger.api.hook_init = hook_init
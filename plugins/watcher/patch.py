@@ -0,0 +1,99 @@
+# Applying a set of changed names to a loaded directory.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+from time import time
+
+from ranger.container.file import File
+
+# Above this share of the entries a full reload is cheaper than patching.
+PATCH_SHARE = 0.5
+
+
+def _stats(path):
+    try:
+        file_lstat = os.lstat(path)
+        if file_lstat.st_mode & 0o170000 == 0o120000:
+            file_stat = os.stat(path)
+        else:
+            file_stat = file_lstat
+    except OSError:
+        return None
+    return (file_stat, file_lstat)
+
+
+def _new_entry(directory, path, stats):
+    if stats[0].st_mode & 0o170000 == 0o040000:
+        item = directory.fm.get_directory(path, preload=stats, path_is_abs=True)
+        item.load_if_outdated()
+    else:
+        item = File(path, preload=stats, path_is_abs=True)
+        item.load()
+        directory.disk_usage += item.size
+    item.relative_path = item.basename
+    item.relative_path_lower = item.relative_path.lower()
+    item.mark_set(False)
+    return item
+
+
+def patch_entries(directory, names):
+    """Bring the entries of directory called names up to date: stat them
+    again, add the new ones and drop the ones that are gone, keeping the
+    other File objects, the marks and the pointer.  Returns False if the
+    directory needs a full reload instead."""
+    files_all = directory.files_all
+    if files_all is None or directory.loading or directory.flat \
+            or len(names) > max(64, PATCH_SHARE * len(files_all)):
+        return False
+
+    by_name = dict((fobj.basename, fobj) for fobj in files_all)
+    removed = set()
+    added = []
+    changed = []
+    for name in names:
+        old = by_name.get(name)
+        path = os.path.join(directory.path, name)
+        stats = _stats(path)
+        if old is not None:
+            if stats is not None and \
+                    (stats[0].st_mode & 0o170000 == 0o040000) == old.is_directory:
+                size = old.size if old.is_file else 0
+                old.preload = stats
+                old.load()
+                if old.is_file:
+                    directory.disk_usage += old.size - size
+                changed.append(old)
+                continue
+            removed.add(old)
+            if old.is_file:
+                directory.disk_usage -= old.size or 0
+        if stats is not None:
+            added.append(_new_entry(directory, path, stats))
+
+    try:
+        directory.load_content_mtime = os.stat(directory.path).st_mtime
+    except OSError:
+        return False
+
+    for fobj in removed:
+        if fobj.marked:
+            directory.mark_item(fobj, False)
+    if hasattr(directory, 'change_entries'):
+        # Kept sort orders (plugins/sorting)
+        directory.change_entries(added, removed, changed)
+    else:
+        if removed:
+            directory.files_all = [fobj for fobj in files_all if fobj not in removed]
+        directory.files_all.extend(added)
+        directory.sort()
+    directory.filenames = [fobj.path for fobj in directory.files_all]
+    if not directory.cumulative_size_calculated:
+        directory.size = len(directory.files_all)
+        directory.infostring = ('->' if directory.is_link else '') + ' %d' % directory.size
+
+    directory.cycle_list = None
+    directory.content_loaded = True
+    directory.last_update_time = time()
+    directory.correct_pointer()
+    return True